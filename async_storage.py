@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio facade over StorageManager
+Blocking storage calls run on a bounded thread pool so the event loop never waits on disk
+"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+from constants import STORAGE_IO_WORKERS, PAGE_SIZE
+from storage import StorageManager
+from models import UserProfile, Routine, Task, UserStats, Page
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncStorageManager:
+    """Awaitable version of the StorageManager API
+
+    Every call is executed on a dedicated thread pool. StorageManager serializes access
+    with its own lock, so the pool size only bounds how many callers can wait on storage
+    at once; it never lets two of them mutate the same record concurrently.
+    """
+
+    def __init__(self, storage: StorageManager, max_workers: int = STORAGE_IO_WORKERS):
+        self.sync = storage
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage-io")
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+    async def data_version(self, user_id: int) -> int:
+        return await self._run(self.sync.data_version, user_id)
+
+    async def get_user_data(self, user_id: int) -> Dict[str, Any]:
+        return await self._run(self.sync.get_user_data, user_id)
+
+    async def get_user_profile(self, user_id: int) -> UserProfile:
+        return await self._run(self.sync.get_user_profile, user_id)
+
+    async def update_user_profile(self, user_id: int, profile_data: Dict[str, Any]):
+        return await self._run(self.sync.update_user_profile, user_id, profile_data)
+
+    async def add_routine(self, user_id: int, routine_data: Dict[str, Any]) -> str:
+        return await self._run(self.sync.add_routine, user_id, routine_data)
+
+    async def get_user_routines(self, user_id: int, active_only: bool = True) -> List[Routine]:
+        return await self._run(self.sync.get_user_routines, user_id, active_only)
+
+    async def get_routine_page(self, user_id: int, offset: int = 0, limit: int = PAGE_SIZE,
+                               active_only: bool = True) -> Page:
+        return await self._run(self.sync.get_routine_page, user_id, offset, limit, active_only)
+
+    async def update_routine(self, user_id: int, routine_id: str, update_data: Dict[str, Any]):
+        return await self._run(self.sync.update_routine, user_id, routine_id, update_data)
+
+    async def delete_routine(self, user_id: int, routine_id: str):
+        return await self._run(self.sync.delete_routine, user_id, routine_id)
+
+    async def complete_routine(self, user_id: int, routine_id: str) -> Optional[Routine]:
+        return await self._run(self.sync.complete_routine, user_id, routine_id)
+
+    async def add_task(self, user_id: int, task_data: Dict[str, Any]) -> str:
+        return await self._run(self.sync.add_task, user_id, task_data)
+
+    async def get_user_tasks(self, user_id: int, completed: Optional[bool] = None,
+                             by_deadline: bool = False) -> List[Task]:
+        return await self._run(self.sync.get_user_tasks, user_id, completed, by_deadline)
+
+    async def get_task_page(self, user_id: int, offset: int = 0, limit: int = PAGE_SIZE,
+                            completed: Optional[bool] = None, by_deadline: bool = False) -> Page:
+        return await self._run(self.sync.get_task_page, user_id, offset, limit, completed, by_deadline)
+
+    async def get_overdue_tasks(self, user_id: int, now: Optional[float] = None) -> List[Task]:
+        return await self._run(self.sync.get_overdue_tasks, user_id, now)
+
+    async def complete_task(self, user_id: int, task_id: str):
+        return await self._run(self.sync.complete_task, user_id, task_id)
+
+    async def update_task(self, user_id: int, task_id: str, update_data: Dict[str, Any]) -> Optional[Task]:
+        return await self._run(self.sync.update_task, user_id, task_id, update_data)
+
+    async def delete_task(self, user_id: int, task_id: str):
+        return await self._run(self.sync.delete_task, user_id, task_id)
+
+    async def get_user_stats(self, user_id: int) -> UserStats:
+        return await self._run(self.sync.get_user_stats, user_id)
+
+    async def export_data(self) -> Dict[str, Any]:
+        return await self._run(self.sync.export_data)
+
+    async def manual_backup(self) -> str:
+        return await self._run(self.sync.manual_backup)
+
+    def shutdown(self):
+        """Wait for queued storage calls to finish and stop the worker threads"""
+        self._executor.shutdown(wait=True)
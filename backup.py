@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Scheduled, incremental backups of the bot database
+Full snapshots plus gzip-compressed per-user deltas, tracked in an index file
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+from fileutils import atomic_write
+from serialization import load_file, DecodeError
+from constants import (
+    BACKUP_DIR, BACKUP_INTERVAL_HOURS, BACKUP_CHANGE_THRESHOLD, BACKUP_FULL_EVERY, BACKUP_KEEP_FULL
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+LEGACY_BACKUP_PREFIXES = ("bot_data_backup_", "manual_backup_")
+
+
+def _read_gzip(backup_dir: str, name: str) -> Dict[str, Any]:
+    with gzip.open(os.path.join(backup_dir, name), 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _restore_entry(backup_dir: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the document stored by one index entry (a snapshot, or a delta plus its snapshot)"""
+    if entry["type"] == "full":
+        return _read_gzip(backup_dir, entry["name"])
+
+    delta = _read_gzip(backup_dir, entry["name"])
+    data = _read_gzip(backup_dir, delta["base"])
+    data["users"].update(delta["users"])
+    for user_id in delta["deleted"]:
+        data["users"].pop(user_id, None)
+    data["metadata"] = delta["metadata"]
+    return data
+
+
+def recover_latest(backup_dir: str = BACKUP_DIR) -> Optional[Dict[str, Any]]:
+    """Return the newest backup that can be read back in full, or None
+
+    Indexed backups are tried newest first, then the plain JSON backups written by older
+    versions and by manual_backup.
+    """
+    try:
+        with open(os.path.join(backup_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            entries = json.load(f)["backups"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        entries = []
+
+    for entry in reversed(entries):
+        try:
+            data = _restore_entry(backup_dir, entry)
+            logger.info(f"Recovered data from backup {entry['name']}")
+            return data
+        except (OSError, EOFError, json.JSONDecodeError, KeyError) as e:
+            logger.error(f"Backup {entry['name']} is not usable: {e}")
+
+    try:
+        legacy = [f for f in os.listdir(backup_dir) if f.startswith(LEGACY_BACKUP_PREFIXES) and f.endswith('.json')]
+    except FileNotFoundError:
+        return None
+
+    # Names end in a timestamp, so sort on it rather than on the prefix
+    for name in sorted(legacy, key=lambda n: n.split('_backup_')[-1], reverse=True):
+        try:
+            data = load_file(os.path.join(backup_dir, name))
+            if "users" in data:
+                logger.info(f"Recovered data from backup {name}")
+                return data
+        except (OSError, DecodeError) as e:
+            logger.error(f"Backup {name} is not usable: {e}")
+
+    return None
+
+
+def _user_digest(user_data: Dict[str, Any]) -> str:
+    """Stable fingerprint of a user record, used to detect changes since the last full backup"""
+    encoded = json.dumps(user_data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+class BackupService:
+    """Take backups on a schedule instead of on every save
+
+    A backup is due every `interval_hours`, or earlier once `change_threshold` mutations
+    have happened since the previous one. Every `full_every`-th backup is a full snapshot;
+    the others are deltas holding only the users that changed since that snapshot, so a
+    restore needs at most one full file and one delta. Retention is driven by the index,
+    which keeps the last `keep_full` snapshots together with their deltas.
+    """
+
+    def __init__(self, storage, backup_dir: str = BACKUP_DIR,
+                 interval_hours: float = BACKUP_INTERVAL_HOURS,
+                 change_threshold: int = BACKUP_CHANGE_THRESHOLD,
+                 full_every: int = BACKUP_FULL_EVERY,
+                 keep_full: int = BACKUP_KEEP_FULL,
+                 check_seconds: float = 60):
+        self.storage = storage
+        self.backup_dir = backup_dir
+        self.interval_seconds = interval_hours * 3600
+        self.change_threshold = change_threshold
+        self.full_every = full_every
+        self.keep_full = keep_full
+        self.check_seconds = check_seconds
+
+        if not os.path.exists(self.backup_dir):
+            os.makedirs(self.backup_dir)
+
+        self.index_path = os.path.join(self.backup_dir, INDEX_FILE)
+        self.index = self._load_index()
+
+        # Digests of the users in the latest full backup, loaded on first use
+        self._base_digests: Optional[Dict[str, str]] = None
+        self._last_change_count = storage.change_count
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _load_index(self) -> Dict[str, Any]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"backups": []}
+        except json.JSONDecodeError as e:
+            logger.error(f"Error loading backup index: {e}")
+            return {"backups": []}
+
+    def _save_index(self):
+        atomic_write(self.index_path, json.dumps(self.index, ensure_ascii=False, indent=2))
+
+    def _write_gzip(self, name: str, payload: Dict[str, Any]):
+        encoded = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        atomic_write(os.path.join(self.backup_dir, name), gzip.compress(encoded))
+
+    def _last_full(self) -> Optional[Dict[str, Any]]:
+        return next((b for b in reversed(self.index["backups"]) if b["type"] == "full"), None)
+
+    def _deltas_since_full(self) -> int:
+        count = 0
+        for entry in reversed(self.index["backups"]):
+            if entry["type"] == "full":
+                break
+            count += 1
+        return count
+
+    def is_due(self) -> bool:
+        """Whether the interval has elapsed or enough changes have accumulated"""
+        if not self.index["backups"]:
+            return True
+        if self.storage.change_count - self._last_change_count >= self.change_threshold:
+            return True
+        last = datetime.fromisoformat(self.index["backups"][-1]["created"])
+        return (datetime.now(timezone.utc) - last).total_seconds() >= self.interval_seconds
+
+    def backup(self, full: bool = False) -> str:
+        """Take a backup now and return its file name"""
+        with self._lock:
+            change_count = self.storage.change_count
+            data = self.storage.export_data()
+            now = datetime.now(timezone.utc)
+            base = self._last_full()
+
+            if base is None or full or self._deltas_since_full() + 1 >= self.full_every:
+                name = f"full_{now.strftime('%Y%m%d_%H%M%S_%f')}.json.gz"
+                self._write_gzip(name, data)
+                self._base_digests = {uid: _user_digest(u) for uid, u in data["users"].items()}
+                entry = {"name": name, "type": "full", "created": now.isoformat(), "users": len(data["users"])}
+            else:
+                base_digests = self._get_base_digests(base)
+                changed = {uid: u for uid, u in data["users"].items() if base_digests.get(uid) != _user_digest(u)}
+                deleted = [uid for uid in base_digests if uid not in data["users"]]
+                name = f"delta_{now.strftime('%Y%m%d_%H%M%S_%f')}.json.gz"
+                self._write_gzip(name, {
+                    "base": base["name"],
+                    "metadata": data.get("metadata", {}),
+                    "users": changed,
+                    "deleted": deleted
+                })
+                entry = {"name": name, "type": "delta", "base": base["name"], "created": now.isoformat(),
+                         "users": len(changed)}
+
+            self.index["backups"].append(entry)
+            self._apply_retention()
+            self._save_index()
+            self._last_change_count = change_count
+
+        logger.info(f"Backup written: {name}")
+        return name
+
+    def _get_base_digests(self, base: Dict[str, Any]) -> Dict[str, str]:
+        if self._base_digests is None:
+            users = _read_gzip(self.backup_dir, base["name"])["users"]
+            self._base_digests = {uid: _user_digest(u) for uid, u in users.items()}
+        return self._base_digests
+
+    def _apply_retention(self):
+        """Drop snapshots beyond keep_full, together with the deltas built on them"""
+        full_names = [b["name"] for b in self.index["backups"] if b["type"] == "full"]
+        expired = set(full_names[:-self.keep_full]) if len(full_names) > self.keep_full else set()
+        if not expired:
+            return
+
+        kept = []
+        for entry in self.index["backups"]:
+            if entry["name"] in expired or entry.get("base") in expired:
+                try:
+                    os.remove(os.path.join(self.backup_dir, entry["name"]))
+                except FileNotFoundError:
+                    pass
+            else:
+                kept.append(entry)
+        self.index["backups"] = kept
+
+    def list_backups(self) -> List[Dict[str, Any]]:
+        """Index entries, oldest first"""
+        return list(self.index["backups"])
+
+    def restore(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """Rebuild the database document stored by a backup (the newest one by default)"""
+        entries = self.index["backups"]
+        if not entries:
+            raise FileNotFoundError("No backups available")
+
+        entry = entries[-1] if name is None else next(e for e in entries if e["name"] == name)
+        return _restore_entry(self.backup_dir, entry)
+
+    def _run(self):
+        while not self._stopped.wait(self.check_seconds):
+            try:
+                if self.is_due():
+                    self.backup()
+            except Exception as e:
+                logger.error(f"Error taking scheduled backup: {e}")
+
+    def start(self):
+        """Start checking for due backups in a background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="backup-service", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark the on-disk data formats
+Compares file size and load/save time of each format on a synthetic multi-user database
+
+Usage:
+    python bench_storage.py [--users 2000] [--repeat 5]
+"""
+
+import argparse
+import copy
+import json
+import os
+import tempfile
+import time
+from serialization import FORMATS, dumps, loads, msgpack
+from constants import DATA_FILE
+
+
+def build_database(user_count: int) -> dict:
+    """Scale the sample users in bot_data.json up to user_count users"""
+    with open(DATA_FILE, 'rb') as f:
+        sample = loads(f.read())
+
+    templates = list(sample["users"].values())
+    users = {}
+    for i in range(user_count):
+        user = copy.deepcopy(templates[i % len(templates)])
+        user["profile"]["name"] = f"{user['profile']['name']} {i}"
+        users[str(100000 + i)] = user
+    return {"users": users, "metadata": sample.get("metadata", {})}
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bot data formats")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = build_database(args.users)
+    binary_codec = "msgpack" if msgpack is not None else "marshal"
+    print(f"📊 {args.users} users, best of {args.repeat} runs (binary codec: {binary_codec})")
+    print(f"{'format':<12} {'size (KB)':>10} {'save (ms)':>10} {'load (ms)':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bench_data")
+        for fmt in FORMATS:
+            def save():
+                with open(path, 'wb') as f:
+                    f.write(dumps(data, fmt))
+
+            def load():
+                with open(path, 'rb') as f:
+                    loads(f.read())
+
+            save_time = best_of(args.repeat, save)
+            load_time = best_of(args.repeat, load)
+            size = os.path.getsize(path)
+            print(f"{fmt:<12} {size / 1024:>10.1f} {save_time * 1000:>10.1f} {load_time * 1000:>10.1f}")
+
+    # Sanity check that every format round-trips the document unchanged
+    for fmt in FORMATS:
+        assert loads(dumps(data, fmt)) == json.loads(json.dumps(data)), fmt
+
+
+if __name__ == '__main__':
+    main()
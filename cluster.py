@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-process deployment with user-partitioned storage
+A front process polls Telegram and routes each update to the worker process that owns its user
+
+Usage:
+    python cluster.py --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import zlib
+from typing import Dict, List, Any, Optional, Callable, AsyncIterable
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+from storage import create_storage_manager
+from sqlite_storage import SQLiteStorageManager
+from backends import migrate_json_to_shards
+from serialization import save_file
+from constants import (
+    CLUSTER_DIR, CLUSTER_WORKERS, CLUSTER_START_METHOD, DATA_FILE, DATA_FORMAT, SHARD_DIR, SQLITE_FILE,
+    STORAGE_BACKEND, SENDER_GLOBAL_RATE
+)
+
+logger = logging.getLogger(__name__)
+
+# Records the partition count the data was split with; user ownership depends on it
+PARTITIONS_FILE = "partitions.json"
+
+
+def partition_for(user_id: Optional[int], partitions: int) -> int:
+    """Partition owning a user; stable across processes and restarts (unlike hash() of a str)"""
+    if user_id is None:
+        return 0
+    return zlib.crc32(str(user_id).encode('ascii')) % partitions
+
+
+def update_user_id(update_data: Dict[str, Any]) -> Optional[int]:
+    """Id of the user an update (as Update.to_dict()) came from, or None if it has none"""
+    for value in update_data.values():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"].get("id")
+    return None
+
+
+def partition_dir(index: int, root: str = CLUSTER_DIR) -> str:
+    return os.path.abspath(os.path.join(root, f"partition-{index}"))
+
+
+class UpdateRouter:
+    """Hand raw updates to per-partition queues by the id of their user"""
+
+    def __init__(self, queues: List[Any]):
+        self.queues = queues
+        self.routed = [0] * len(queues)
+
+    def route(self, update_data: Dict[str, Any]) -> int:
+        """Queue one update for its owner and return the partition it went to"""
+        partition = partition_for(update_user_id(update_data), len(self.queues))
+        self.queues[partition].put(update_data)
+        self.routed[partition] += 1
+        return partition
+
+    async def feed(self, source: AsyncIterable[Dict[str, Any]]) -> int:
+        """Route every update from an async source (e.g. a fake one in tests), return the count"""
+        count = 0
+        async for update_data in source:
+            self.route(update_data)
+            count += 1
+        return count
+
+
+def run_worker(index: int, partitions: int, updates):
+    """Worker process: serve one partition from its own directory and storage"""
+    # Every storage path (data file, journal, shards, SQLite file, backups) is relative,
+    # so the partition's directory gives the worker a database no other process touches
+    os.chdir(partition_dir(index))
+
+    # main configures logging to bot.log on import, so it is only imported where it runs
+    from main import BengaliBotApp
+
+    # The outbound rate limit is per bot token, so the workers share it
+    app = BengaliBotApp(send_rate=SENDER_GLOBAL_RATE / partitions)
+    logger.info(f"Worker {index}/{partitions} serving from {os.getcwd()}")
+    asyncio.run(app.serve(updates))
+
+
+class Cluster:
+    """Start one worker process per partition, each fed by its own IPC queue"""
+
+    def __init__(self, partitions: int = CLUSTER_WORKERS, worker: Callable = run_worker,
+                 start_method: str = CLUSTER_START_METHOD):
+        self.partitions = partitions
+        self.worker = worker
+        self.context = multiprocessing.get_context(start_method)
+        self.queues = [self.context.Queue() for _ in range(partitions)]
+        self.processes: List[multiprocessing.Process] = []
+        self.router = UpdateRouter(self.queues)
+
+    def start(self):
+        for index, queue in enumerate(self.queues):
+            process = self.context.Process(target=self.worker, args=(index, self.partitions, queue),
+                                           name=f"bot-worker-{index}", daemon=True)
+            process.start()
+            self.processes.append(process)
+        logger.info(f"Started {self.partitions} worker processes")
+
+    def stop(self, timeout: float = 30):
+        """Ask every worker to finish what it has queued and exit"""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.error(f"{process.name} didn't stop in {timeout}s, terminating it")
+                process.terminate()
+        self.processes = []
+
+
+def split_partitions(root: str = CLUSTER_DIR) -> Optional[int]:
+    """Number of partitions the data under `root` was split into, or None if it hasn't been"""
+    try:
+        with open(os.path.join(root, PARTITIONS_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)["partitions"]
+    except FileNotFoundError:
+        return None
+
+
+def split_database(data: Dict[str, Any], partitions: int, backend_name: str = STORAGE_BACKEND,
+                   root: str = CLUSTER_DIR) -> List[int]:
+    """Divide a whole database document between partition directories, return users per partition
+
+    Done once, on the first clustered start; after that the partition count is fixed,
+    since changing it would move users away from their data.
+    """
+    parts = [{"users": {}, "metadata": dict(data.get("metadata", {}))} for _ in range(partitions)]
+    for user_id_str, user_data in data["users"].items():
+        parts[partition_for(int(user_id_str), partitions)]["users"][user_id_str] = user_data
+
+    for index, part in enumerate(parts):
+        directory = partition_dir(index, root)
+        os.makedirs(directory, exist_ok=True)
+        if backend_name == "sqlite":
+            storage = SQLiteStorageManager(os.path.join(directory, SQLITE_FILE))
+            storage.import_data(part)
+            storage.close()
+            continue
+
+        save_file(os.path.join(directory, DATA_FILE), part, DATA_FORMAT)
+        if backend_name == "sharded":
+            migrate_json_to_shards(os.path.join(directory, DATA_FILE), os.path.join(directory, SHARD_DIR))
+
+    with open(os.path.join(root, PARTITIONS_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"partitions": partitions}, f)
+
+    counts = [len(part["users"]) for part in parts]
+    logger.info(f"Split {sum(counts)} users into {partitions} partitions: {counts}")
+    return counts
+
+
+class ClusterFront:
+    """Front process: polls Telegram and forwards every update to its user's worker"""
+
+    def __init__(self, partitions: int = CLUSTER_WORKERS):
+        from main import get_bot_token
+        self.token = get_bot_token()
+        self.cluster = Cluster(partitions)
+
+    async def forward(self, update: Update, context):
+        self.cluster.router.route(update.to_dict())
+
+    async def post_init(self, application: Application):
+        self.cluster.start()
+
+    async def post_shutdown(self, application: Application):
+        self.cluster.stop()
+        logger.info(f"Cluster stopped; updates routed per partition: {self.cluster.router.routed}")
+
+    def run(self):
+        application = (Application.builder().token(self.token)
+                       .post_init(self.post_init).post_shutdown(self.post_shutdown).build())
+        application.add_handler(TypeHandler(Update, self.forward))
+        logger.info(f"Cluster front polling for {self.cluster.partitions} workers")
+        application.run_polling(allowed_updates=['message', 'callback_query'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as a front process and partitioned workers")
+    parser.add_argument("--workers", type=int, default=CLUSTER_WORKERS, help="number of worker processes")
+    args = parser.parse_args()
+
+    backend_name = os.getenv('STORAGE_BACKEND', STORAGE_BACKEND)
+    existing = split_partitions()
+    if existing is None:
+        source = create_storage_manager(backend_name)
+        try:
+            counts = split_database(source.export_data(), args.workers, backend_name)
+        finally:
+            source.close()
+        print(f"✅ Users split between {args.workers} partitions: {counts}")
+    elif existing != args.workers:
+        parser.error(f"data is already split into {existing} partitions; run with --workers {existing}")
+
+    ClusterFront(args.workers).run()
+
+
+if __name__ == '__main__':
+    main()
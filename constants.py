@@ -7,15 +7,78 @@ All Bengali text with emojis for an attractive user experience
 # Bot Configuration
 BOT_TOKEN = ""  # To be set via environment variable or config
 DEFAULT_TIMEZONE = "Asia/Kolkata"
+TIMEZONE_OPTIONS = ["Asia/Dhaka", "Asia/Kolkata", "Asia/Dubai", "Asia/Riyadh", "Europe/London", "America/New_York"]
 BACKUP_INTERVAL_HOURS = 24
+BACKUP_CHANGE_THRESHOLD = 1000  # Back up early once this many changes have accumulated
+BACKUP_FULL_EVERY = 7  # Every Nth backup is a full snapshot, the rest are deltas against it
+BACKUP_KEEP_FULL = 3  # Full snapshots (with their deltas) kept by retention
 
 # Reminder intervals (in minutes)
 REMINDER_INTERVALS = [5, 10, 15, 30, 60]
 DEFAULT_REMINDER_INTERVAL = 15
 
+# How often (in seconds) overdue tasks are looked for and announced
+OVERDUE_SWEEP_SECONDS = 60
+
+# Days of completion history kept per routine (one bit per day); must cover the longest
+# adherence window shown in the stats
+ROUTINE_HISTORY_DAYS = 30
+
+# Users whose typed models StorageManager keeps materialized; the least recently used are
+# dropped and rebuilt from their stored record on the next access
+MODEL_CACHE_SIZE = 1024
+
+# Routines or tasks shown per page of a list view
+PAGE_SIZE = 10
+# Filtered and ordered list views kept by StorageManager for paging (one per user and view)
+PAGE_VIEW_CACHE_SIZE = 1024
+# Rendered list and stats screens kept by UIManager (one per user, screen and page)
+RENDER_CACHE_SIZE = 4096
+
 # File paths
 DATA_FILE = "bot_data.json"
 BACKUP_DIR = "backups"
+SHARD_DIR = "bot_data"  # Per-user shard directory for the "sharded" backend
+SQLITE_FILE = "bot_data.db"  # Database file for the "sqlite" backend
+
+# On-disk format of the data file and shards: "json-pretty" (indented, human readable),
+# "json" (minified) or "binary" (msgpack if installed, otherwise marshal). Existing files are
+# read in whatever format they hold, so switching only affects what is written next.
+DATA_FORMAT = "json-pretty"
+
+# Storage backend: "json" (single bot_data.json), "sharded" (one file per user) or "sqlite"
+STORAGE_BACKEND = "json"
+
+# Worker threads that run blocking storage calls for the async handlers
+STORAGE_IO_WORKERS = 8
+
+# Saves arriving within this window are written together (0 disables group commit)
+GROUP_COMMIT_WINDOW_MS = 50
+
+# Write-ahead journal for the "json" and "sharded" backends
+STORAGE_JOURNAL = True
+JOURNAL_FILE = "bot_data.journal"
+JOURNAL_COMPACT_ENTRIES = 500  # Fold the journal into the data file after this many entries...
+JOURNAL_COMPACT_SECONDS = 60  # ...or after this many seconds, whichever comes first
+
+# Start serving before bot_data.json is fully parsed: users are read one at a time through an
+# offset index (bot_data.json.idx) while the rest of the file loads in the background
+LAZY_STARTUP = True
+
+# Outbound messages (reminders) go through a rate-limited queue sized to Telegram's limits
+SENDER_WORKERS = 8
+SENDER_GLOBAL_RATE = 30  # messages per second across all chats
+SENDER_PER_CHAT_RATE = 1  # messages per second to one chat
+SENDER_MAX_RETRIES = 3
+
+# Bulk imports (import_export.py) are applied with one storage write per this many rows
+IMPORT_BATCH_SIZE = 5000
+
+# Multi-process mode (cluster.py): each worker owns a hash partition of the users and keeps
+# its own database under CLUSTER_DIR/partition-<n>/
+CLUSTER_DIR = "cluster"
+CLUSTER_WORKERS = 4
+CLUSTER_START_METHOD = "spawn"
 
 # Emojis
 EMOJIS = {
@@ -41,7 +104,9 @@ EMOJIS = {
     'date': '📆',
     'daily': '🌅',
     'weekly': '📆',
-    'notification': '🔔'
+    'notification': '🔔',
+    'streak': '🔥',
+    'trophy': '🏆'
 }
 
 # Bengali UI Text
@@ -77,6 +142,9 @@ BENGALI_TEXT = {
     'btn_back': f"{EMOJIS['back']} পূর্ববর্তী মেনু",
     'btn_save': f"{EMOJIS['save']} সংরক্ষণ করুন",
     'btn_cancel': f"{EMOJIS['cancel']} বাতিল করুন",
+    'btn_prev_page': "◀️ আগের পৃষ্ঠা",
+    'btn_next_page': "পরের পৃষ্ঠা ▶️",
+    'page_indicator': "📄 পৃষ্ঠা {page}/{pages}",
     
     # Input prompts
     'enter_routine_name': f"{EMOJIS['routine']} রুটিনের নাম লিখুন:",
@@ -103,6 +171,9 @@ BENGALI_TEXT = {
     'routine_created': f"{EMOJIS['success']} রুটিন সফলভাবে তৈরি হয়েছে!",
     'task_created': f"{EMOJIS['success']} কাজ সফলভাবে যোগ করা হয়েছে!",
     'task_completed': f"{EMOJIS['done']} অভিনন্দন! কাজটি সম্পন্ন হয়েছে।",
+    'routine_done': f"{EMOJIS['done']} দারুণ! আজকের রুটিন সম্পন্ন হয়েছে। ধারাবাহিকতা: {{streak}} দিন",
+    'routine_already_done': f"{EMOJIS['done']} এই রুটিনটি আজ ইতিমধ্যে সম্পন্ন হয়েছে।",
+    'btn_routine_done': f"{EMOJIS['done']} আজ সম্পন্ন",
     'item_deleted': f"{EMOJIS['success']} সফলভাবে মুছে ফেলা হয়েছে।",
     'settings_saved': f"{EMOJIS['success']} সেটিংস সংরক্ষিত হয়েছে।",
     
@@ -110,6 +181,7 @@ BENGALI_TEXT = {
     'error_occurred': f"{EMOJIS['warning']} একটি ত্রুটি ঘটেছে। অনুগ্রহ করে আবার চেষ্টা করুন।",
     'invalid_format': f"{EMOJIS['warning']} ভুল ফরম্যাট। অনুগ্রহ করে সঠিক ফরম্যাটে লিখুন।",
     'no_items_found': f"{EMOJIS['warning']} কোনো আইটেম পাওয়া যায়নি।",
+    'button_expired': f"{EMOJIS['warning']} এই বোতামটি আর কাজ করছে না। অনুগ্রহ করে মেনু থেকে আবার খুলুন।",
     'operation_cancelled': f"{EMOJIS['cancel']} অপারেশন বাতিল করা হয়েছে।",
     
     # Reminders
@@ -118,12 +190,17 @@ BENGALI_TEXT = {
     'reminder_15min': f"{EMOJIS['reminder']} ১৫ মিনিট পরে",
     'reminder_30min': f"{EMOJIS['reminder']} ৩০ মিনিট পরে",
     'reminder_60min': f"{EMOJIS['reminder']} ১ ঘন্টা পরে",
+    'routine_reminder': f"{EMOJIS['reminder']} রিমাইন্ডার: {{name}}\n{EMOJIS['time']} {{minutes}} মিনিট পরে ({{time}})",
+    'task_reminder': f"{EMOJIS['reminder']} রিমাইন্ডার: {{name}}\n{EMOJIS['time']} শেষ সময় {{minutes}} মিনিট পরে ({{deadline}})",
+    'task_overdue': f"{EMOJIS['warning']} সময় পেরিয়ে গেছে: {{name}}\n{EMOJIS['time']} শেষ সময় ছিল {{deadline}}",
     
     # Settings
     'settings_menu': f"{EMOJIS['settings']} সেটিংস",
     'btn_change_name': f"{EMOJIS['profile']} নাম পরিবর্তন",
     'btn_change_timezone': f"{EMOJIS['time']} টাইমজোন পরিবর্তন",
     'btn_reminder_settings': f"{EMOJIS['notification']} রিমাইন্ডার সেটিংস",
+    'select_timezone': f"{EMOJIS['time']} আপনার টাইমজোন নির্বাচন করুন (বর্তমান: {{current}}):",
+    'select_default_interval': f"{EMOJIS['notification']} নতুন রুটিন ও কাজের জন্য ডিফল্ট রিমাইন্ডার নির্বাচন করুন:",
     
     # Stats
     'stats_title': f"{EMOJIS['stats']} আপনার পরিসংখ্যান",
@@ -132,6 +209,11 @@ BENGALI_TEXT = {
     'completed_tasks': "সম্পন্ন কাজ:",
     'pending_tasks': "বাকি কাজ:",
     'completion_rate': "সম্পন্নতার হার:",
+    'routine_completions': "রুটিন সম্পন্ন:",
+    'current_streak': "চলতি ধারাবাহিকতা:",
+    'best_streak': "সেরা ধারাবাহিকতা:",
+    'adherence_7': "গত ৭ দিনে রুটিন পালন:",
+    'adherence_30': "গত ৩০ দিনে রুটিন পালন:",
     
     # Help
     'help_title': f"{EMOJIS['help']} সহায়তা",
@@ -182,6 +264,33 @@ CALLBACK_DATA = {
     'cancel': 'cancel'
 }
 
+# Paged list views: callback data of a view's first page -> prefix of its other pages,
+# which is followed by the offset of the page
+PAGE_CALLBACKS = {
+    'view_routines': 'page_routines_',
+    'edit_routine': 'page_edit_routines_',
+    'delete_routine': 'page_delete_routines_',
+    'view_tasks': 'page_tasks_',
+    'complete_task': 'page_complete_tasks_',
+    'delete_task': 'page_delete_tasks_'
+}
+
+# Action codes of the callback prefixes that carry a routine or task id. Their buttons send
+# "!<code><epoch><index>" and the id itself stays in a server-side table (router.CallbackCodec)
+# of at most CALLBACK_PAYLOAD_CAPACITY ids, keeping callback data far below Telegram's 64 bytes
+CALLBACK_CODES = {
+    'select_routine_': 'r',
+    'done_routine_': 'n',
+    'delete_routine_': 'x',
+    'confirm_delete_routine_': 'X',
+    'edit_routine_': 'e',
+    'select_task_': 't',
+    'complete_task_': 'c',
+    'delete_task_': 'd',
+    'confirm_delete_task_': 'D'
+}
+CALLBACK_PAYLOAD_CAPACITY = 50000
+
 # States for conversation handlers
 STATES = {
     'WAITING_ROUTINE_NAME': 'WAITING_ROUTINE_NAME',
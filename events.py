@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Change events emitted by the storage engines
+Consumers update derived state per change instead of recomputing it from the whole user record
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Callable, Tuple
+from models import model
+
+logger = logging.getLogger(__name__)
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+
+# Storage change-record sections and the entity each one describes
+SECTION_ENTITIES = {"user": "user", "profile": "profile", "routines": "routine", "tasks": "task"}
+
+
+@model
+class ChangeEvent:
+    """One entity of one user changed; before/after are records in the bot_data.json schema"""
+    user_id: str
+    entity: str
+    entity_id: Optional[str]
+    action: str
+    before: Optional[Dict[str, Any]] = None
+    after: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def between(cls, user_id: str, entity: str, entity_id: Optional[str],
+                before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> "ChangeEvent":
+        """Build an event, deriving the action from which side is missing"""
+        if before is None:
+            action = CREATED
+        elif after is None:
+            action = DELETED
+        else:
+            action = UPDATED
+        return cls(user_id, entity, entity_id, action, before, after)
+
+    def changed_fields(self) -> List[str]:
+        """Keys whose value differs between before and after"""
+        before = self.before or {}
+        after = self.after or {}
+        return [key for key in {**before, **after} if before.get(key) != after.get(key)]
+
+
+def events_from_changes(user_id: str, before: Optional[Dict[str, Any]], changes) -> List[ChangeEvent]:
+    """Turn storage change records into events, looking up the previous values in `before`
+
+    Stats records are left out; they are counters derived from the routine and task events.
+    """
+    events = []
+    for section, key, value in changes:
+        entity = SECTION_ENTITIES.get(section)
+        if entity is None:
+            continue
+
+        if section == "user":
+            previous = before
+        elif before is None:
+            previous = None
+        elif key is None:
+            previous = before.get(section)
+        else:
+            previous = next((item for item in before.get(section, []) if item.get("id") == key), None)
+        if previous is None and value is None:
+            # Deleting something that didn't exist changes nothing
+            continue
+        events.append(ChangeEvent.between(user_id, entity, key, previous, value))
+    return events
+
+
+class EventBus:
+    """Fan change events out to synchronous callbacks and asyncio queues
+
+    Callbacks run on the thread that made the change, while it still holds the storage lock,
+    so they must be quick and must not block on the event loop. Asyncio consumers get their
+    own queue and are fed thread-safely on their loop.
+    """
+
+    def __init__(self):
+        self._subscribers: List[Callable[[ChangeEvent], None]] = []
+        self._queues: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None]) -> Callable[[], None]:
+        """Call `callback` with every event; returns a function that unsubscribes it"""
+        with self._lock:
+            self._subscribers = self._subscribers + [callback]
+
+        def unsubscribe():
+            with self._lock:
+                self._subscribers = [s for s in self._subscribers if s is not callback]
+        return unsubscribe
+
+    def queue(self, maxsize: int = 0) -> asyncio.Queue:
+        """Return a queue receiving every event, bound to the running event loop"""
+        queue = asyncio.Queue(maxsize)
+        with self._lock:
+            self._queues = self._queues + [(asyncio.get_running_loop(), queue)]
+        return queue
+
+    def close_queue(self, queue: asyncio.Queue):
+        with self._lock:
+            self._queues = [(loop, q) for loop, q in self._queues if q is not queue]
+
+    def publish(self, events: List[ChangeEvent]):
+        """Deliver events in order to every subscriber and queue"""
+        if not events:
+            return
+
+        # Lists are replaced rather than mutated, so iterating a snapshot needs no lock
+        for callback in self._subscribers:
+            for event in events:
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error(f"Error in change event subscriber {callback!r}: {e}")
+
+        for loop, queue in self._queues:
+            for event in events:
+                try:
+                    loop.call_soon_threadsafe(self._put, queue, event)
+                except RuntimeError:
+                    # The loop has been closed; the queue will never be read again
+                    self.close_queue(queue)
+                    break
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, event: ChangeEvent):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning(f"Change event queue full, dropping {event.entity} event for user {event.user_id}")
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Crash-safe file helpers
+Windows-compatible UTF-8 encoding
+"""
+
+import os
+import tempfile
+from typing import Union
+
+
+def atomic_write(path: str, content: Union[str, bytes]):
+    """Replace a file so readers see either the old or the new content, never a partial one
+
+    The content goes to a temporary file in the same directory, is fsynced, and is then
+    renamed over the target. The directory is fsynced too so the rename survives a crash.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory: str):
+    """Persist a rename in the directory entry (not supported on Windows)"""
+    if os.name == 'nt':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
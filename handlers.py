@@ -4,24 +4,33 @@ Telegram bot handlers for commands and callbacks
 Handles all user interactions with the bot
 """
 
+import functools
 import logging
 from datetime import datetime, timezone
-from typing import Dict, Any, List
+from typing import Optional, Union
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from storage import StorageManager
-from ui import UIManager
-from constants import BENGALI_TEXT, STATES, EMOJIS
+from async_storage import AsyncStorageManager
+from ui import UIManager, shared_ui_manager
+from router import CallbackRouter, TOKEN_MARK
+from timeutils import validate_time_format, local_day
+from constants import BENGALI_TEXT, STATES, EMOJIS, TIMEZONE_OPTIONS, REMINDER_INTERVALS, PAGE_CALLBACKS
 
 logger = logging.getLogger(__name__)
 
 class BotHandlers:
-    def __init__(self, storage_manager: StorageManager):
-        self.storage = storage_manager
-        self.ui = UIManager()
+    def __init__(self, storage_manager: Union[StorageManager, AsyncStorageManager], ui: Optional[UIManager] = None):
+        # Handlers always await storage so disk I/O never blocks the event loop
+        if isinstance(storage_manager, AsyncStorageManager):
+            self.storage = storage_manager
+        else:
+            self.storage = AsyncStorageManager(storage_manager)
+        self.ui = ui if ui is not None else shared_ui_manager()
         self.text = BENGALI_TEXT
         self.states = STATES
         self.emojis = EMOJIS
+        self.router = self._build_router()
         
         # Temporary storage for conversation states
         self.temp_data = {}
@@ -30,16 +39,16 @@ class BotHandlers:
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         user = update.effective_user
-        user_data = self.storage.get_user_data(user.id)
+        profile = await self.storage.get_user_profile(user.id)
         
         # Update profile with user info if available
-        if not user_data['profile']['name'] and user.first_name:
-            self.storage.update_user_profile(user.id, {
+        if not profile.name and user.first_name:
+            await self.storage.update_user_profile(user.id, {
                 'name': user.first_name
             })
-            user_data = self.storage.get_user_data(user.id)
+            profile = await self.storage.get_user_profile(user.id)
         
-        welcome_message = self.ui.format_welcome_message(user_data['profile']['name'])
+        welcome_message = self.ui.format_welcome_message(profile.name)
         
         await update.message.reply_text(
             welcome_message,
@@ -65,7 +74,7 @@ class BotHandlers:
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /stats command"""
         user = update.effective_user
-        stats = self.storage.get_user_stats(user.id)
+        stats = await self.storage.get_user_stats(user.id)
         stats_message = self.ui.format_stats_message(stats)
         
         await update.message.reply_text(
@@ -74,107 +83,88 @@ class BotHandlers:
             parse_mode='Markdown'
         )
     
+    def _build_router(self) -> CallbackRouter:
+        """Callback data -> handler table for button_callback
+        
+        Handlers receive whichever of query, user_id and context they take; prefix routes
+        also pass the rest of the callback data under the given argument name.
+        """
+        router = CallbackRouter(self.ui.codec)
+        exact_routes = {
+            # Main menu navigation
+            'main_menu': self.show_main_menu,
+            'routines': self.show_routine_menu,
+            'tasks': self.show_task_menu,
+            'settings': self.show_settings_menu,
+            'stats': self.show_stats,
+            'help': self.show_help,
+            'reminders': self.show_reminder_menu,
+            # Routine operations
+            'add_routine': self.start_add_routine,
+            'view_routines': self.show_routines_list,
+            'edit_routine': self.show_routines_for_edit,
+            'delete_routine': self.show_routines_for_delete,
+            'type_daily': functools.partial(self.handle_routine_type_selection, routine_type='daily'),
+            'type_weekly': functools.partial(self.handle_routine_type_selection, routine_type='weekly'),
+            # Task operations
+            'add_task': self.start_add_task,
+            'view_tasks': self.show_tasks_list,
+            'complete_task': self.show_tasks_for_completion,
+            'delete_task': self.show_tasks_for_delete,
+            # Settings
+            'change_name': self.start_change_name,
+            'change_timezone': self.show_timezone_options,
+            'reminder_settings': self.show_reminder_settings,
+            # Cancel and save
+            'cancel': self.cancel_operation,
+            'save': self.handle_save_operation,
+        }
+        for data, handler in exact_routes.items():
+            router.exact(data, handler)
+        
+        # prefix, handler, argument name, conversion of the remainder
+        prefix_routes = [
+            ('select_routine_', self.show_routine_details, 'routine_id', None),
+            ('done_routine_', self.complete_routine, 'routine_id', None),
+            ('delete_routine_', self.confirm_delete_routine, 'routine_id', None),
+            ('confirm_delete_routine_', self.delete_routine_confirmed, 'routine_id', None),
+            # No per-routine editor yet; the edit button opens the existing edit screen
+            ('edit_routine_', self.show_routines_for_edit, 'routine_id', None),
+            ('select_task_', self.show_task_details, 'task_id', None),
+            ('complete_task_', self.complete_task, 'task_id', None),
+            ('delete_task_', self.confirm_delete_task, 'task_id', None),
+            ('confirm_delete_task_', self.delete_task_confirmed, 'task_id', None),
+            ('day_', self.toggle_day_selection, 'day', None),
+            ('interval_', self.toggle_interval_selection, 'interval', int),
+            ('set_timezone_', self.set_timezone, 'tz_name', None),
+            ('default_interval_', self.set_default_interval, 'interval', int),
+        ]
+        for prefix, handler, arg, convert in prefix_routes:
+            router.prefix(prefix, handler, arg, convert)
+        
+        # Later pages of the list views go to the same handlers, with the page's offset
+        for view, prefix in PAGE_CALLBACKS.items():
+            router.prefix(prefix, exact_routes[view], 'offset', int)
+        return router
+    
     # Callback Query Handlers
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle all inline keyboard button callbacks"""
         query = update.callback_query
         await query.answer()
         
-        data = query.data
-        user_id = query.from_user.id
-        
-        # Main menu navigation
-        if data == 'main_menu':
-            await self.show_main_menu(query, user_id)
-        elif data == 'routines':
-            await self.show_routine_menu(query)
-        elif data == 'tasks':
-            await self.show_task_menu(query)
-        elif data == 'settings':
-            await self.show_settings_menu(query)
-        elif data == 'stats':
-            await self.show_stats(query, user_id)
-        elif data == 'help':
-            await self.show_help(query)
-        elif data == 'reminders':
-            await self.show_reminder_menu(query)
-        
-        # Routine operations
-        elif data == 'add_routine':
-            await self.start_add_routine(query, user_id, context)
-        elif data == 'view_routines':
-            await self.show_routines_list(query, user_id)
-        elif data == 'edit_routine':
-            await self.show_routines_for_edit(query, user_id)
-        elif data == 'delete_routine':
-            await self.show_routines_for_delete(query, user_id)
-        
-        # Task operations
-        elif data == 'add_task':
-            await self.start_add_task(query, user_id, context)
-        elif data == 'view_tasks':
-            await self.show_tasks_list(query, user_id)
-        elif data == 'complete_task':
-            await self.show_tasks_for_completion(query, user_id)
-        elif data == 'delete_task':
-            await self.show_tasks_for_delete(query, user_id)
-        
-        # Dynamic callbacks
-        elif data.startswith('select_routine_'):
-            routine_id = data.replace('select_routine_', '')
-            await self.show_routine_details(query, user_id, routine_id)
-        elif data.startswith('complete_task_'):
-            task_id = data.replace('complete_task_', '')
-            await self.complete_task(query, user_id, task_id)
-        elif data.startswith('delete_task_'):
-            task_id = data.replace('delete_task_', '')
-            await self.confirm_delete_task(query, user_id, task_id)
-        elif data.startswith('delete_routine_'):
-            routine_id = data.replace('delete_routine_', '')
-            await self.confirm_delete_routine(query, user_id, routine_id)
-        elif data.startswith('confirm_delete_task_'):
-            task_id = data.replace('confirm_delete_task_', '')
-            await self.delete_task_confirmed(query, user_id, task_id)
-        elif data.startswith('confirm_delete_routine_'):
-            routine_id = data.replace('confirm_delete_routine_', '')
-            await self.delete_routine_confirmed(query, user_id, routine_id)
-        
-        # Routine type selection
-        elif data == 'type_daily':
-            await self.handle_routine_type_selection(query, user_id, 'daily', context)
-        elif data == 'type_weekly':
-            await self.handle_routine_type_selection(query, user_id, 'weekly', context)
-        
-        # Day selection for weekly routines
-        elif data.startswith('day_'):
-            day = data.replace('day_', '')
-            await self.toggle_day_selection(query, user_id, day)
-        
-        # Reminder interval selection
-        elif data.startswith('interval_'):
-            interval = int(data.replace('interval_', ''))
-            await self.toggle_interval_selection(query, user_id, interval)
-        
-        # Settings
-        elif data == 'change_name':
-            await self.start_change_name(query, user_id, context)
-        elif data == 'change_timezone':
-            await self.show_timezone_options(query)
-        elif data == 'reminder_settings':
-            await self.show_reminder_settings(query, user_id)
-        
-        # Cancel operations
-        elif data == 'cancel':
-            await self.cancel_operation(query, user_id, context)
-        
-        # Save operations
-        elif data == 'save':
-            await self.handle_save_operation(query, user_id, context)
+        handled = await self.router.dispatch(query.data, query=query, user_id=query.from_user.id, context=context)
+        if not handled and query.data.startswith(TOKEN_MARK):
+            # A list button whose id has left the payload table (or was issued before a restart)
+            await query.edit_message_text(
+                self.text['button_expired'],
+                reply_markup=self.ui.get_main_menu_keyboard()
+            )
     
     async def show_main_menu(self, query, user_id):
         """Show main menu"""
-        user_data = self.storage.get_user_data(user_id)
-        welcome_message = self.ui.format_welcome_message(user_data['profile']['name'])
+        profile = await self.storage.get_user_profile(user_id)
+        welcome_message = self.ui.format_welcome_message(profile.name)
         
         await query.edit_message_text(
             welcome_message,
@@ -203,16 +193,32 @@ class BotHandlers:
             reply_markup=self.ui.get_settings_menu_keyboard()
         )
     
+    async def _show_screen(self, query, user_id, screen: str, page, render, **kwargs):
+        """Edit the message to a screen, reusing its last rendering while the user's data is unchanged
+        
+        `render` is awaited for (text, keyboard) on a cache miss; the version is read before it
+        runs, so a rendering is never filed under a newer version than the data it shows.
+        """
+        version = await self.storage.data_version(user_id)
+        rendered = self.ui.cached_screen(user_id, screen, page, version)
+        if rendered is None:
+            rendered = await render()
+            self.ui.cache_screen(user_id, screen, page, version, *rendered)
+        
+        text, keyboard = rendered
+        await query.edit_message_text(text, reply_markup=keyboard, **kwargs)
+    
     async def show_stats(self, query, user_id):
         """Show user statistics"""
-        stats = self.storage.get_user_stats(user_id)
-        stats_message = self.ui.format_stats_message(stats)
+        # Streaks and adherence also move with the date, so the local day is part of the key
+        profile = await self.storage.get_user_profile(user_id)
+        today = local_day(profile.timezone, datetime.now(timezone.utc).timestamp())
         
-        await query.edit_message_text(
-            stats_message,
-            reply_markup=self.ui.get_back_only_keyboard(),
-            parse_mode='Markdown'
-        )
+        async def render():
+            stats = await self.storage.get_user_stats(user_id)
+            return self.ui.format_stats_message(stats), self.ui.get_back_only_keyboard()
+        
+        await self._show_screen(query, user_id, 'stats', today, render, parse_mode='Markdown')
     
     async def show_help(self, query):
         """Show help message"""
@@ -238,84 +244,68 @@ class BotHandlers:
             reply_markup=self.ui.get_back_only_keyboard()
         )
     
-    async def show_routines_list(self, query, user_id):
-        """Show list of user routines"""
-        routines = self.storage.get_user_routines(user_id)
-        message = self.ui.format_routine_list_message(routines)
+    async def show_routines_list(self, query, user_id, offset=0):
+        """Show one page of the user's routines"""
+        async def render():
+            page = await self.storage.get_routine_page(user_id, offset)
+            return (self.ui.format_routine_list_message(page),
+                    self.ui.get_routine_list_keyboard(page, page_callback=PAGE_CALLBACKS['view_routines']))
         
-        await query.edit_message_text(
-            message,
-            reply_markup=self.ui.get_routine_list_keyboard(routines)
-        )
+        await self._show_screen(query, user_id, 'view_routines', offset, render)
     
-    async def show_tasks_list(self, query, user_id):
-        """Show list of user tasks"""
-        tasks = self.storage.get_user_tasks(user_id)
-        message = self.ui.format_task_list_message(tasks)
+    async def show_tasks_list(self, query, user_id, offset=0):
+        """Show one page of the user's tasks"""
+        async def render():
+            page = await self.storage.get_task_page(user_id, offset)
+            return (self.ui.format_task_list_message(page),
+                    self.ui.get_task_list_keyboard(page, "select", PAGE_CALLBACKS['view_tasks']))
         
-        await query.edit_message_text(
-            message,
-            reply_markup=self.ui.get_task_list_keyboard(tasks, "select")
-        )
+        await self._show_screen(query, user_id, 'view_tasks', offset, render)
     
-    async def show_tasks_for_completion(self, query, user_id):
+    async def show_tasks_for_completion(self, query, user_id, offset=0):
         """Show pending tasks for completion"""
-        tasks = self.storage.get_user_tasks(user_id, completed=False)
-        message = self.ui.format_task_list_message(tasks, completed=False)
-        
-        if not tasks:
-            message = f"{self.emojis['success']} সমস্ত কাজ সম্পন্ন হয়েছে!"
+        async def render():
+            page = await self.storage.get_task_page(user_id, offset, completed=False, by_deadline=True)
+            message = self.ui.format_task_list_message(page, completed=False)
+            if not page.total:
+                message = f"{self.emojis['success']} সমস্ত কাজ সম্পন্ন হয়েছে!"
+            return message, self.ui.get_task_list_keyboard(page, "complete", PAGE_CALLBACKS['complete_task'])
         
-        await query.edit_message_text(
-            message,
-            reply_markup=self.ui.get_task_list_keyboard(tasks, "complete")
-        )
+        await self._show_screen(query, user_id, 'complete_task', offset, render)
     
-    async def show_tasks_for_delete(self, query, user_id):
+    async def show_tasks_for_delete(self, query, user_id, offset=0):
         """Show tasks for deletion"""
-        tasks = self.storage.get_user_tasks(user_id)
-        message = self.ui.format_task_list_message(tasks)
+        async def render():
+            page = await self.storage.get_task_page(user_id, offset)
+            return (self.ui.format_task_list_message(page),
+                    self.ui.get_task_list_keyboard(page, "delete", PAGE_CALLBACKS['delete_task']))
         
-        await query.edit_message_text(
-            message,
-            reply_markup=self.ui.get_task_list_keyboard(tasks, "delete")
-        )
+        await self._show_screen(query, user_id, 'delete_task', offset, render)
     
-    async def show_routines_for_edit(self, query, user_id):
+    async def show_routines_for_edit(self, query, user_id, offset=0):
         """Show routines for editing"""
-        routines = self.storage.get_user_routines(user_id)
-        message = f"{self.emojis['edit']} সম্পাদনার জন্য রুটিন নির্বাচন করুন:\n\n"
-        message += self.ui.format_routine_list_message(routines)
+        async def render():
+            page = await self.storage.get_routine_page(user_id, offset)
+            message = f"{self.emojis['edit']} সম্পাদনার জন্য রুটিন নির্বাচন করুন:\n\n"
+            message += self.ui.format_routine_list_message(page)
+            return message, self.ui.get_routine_list_keyboard(page, page_callback=PAGE_CALLBACKS['edit_routine'])
         
-        await query.edit_message_text(
-            message,
-            reply_markup=self.ui.get_routine_list_keyboard(routines)
-        )
+        await self._show_screen(query, user_id, 'edit_routine', offset, render)
     
-    async def show_routines_for_delete(self, query, user_id):
+    async def show_routines_for_delete(self, query, user_id, offset=0):
         """Show routines for deletion"""
-        routines = self.storage.get_user_routines(user_id)
-        message = f"{self.emojis['delete']} মুছে ফেলার জন্য রুটিন নির্বাচন করুন:\n\n"
-        message += self.ui.format_routine_list_message(routines)
+        async def render():
+            page = await self.storage.get_routine_page(user_id, offset)
+            message = f"{self.emojis['delete']} মুছে ফেলার জন্য রুটিন নির্বাচন করুন:\n\n"
+            message += self.ui.format_routine_list_message(page)
+            return message, self.ui.get_routine_list_keyboard(page, "delete", PAGE_CALLBACKS['delete_routine'])
         
-        # Create delete-specific keyboard
-        keyboard = []
-        for routine in routines[:10]:
-            keyboard.append([InlineKeyboardButton(
-                f"{self.emojis['delete']} {routine['name'][:30]}",
-                callback_data=f"delete_routine_{routine['id']}"
-            )])
-        keyboard.append([InlineKeyboardButton(self.text['btn_back'], callback_data='routines')])
-        
-        await query.edit_message_text(
-            message,
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        await self._show_screen(query, user_id, 'delete_routine', offset, render)
     
     async def complete_task(self, query, user_id, task_id):
         """Mark task as completed"""
         try:
-            self.storage.complete_task(user_id, task_id)
+            await self.storage.complete_task(user_id, task_id)
             await query.edit_message_text(
                 self.text['task_completed'],
                 reply_markup=self.ui.get_back_only_keyboard()
@@ -327,11 +317,29 @@ class BotHandlers:
                 reply_markup=self.ui.get_back_only_keyboard()
             )
     
+    async def complete_routine(self, query, user_id, routine_id):
+        """Mark a routine done for today"""
+        try:
+            routine = await self.storage.complete_routine(user_id, routine_id)
+            if routine is None:
+                message = self.text['routine_already_done']
+            else:
+                message = self.text['routine_done'].format(streak=routine.streak)
+            
+            keyboard = [[InlineKeyboardButton(self.text['btn_back'], callback_data=self.ui.item_callback("select_routine_", routine_id))]]
+            await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+        except Exception as e:
+            logger.error(f"Error completing routine: {e}")
+            await query.edit_message_text(
+                self.text['error_occurred'],
+                reply_markup=self.ui.get_back_only_keyboard()
+            )
+    
     async def confirm_delete_task(self, query, user_id, task_id):
         """Confirm task deletion"""
         keyboard = [
             [
-                InlineKeyboardButton(f"{self.emojis['delete']} নিশ্চিত মুছুন", callback_data=f"confirm_delete_task_{task_id}"),
+                InlineKeyboardButton(f"{self.emojis['delete']} নিশ্চিত মুছুন", callback_data=self.ui.item_callback("confirm_delete_task_", task_id)),
                 InlineKeyboardButton(self.text['btn_cancel'], callback_data='tasks')
             ]
         ]
@@ -341,10 +349,24 @@ class BotHandlers:
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
     
+    async def confirm_delete_routine(self, query, user_id, routine_id):
+        """Confirm routine deletion"""
+        keyboard = [
+            [
+                InlineKeyboardButton(f"{self.emojis['delete']} নিশ্চিত মুছুন", callback_data=self.ui.item_callback("confirm_delete_routine_", routine_id)),
+                InlineKeyboardButton(self.text['btn_cancel'], callback_data='routines')
+            ]
+        ]
+        
+        await query.edit_message_text(
+            f"{self.emojis['warning']} আপনি কি নিশ্চিত যে এই রুটিনটি মুছে ফেলতে চান?",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
     async def delete_task_confirmed(self, query, user_id, task_id):
         """Actually delete the task after confirmation"""
         try:
-            self.storage.delete_task(user_id, task_id)
+            await self.storage.delete_task(user_id, task_id)
             await query.edit_message_text(
                 self.text['item_deleted'],
                 reply_markup=self.ui.get_back_only_keyboard()
@@ -359,7 +381,7 @@ class BotHandlers:
     async def delete_routine_confirmed(self, query, user_id, routine_id):
         """Actually delete the routine after confirmation"""
         try:
-            self.storage.delete_routine(user_id, routine_id)
+            await self.storage.delete_routine(user_id, routine_id)
             await query.edit_message_text(
                 self.text['item_deleted'],
                 reply_markup=self.ui.get_back_only_keyboard()
@@ -373,8 +395,8 @@ class BotHandlers:
     
     async def show_routine_details(self, query, user_id, routine_id):
         """Show detailed view of a routine"""
-        routines = self.storage.get_user_routines(user_id)
-        routine = next((r for r in routines if r['id'] == routine_id), None)
+        routines = await self.storage.get_user_routines(user_id)
+        routine = next((r for r in routines if r.id == routine_id), None)
         
         if not routine:
             await query.edit_message_text(
@@ -383,13 +405,18 @@ class BotHandlers:
             )
             return
         
-        routine_details = self.ui.format_routine_details(routine)
+        profile = await self.storage.get_user_profile(user_id)
+        today = local_day(profile.timezone, datetime.now(timezone.utc).timestamp())
+        routine_details = self.ui.format_routine_details(routine, today, profile.timezone)
         
         # Create action buttons for this routine
         keyboard = [
             [
-                InlineKeyboardButton(f"{self.emojis['edit']} সম্পাদনা", callback_data=f"edit_routine_{routine_id}"),
-                InlineKeyboardButton(f"{self.emojis['delete']} মুছুন", callback_data=f"delete_routine_{routine_id}")
+                InlineKeyboardButton(self.text['btn_routine_done'], callback_data=self.ui.item_callback("done_routine_", routine_id))
+            ],
+            [
+                InlineKeyboardButton(f"{self.emojis['edit']} সম্পাদনা", callback_data=self.ui.item_callback("edit_routine_", routine_id)),
+                InlineKeyboardButton(f"{self.emojis['delete']} মুছুন", callback_data=self.ui.item_callback("delete_routine_", routine_id))
             ],
             [
                 InlineKeyboardButton(self.text['btn_back'], callback_data='view_routines')
@@ -402,6 +429,30 @@ class BotHandlers:
             parse_mode='Markdown'
         )
     
+    async def show_task_details(self, query, user_id, task_id):
+        """Show detailed view of a task"""
+        tasks = await self.storage.get_user_tasks(user_id)
+        task = next((t for t in tasks if t.id == task_id), None)
+        
+        if not task:
+            await query.edit_message_text(
+                self.text['no_items_found'],
+                reply_markup=self.ui.get_back_only_keyboard()
+            )
+            return
+        
+        keyboard = []
+        if not task.completed:
+            keyboard.append([InlineKeyboardButton(self.text['btn_complete_task'], callback_data=self.ui.item_callback("complete_task_", task_id))])
+        keyboard.append([InlineKeyboardButton(f"{self.emojis['delete']} মুছুন", callback_data=self.ui.item_callback("delete_task_", task_id))])
+        keyboard.append([InlineKeyboardButton(self.text['btn_back'], callback_data='view_tasks')])
+        
+        await query.edit_message_text(
+            self.ui.format_task_details(task),
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+    
     async def handle_routine_type_selection(self, query, user_id, routine_type, context):
         """Handle routine type selection (daily/weekly)"""
         if user_id not in self.temp_data:
@@ -423,7 +474,7 @@ class BotHandlers:
                     'reminder_intervals': [15]  # Default
                 }
                 
-                routine_id = self.storage.add_routine(user_id, routine_data)
+                routine_id = await self.storage.add_routine(user_id, routine_data)
                 
                 # Clean up temp data
                 del self.temp_data[user_id]
@@ -475,8 +526,8 @@ class BotHandlers:
         """Toggle reminder interval selection"""
         if user_id not in self.temp_data:
             # This might be called from settings, handle gracefully
-            user_data = self.storage.get_user_data(user_id)
-            current_intervals = [user_data['profile']['reminder_interval']]
+            profile = await self.storage.get_user_profile(user_id)
+            current_intervals = [profile.reminder_interval]
         else:
             current_intervals = self.temp_data[user_id].get('selected_intervals', [15])
         
@@ -527,6 +578,40 @@ class BotHandlers:
         
         return self.states['WAITING_PROFILE_NAME']
     
+    async def show_timezone_options(self, query, user_id):
+        """Show the timezones a user can switch to"""
+        profile = await self.storage.get_user_profile(user_id)
+        await query.edit_message_text(
+            self.text['select_timezone'].format(current=profile.timezone),
+            reply_markup=self.ui.get_timezone_keyboard(profile.timezone)
+        )
+    
+    async def set_timezone(self, query, user_id, tz_name):
+        """Save the selected timezone"""
+        if tz_name not in TIMEZONE_OPTIONS:
+            await query.edit_message_text(self.text['invalid_format'], reply_markup=self.ui.get_settings_menu_keyboard())
+            return
+        
+        await self.storage.update_user_profile(user_id, {'timezone': tz_name})
+        await query.edit_message_text(self.text['settings_saved'], reply_markup=self.ui.get_settings_menu_keyboard())
+    
+    async def show_reminder_settings(self, query, user_id):
+        """Show the default reminder interval options"""
+        profile = await self.storage.get_user_profile(user_id)
+        await query.edit_message_text(
+            self.text['select_default_interval'],
+            reply_markup=self.ui.get_default_interval_keyboard(profile.reminder_interval)
+        )
+    
+    async def set_default_interval(self, query, user_id, interval):
+        """Save the selected default reminder interval"""
+        if interval not in REMINDER_INTERVALS:
+            await query.edit_message_text(self.text['invalid_format'], reply_markup=self.ui.get_settings_menu_keyboard())
+            return
+        
+        await self.storage.update_user_profile(user_id, {'reminder_interval': interval})
+        await query.edit_message_text(self.text['settings_saved'], reply_markup=self.ui.get_settings_menu_keyboard())
+    
     async def cancel_operation(self, query, user_id, context):
         """Cancel current operation"""
         if user_id in self.temp_data:
@@ -570,7 +655,7 @@ class BotHandlers:
                     'reminder_intervals': temp_data.get('selected_intervals', [15])
                 }
                 
-                routine_id = self.storage.add_routine(user_id, routine_data)
+                routine_id = await self.storage.add_routine(user_id, routine_data)
                 
                 # Clean up temp data
                 del self.temp_data[user_id]
@@ -664,7 +749,7 @@ class BotHandlers:
                 'reminder_intervals': [15]  # Default reminder
             }
             
-            task_id = self.storage.add_task(user_id, task_data)
+            task_id = await self.storage.add_task(user_id, task_data)
             
             await update.message.reply_text(
                 self.text['task_created'],
@@ -692,7 +777,7 @@ class BotHandlers:
             return self.states['WAITING_PROFILE_NAME']
         
         try:
-            self.storage.update_user_profile(user_id, {'name': new_name})
+            await self.storage.update_user_profile(user_id, {'name': new_name})
             await update.message.reply_text(
                 self.text['settings_saved'],
                 reply_markup=self.ui.get_main_menu_keyboard()
@@ -708,17 +793,7 @@ class BotHandlers:
     
     def _validate_time_format(self, time_str: str) -> bool:
         """Validate time format (HH:MM)"""
-        try:
-            parts = time_str.split(':')
-            if len(parts) != 2:
-                return False
-            
-            hours = int(parts[0])
-            minutes = int(parts[1])
-            
-            return 0 <= hours <= 23 and 0 <= minutes <= 59
-        except (ValueError, IndexError):
-            return False
+        return validate_time_format(time_str)
     
     # Error handler
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
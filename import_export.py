@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk import and export of routines and tasks as CSV or JSON Lines
+Rows are streamed in both directions; an import is applied in batches of one storage write each
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+from constants import STORAGE_BACKEND, IMPORT_BATCH_SIZE
+from storage import create_storage_manager
+from timeutils import validate_time_format, WEEKDAYS
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "jsonl")
+
+# Column order of both formats; in CSV, days and reminder_intervals are ";"-separated
+FIELDS = ("user_id", "kind", "name", "time", "type", "days", "deadline", "reminder_intervals")
+
+ROUTINE_TYPES = ("daily", "weekly")
+DEADLINE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def detect_format(path: str) -> str:
+    """Format implied by a file's extension (JSON Lines unless it ends in .csv)"""
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_rows(f, data_format: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line number, row) from an open text file without reading it all"""
+    if data_format == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError:
+            # Left for parse_row to reject along with the other invalid rows
+            yield line_number, line
+
+
+def _split(value) -> List[str]:
+    """A list field from either format: a JSON list or a ";"-separated CSV cell"""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(item).strip() for item in value]
+    return [item.strip() for item in str(value).split(";") if item.strip()]
+
+
+def parse_row(row: Dict[str, Any]) -> Tuple[int, str, Dict[str, Any]]:
+    """Validate one row and turn it into a (user id, kind, data) item for StorageManager.bulk_add
+
+    Raises ValueError describing the first problem found.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+
+    try:
+        user_id = int(row.get("user_id"))
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid user_id {row.get('user_id')!r}")
+
+    kind = str(row.get("kind") or "").strip()
+    name = str(row.get("name") or "").strip()
+    if kind not in ("routine", "task"):
+        raise ValueError(f"kind must be routine or task, not {kind!r}")
+    if not name:
+        raise ValueError("name is empty")
+
+    try:
+        intervals = [int(interval) for interval in _split(row.get("reminder_intervals"))] or [15]
+    except ValueError:
+        raise ValueError(f"invalid reminder_intervals {row.get('reminder_intervals')!r}")
+
+    if kind == "task":
+        deadline = str(row.get("deadline") or "").strip() or None
+        if deadline is not None:
+            try:
+                datetime.strptime(deadline, DEADLINE_FORMAT)
+            except ValueError:
+                raise ValueError(f"deadline must be YYYY-MM-DD HH:MM, not {deadline!r}")
+        return user_id, kind, {"name": name, "deadline": deadline, "reminder_intervals": intervals}
+
+    time_str = str(row.get("time") or "").strip()
+    if not validate_time_format(time_str):
+        raise ValueError(f"time must be HH:MM, not {time_str!r}")
+
+    routine_type = str(row.get("type") or "daily").strip()
+    days = [day.lower() for day in _split(row.get("days"))]
+    if routine_type not in ROUTINE_TYPES:
+        raise ValueError(f"type must be daily or weekly, not {routine_type!r}")
+    unknown = [day for day in days if day not in WEEKDAYS]
+    if unknown:
+        raise ValueError(f"unknown days {unknown}")
+    if routine_type == "weekly" and not days:
+        raise ValueError("weekly routine without days")
+
+    return user_id, kind, {"name": name, "time": time_str, "type": routine_type, "days": days,
+                           "reminder_intervals": intervals}
+
+
+def import_rows(storage, rows: Iterable[Tuple[int, Dict[str, Any]]],
+                batch_size: int = IMPORT_BATCH_SIZE) -> Tuple[int, List[str]]:
+    """Validate and add (line number, row) pairs, return (items imported, error messages)
+
+    Invalid rows are skipped and reported; valid ones are added with one storage write per
+    `batch_size` rows.
+    """
+    imported = 0
+    errors = []
+    batch = []
+    for line_number, row in rows:
+        try:
+            batch.append(parse_row(row))
+        except ValueError as e:
+            errors.append(f"line {line_number}: {e}")
+            continue
+
+        if len(batch) >= batch_size:
+            imported += storage.bulk_add(batch)
+            batch = []
+
+    if batch:
+        imported += storage.bulk_add(batch)
+    return imported, errors
+
+
+def import_file(storage, path: str, data_format: Optional[str] = None,
+                batch_size: int = IMPORT_BATCH_SIZE) -> Tuple[int, List[str]]:
+    """Import a CSV or JSON Lines file, see import_rows"""
+    data_format = data_format or detect_format(path)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return import_rows(storage, read_rows(f, data_format), batch_size)
+
+
+def export_rows(storage) -> Iterator[Dict[str, Any]]:
+    """Yield one row per routine and task, reading a single user at a time"""
+    for user_id_str in storage.user_ids():
+        user_data = storage.get_user_data(user_id_str)
+        for routine in user_data.get("routines", []):
+            yield {"user_id": user_id_str, "kind": "routine", "name": routine["name"], "time": routine["time"],
+                   "type": routine.get("type", "daily"), "days": routine.get("days") or [], "deadline": None,
+                   "reminder_intervals": routine.get("reminder_intervals") or []}
+        for task in user_data.get("tasks", []):
+            yield {"user_id": user_id_str, "kind": "task", "name": task["name"], "time": None, "type": None,
+                   "days": [], "deadline": task.get("deadline"),
+                   "reminder_intervals": task.get("reminder_intervals") or []}
+
+
+def write_rows(f, rows: Iterable[Dict[str, Any]], data_format: str) -> int:
+    """Write rows to an open text file as they come, return how many were written"""
+    count = 0
+    if data_format == "csv":
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                **row,
+                "days": ";".join(row["days"]),
+                "reminder_intervals": ";".join(str(interval) for interval in row["reminder_intervals"])
+            })
+            count += 1
+        return count
+
+    for row in rows:
+        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def export_file(storage, path: str, data_format: Optional[str] = None) -> int:
+    """Export every routine and task to a CSV or JSON Lines file, return the row count"""
+    data_format = data_format or detect_format(path)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        return write_rows(f, export_rows(storage), data_format)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export routines and tasks in bulk")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path", help="CSV or JSON Lines file")
+    parser.add_argument("--format", choices=FORMATS, help="file format (default: from the extension)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="rows per storage write")
+    args = parser.parse_args()
+
+    storage = create_storage_manager(os.getenv('STORAGE_BACKEND', STORAGE_BACKEND))
+    try:
+        if args.command == "import":
+            imported, errors = import_file(storage, args.path, args.format, args.batch_size)
+            for error in errors:
+                print(f"❌ {error}")
+            print(f"✅ Imported {imported} items, skipped {len(errors)} rows")
+        else:
+            count = export_file(storage, args.path, args.format)
+            print(f"✅ Exported {count} items to {args.path}")
+    finally:
+        storage.close()
+
+
+if __name__ == '__main__':
+    main()
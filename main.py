@@ -13,9 +13,11 @@ Features:
 - Windows-compatible UTF-8 encoding
 """
 
+import asyncio
 import logging
 import os
 import sys
+from telegram import Update
 from telegram.ext import (
     Application, 
     CommandHandler, 
@@ -25,9 +27,14 @@ from telegram.ext import (
     filters
 )
 
-from storage import StorageManager
+from storage import create_storage_manager
+from async_storage import AsyncStorageManager
+from backup import BackupService
 from handlers import BotHandlers
-from constants import COMMANDS, STATES
+from reminders import ReminderEngine
+from overdue import OverdueSweeper
+from sender import MessageSender
+from constants import COMMANDS, STATES, STORAGE_BACKEND, SENDER_GLOBAL_RATE
 
 # Configure logging
 logging.basicConfig(
@@ -41,40 +48,50 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+def get_bot_token() -> str:
+    """Get bot token from environment variable or config"""
+    token = os.getenv('BOT_TOKEN')
+    
+    if not token:
+        logger.error("Bot token not found. Please set BOT_TOKEN environment variable.")
+        print("\n" + "="*50)
+        print("⚠️  BOT TOKEN প্রয়োজন")
+        print("="*50)
+        print("Bot চালানোর জন্য আপনার Telegram bot token প্রয়োজন।")
+        print("\n📝 কীভাবে token পাবেন:")
+        print("1. @BotFather এ যান Telegram এ")
+        print("2. /newbot কমান্ড দিন")
+        print("3. Bot এর নাম এবং username দিন")
+        print("4. Token কপি করুন")
+        print("\n💻 Token সেট করুন:")
+        print("Linux/Mac: export BOT_TOKEN='YOUR_TOKEN_HERE'")
+        print("Windows: set BOT_TOKEN=YOUR_TOKEN_HERE")
+        print("="*50)
+        sys.exit(1)
+    
+    return token
+
 class BengaliBotApp:
     """Main bot application class"""
     
-    def __init__(self):
-        """Initialize the bot application"""
+    def __init__(self, send_rate: float = SENDER_GLOBAL_RATE):
+        """Initialize the bot application; send_rate caps reminder messages per second"""
         self.token = self._get_bot_token()
-        self.storage = StorageManager()
-        self.handlers = BotHandlers(self.storage)
+        self.send_rate = send_rate
+        self.storage = create_storage_manager(os.getenv('STORAGE_BACKEND', STORAGE_BACKEND))
+        self.backup_service = BackupService(self.storage)
+        self.async_storage = AsyncStorageManager(self.storage)
+        self.reminders = ReminderEngine(self.storage)
+        self.overdue = OverdueSweeper(self.storage)
+        self.sender = None
+        self.handlers = BotHandlers(self.async_storage)
         self.application = None
         
         logger.info("Bengali Telegram Bot initialized")
     
     def _get_bot_token(self) -> str:
         """Get bot token from environment variable or config"""
-        token = os.getenv('BOT_TOKEN')
-        
-        if not token:
-            logger.error("Bot token not found. Please set BOT_TOKEN environment variable.")
-            print("\n" + "="*50)
-            print("⚠️  BOT TOKEN প্রয়োজন")
-            print("="*50)
-            print("Bot চালানোর জন্য আপনার Telegram bot token প্রয়োজন।")
-            print("\n📝 কীভাবে token পাবেন:")
-            print("1. @BotFather এ যান Telegram এ")
-            print("2. /newbot কমান্ড দিন")
-            print("3. Bot এর নাম এবং username দিন")
-            print("4. Token কপি করুন")
-            print("\n💻 Token সেট করুন:")
-            print("Linux/Mac: export BOT_TOKEN='YOUR_TOKEN_HERE'")
-            print("Windows: set BOT_TOKEN=YOUR_TOKEN_HERE")
-            print("="*50)
-            sys.exit(1)
-        
-        return token
+        return get_bot_token()
     
     def setup_handlers(self):
         """Set up all command and callback handlers"""
@@ -140,22 +157,60 @@ class BengaliBotApp:
     
     async def post_init(self, application: Application):
         """Post initialization setup"""
+        self.backup_service.start()
+        self.sender = MessageSender(application.bot, global_rate=self.send_rate)
+        await self.sender.start()
+        await self.reminders.start(self.sender)
+        await self.overdue.start(self.sender)
         logger.info("Bot post-initialization completed")
     
     async def post_shutdown(self, application: Application):
         """Cleanup after shutdown"""
+        await self.reminders.stop()
+        await self.overdue.stop()
+        if self.sender is not None:
+            await self.sender.stop()
+        self.backup_service.stop()
+        self.async_storage.shutdown()
+        self.storage.close()
+        logger.info(f"Callback routes: {self.handlers.router.summary()}")
         logger.info("Bot shutdown completed")
     
+    def build_application(self, polling: bool = True) -> Application:
+        """Create the telegram Application with all handlers registered"""
+        builder = Application.builder().token(self.token).post_init(self.post_init).post_shutdown(self.post_shutdown)
+        if not polling:
+            # Updates are fed in by a cluster front process (see cluster.py)
+            builder = builder.updater(None)
+        self.application = builder.build()
+        self.setup_handlers()
+        return self.application
+    
+    async def serve(self, updates):
+        """Process updates read from a queue (None stops) instead of polling Telegram"""
+        application = self.build_application(polling=False)
+        loop = asyncio.get_running_loop()
+        
+        async with application:
+            await self.post_init(application)
+            await application.start()
+            try:
+                while True:
+                    update_data = await loop.run_in_executor(None, updates.get)
+                    if update_data is None:
+                        break
+                    await application.update_queue.put(Update.de_json(update_data, application.bot))
+            finally:
+                await application.stop()
+                await self.post_shutdown(application)
+    
     def run(self):
         """Start the bot"""
         logger.info("Starting Bengali Telegram Bot...")
         
         try:
-            # Create application
-            self.application = Application.builder().token(self.token).post_init(self.post_init).post_shutdown(self.post_shutdown).build()
-            
-            # Setup handlers
-            self.setup_handlers()
+            # Create application and set up handlers
+            self.build_application()
             
             # Print startup information
             self._print_startup_info()
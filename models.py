@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+Typed in-memory models for users, routines and tasks
+Each model converts losslessly to and from the bot_data.json schema
+"""
+
+import sys
+from dataclasses import dataclass, field, fields, replace
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Iterable, Optional, Tuple, Union
+from constants import DEFAULT_TIMEZONE, ROUTINE_HISTORY_DAYS, PAGE_SIZE
+from timeutils import ALL_DAYS, weekday_mask, local_day, deadline_to_utc
+
+# __slots__ keeps per-record memory well below a dict's; dataclasses generate them from Python 3.10
+model = dataclass(slots=True) if sys.version_info >= (3, 10) else dataclass
+
+Timestamp = Union[datetime, str, None]
+
+
+def parse_timestamp(value: Any) -> Timestamp:
+    """Parse an ISO timestamp once, keeping values that wouldn't format back identically as strings"""
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        return parsed if parsed.isoformat() == value else value
+    return value
+
+
+def format_timestamp(value: Timestamp) -> Optional[str]:
+    """Inverse of parse_timestamp"""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def epoch_seconds(value: Timestamp) -> Optional[int]:
+    """Whole UTC epoch seconds of a parsed timestamp (naive ones are taken as UTC), or None"""
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def format_date(value: Timestamp) -> str:
+    """YYYY-MM-DD part of a timestamp, for display"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10] if value else ""
+
+
+# Per-class field names, looked up on every conversion
+_FIELD_NAMES: Dict[type, tuple] = {}
+_SPARSE_DEFAULTS: Dict[type, Dict[str, Any]] = {}
+
+
+class RecordMixin:
+    """Shared (de)serialization for the models
+
+    Keys a model doesn't know about are kept in `extra`, so older or newer records survive a
+    round trip unchanged. Models also answer record["key"] and record.get("key") for callers
+    written against the dict records.
+    """
+    __slots__ = ()
+
+    # Fields stored as ISO strings in the schema
+    TIMESTAMPS: tuple = ()
+    # Fields computed at read time and never persisted
+    DERIVED: tuple = ()
+    # Fields left out of the record while they hold their default, so records written
+    # before the field existed round-trip unchanged
+    SPARSE: tuple = ()
+
+    @classmethod
+    def _field_names(cls) -> tuple:
+        names = _FIELD_NAMES.get(cls)
+        if names is None:
+            names = _FIELD_NAMES[cls] = tuple(f.name for f in fields(cls) if f.name != "extra")
+        return names
+
+    @classmethod
+    def _sparse_defaults(cls) -> Dict[str, Any]:
+        defaults = _SPARSE_DEFAULTS.get(cls)
+        if defaults is None:
+            defaults = _SPARSE_DEFAULTS[cls] = {f.name: f.default for f in fields(cls) if f.name in cls.SPARSE}
+        return defaults
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]):
+        """Build a model from a record in the bot_data.json schema"""
+        names = cls._field_names()
+        values = {}
+        for name in names:
+            if name in data:
+                value = data[name]
+                values[name] = parse_timestamp(value) if name in cls.TIMESTAMPS else value
+        values["extra"] = {k: v for k, v in data.items() if k not in names}
+        return cls(**values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert back to a record in the bot_data.json schema"""
+        data = {}
+        sparse = self._sparse_defaults()
+        for name in self._field_names():
+            if name in self.DERIVED:
+                continue
+            value = getattr(self, name)
+            if name in sparse and value == sparse[name]:
+                continue
+            data[name] = format_timestamp(value) if name in self.TIMESTAMPS else value
+        data.update(self.extra)
+        return data
+
+    def update(self, values: Dict[str, Any]):
+        """Apply a partial update given in the schema's keys"""
+        names = self._field_names()
+        for key, value in values.items():
+            if key in names:
+                setattr(self, key, parse_timestamp(value) if key in self.TIMESTAMPS else value)
+            else:
+                self.extra[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._field_names():
+            return getattr(self, key)
+        return self.extra[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+@model
+class UserProfile(RecordMixin):
+    name: str = ""
+    timezone: str = DEFAULT_TIMEZONE
+    reminder_interval: int = 15
+    created: Timestamp = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    TIMESTAMPS = ("created",)
+
+
+@model
+class Routine(RecordMixin):
+    id: str = ""
+    name: str = ""
+    time: str = ""
+    days: List[str] = field(default_factory=list)
+    type: str = "daily"
+    reminder_intervals: List[int] = field(default_factory=lambda: [15])
+    active: bool = True
+    created: Timestamp = None
+    last_completed: Timestamp = None
+    # Completion tracking, all updated in O(1) by complete(): bit i of `history` is set if the
+    # routine was done i days before `history_day`, the local date ordinal of the last completion
+    completions: int = 0
+    streak: int = 0
+    best_streak: int = 0
+    history: int = 0
+    history_day: Optional[int] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    TIMESTAMPS = ("created", "last_completed")
+    SPARSE = ("completions", "streak", "best_streak", "history", "history_day")
+
+    def _schedule(self) -> int:
+        """Weekday bitmask of the days the routine is due (bit 0 is Monday)"""
+        if self.type == 'weekly':
+            return weekday_mask(tuple(self.days)) or ALL_DAYS
+        return ALL_DAYS
+
+    def _due_days(self, first: int, last: int) -> int:
+        """Number of days from `first` to `last` (date ordinals, inclusive) the routine is due"""
+        if last < first:
+            return 0
+        schedule = self._schedule()
+        weeks, rest = divmod(last - first + 1, 7)
+        count = weeks * bin(schedule).count("1")
+        for day in range(last - rest + 1, last + 1):
+            # date.fromordinal(1) is a Monday
+            if schedule & (1 << ((day - 1) % 7)):
+                count += 1
+        return count
+
+    def complete(self, day: int, when: Optional[datetime] = None) -> bool:
+        """Record the routine as done on local date ordinal `day`; False if it already was"""
+        if self.history_day is not None and day <= self.history_day:
+            return False
+
+        if self.history_day is None:
+            self.streak = 1
+            self.history = 1
+        else:
+            gap = day - self.history_day
+            # The streak survives as long as no due day was skipped since the last completion
+            self.streak = 1 if self._due_days(self.history_day + 1, day - 1) else self.streak + 1
+            self.history = ((self.history << gap) | 1) & ((1 << ROUTINE_HISTORY_DAYS) - 1) \
+                if gap < ROUTINE_HISTORY_DAYS else 1
+
+        self.history_day = day
+        self.best_streak = max(self.best_streak, self.streak)
+        self.completions += 1
+        self.last_completed = when
+        return True
+
+    def done_on(self, day: int) -> bool:
+        """Whether the routine was completed on local date ordinal `day`"""
+        if self.history_day is None or not 0 <= self.history_day - day < ROUTINE_HISTORY_DAYS:
+            return False
+        return bool(self.history >> (self.history_day - day) & 1)
+
+    def current_streak(self, today: int) -> int:
+        """Streak as of `today`: broken once a due day before today passes without a completion"""
+        if self.history_day is None or self._due_days(self.history_day + 1, today - 1):
+            return 0
+        return self.streak
+
+    def adherence(self, today: int, days: int, tz_name: str = DEFAULT_TIMEZONE) -> Tuple[int, int]:
+        """(Days done, days due) over the `days` days ending today, at most ROUTINE_HISTORY_DAYS
+
+        Days before the routine was created don't count, and today only counts once it's done.
+        """
+        first = today - min(days, ROUTINE_HISTORY_DAYS) + 1
+        if isinstance(self.created, datetime):
+            first = max(first, local_day(tz_name, self.created.timestamp()))
+
+        done_today = self.done_on(today)
+        due = self._due_days(first, today - 1) + (1 if done_today else 0)
+        if self.history_day is None:
+            return 0, due
+
+        # Bits of `history` that fall between `first` and today
+        window = min(self.history_day - first + 1, ROUTINE_HISTORY_DAYS)
+        if window <= 0:
+            return 0, due
+        offset = max(self.history_day - today, 0)
+        done = bin((self.history & ((1 << window) - 1)) >> offset).count("1")
+        return min(done, due), due
+
+
+@model
+class Task(RecordMixin):
+    id: str = ""
+    name: str = ""
+    deadline: Optional[str] = None
+    reminder_intervals: List[int] = field(default_factory=lambda: [15])
+    completed: bool = False
+    created: Timestamp = None
+    completed_at: Timestamp = None
+    # Epoch-second copies of the deadline (in the user's timezone) and timestamps, kept in
+    # step by normalize() so sorting and overdue checks are integer comparisons
+    deadline_ts: Optional[int] = None
+    created_ts: Optional[int] = None
+    completed_ts: Optional[int] = None
+    # Set once the user has been told the deadline passed, so it is announced only once
+    overdue_notified: bool = False
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    TIMESTAMPS = ("created", "completed_at")
+    SPARSE = ("deadline_ts", "created_ts", "completed_ts", "overdue_notified")
+
+    def normalize(self, tz_name: str) -> bool:
+        """Recompute the epoch-second fields; True if any of them changed"""
+        deadline = deadline_to_utc(self.deadline, tz_name) if self.deadline else None
+        values = (None if deadline is None else int(deadline), epoch_seconds(self.created),
+                  epoch_seconds(self.completed_at))
+        if values == (self.deadline_ts, self.created_ts, self.completed_ts):
+            return False
+        self.deadline_ts, self.created_ts, self.completed_ts = values
+        return True
+
+    def is_overdue(self, now: float) -> bool:
+        return not self.completed and self.deadline_ts is not None and self.deadline_ts <= now
+
+    def deadline_order(self) -> tuple:
+        """Sort key putting the earliest deadline first and tasks without one last"""
+        return (self.deadline_ts is None, self.deadline_ts or 0)
+
+
+@model
+class UserStats(RecordMixin):
+    total_routines: int = 0
+    total_tasks: int = 0
+    completed_tasks: int = 0
+    last_activity: Timestamp = None
+    pending_tasks: int = 0
+    completion_rate: float = 0.0
+    routine_completions: int = 0
+    current_streak: int = 0
+    best_streak: int = 0
+    adherence_7: float = 0.0
+    adherence_30: float = 0.0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    TIMESTAMPS = ("last_activity",)
+    DERIVED = ("pending_tasks", "completion_rate", "routine_completions", "current_streak", "best_streak",
+               "adherence_7", "adherence_30")
+
+    def with_derived(self, pending_tasks: int, routines: Iterable[Routine] = (),
+                     tz_name: str = DEFAULT_TIMEZONE, now: Optional[float] = None) -> "UserStats":
+        """Copy with the task figures and the routine streaks and adherence filled in
+
+        Each routine keeps its own counters and history bitmask, so this costs the same for
+        a week-old routine as for one with years of completions.
+        """
+        if self.total_tasks > 0:
+            completion_rate = round((self.completed_tasks / self.total_tasks) * 100, 1)
+        else:
+            completion_rate = 0.0
+
+        today = local_day(tz_name, datetime.now().timestamp() if now is None else now)
+        routine_completions = current_streak = best_streak = 0
+        adherence = {7: [0, 0], 30: [0, 0]}
+        for routine in routines:
+            routine_completions += routine.completions
+            current_streak = max(current_streak, routine.current_streak(today))
+            best_streak = max(best_streak, routine.best_streak)
+            for days, totals in adherence.items():
+                done, due = routine.adherence(today, days, tz_name)
+                totals[0] += done
+                totals[1] += due
+
+        rates = {days: round(done / due * 100, 1) if due else 0.0 for days, (done, due) in adherence.items()}
+        return replace(self, pending_tasks=pending_tasks, completion_rate=completion_rate,
+                       routine_completions=routine_completions, current_streak=current_streak,
+                       best_streak=best_streak, adherence_7=rates[7], adherence_30=rates[30],
+                       extra=dict(self.extra))
+
+
+@model
+class UserRecord:
+    """Everything stored for one user"""
+    profile: UserProfile
+    routines: List[Routine]
+    tasks: List[Task]
+    stats: UserStats
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    SECTIONS = ("profile", "routines", "tasks", "stats")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UserRecord":
+        return cls(
+            profile=UserProfile.from_dict(data.get("profile", {})),
+            routines=[Routine.from_dict(r) for r in data.get("routines", [])],
+            tasks=[Task.from_dict(t) for t in data.get("tasks", [])],
+            stats=UserStats.from_dict(data.get("stats", {})),
+            extra={k: v for k, v in data.items() if k not in cls.SECTIONS}
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "profile": self.profile.to_dict(),
+            "routines": [r.to_dict() for r in self.routines],
+            "tasks": [t.to_dict() for t in self.tasks],
+            "stats": self.stats.to_dict()
+        }
+        data.update(self.extra)
+        return data
+
+    def find_routine(self, routine_id: str) -> Optional[Routine]:
+        return next((r for r in self.routines if r.id == routine_id), None)
+
+    def find_task(self, task_id: str) -> Optional[Task]:
+        return next((t for t in self.tasks if t.id == task_id), None)
+
+
+@model
+class Page:
+    """One slice of a list view; the offsets of the neighbouring pages are its paging cursors"""
+    items: List[Any]
+    offset: int = 0
+    limit: int = PAGE_SIZE
+    total: int = 0
+
+    @staticmethod
+    def start(offset: int, limit: int, total: int) -> int:
+        """`offset` moved into the list, e.g. to the last page after items were deleted"""
+        last = (total - 1) // limit * limit if total else 0
+        return max(0, min(offset, last))
+
+    @classmethod
+    def of(cls, items: List[Any], offset: int = 0, limit: int = PAGE_SIZE) -> "Page":
+        """The page of a whole list starting at `offset`"""
+        offset = cls.start(offset, limit, len(items))
+        return cls(items[offset:offset + limit], offset, limit, len(items))
+
+    @property
+    def number(self) -> int:
+        return self.offset // self.limit + 1
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-self.total // self.limit))
+
+    @property
+    def next_offset(self) -> Optional[int]:
+        return self.offset + self.limit if self.offset + self.limit < self.total else None
+
+    @property
+    def prev_offset(self) -> Optional[int]:
+        return max(0, self.offset - self.limit) if self.offset > 0 else None
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Overdue task notifications
+Incomplete tasks are indexed by deadline in a min-heap, so a sweep only touches the tasks that are past due
+"""
+
+import asyncio
+import functools
+import heapq
+import logging
+import threading
+import time
+from typing import Dict, List, Any, Optional, Tuple
+from constants import BENGALI_TEXT, OVERDUE_SWEEP_SECONDS
+from events import ChangeEvent
+from models import Task
+from timeutils import deadline_to_utc
+
+logger = logging.getLogger(__name__)
+
+
+class OverdueSweeper:
+    """Tell users once when a task's deadline passes without it being completed
+
+    Every incomplete, not yet announced task with a deadline has an entry in a heap ordered
+    by its deadline (epoch seconds). The index follows the storage change events: adding,
+    completing, deleting or rescheduling a task only records the task's current deadline,
+    and entries that no longer match it are dropped when they reach the top of the heap.
+    A sweep therefore costs O(k log n) for k overdue tasks, whatever the size of the database.
+    """
+
+    def __init__(self, storage, interval: float = OVERDUE_SWEEP_SECONDS):
+        self.storage = storage
+        self.interval = interval
+        self.sender = None
+        self._heap: List[Tuple[int, str, str]] = []
+        # (user id, task id) -> deadline of the live heap entry
+        self._deadlines: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        storage.events.subscribe(self.on_change)
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    @staticmethod
+    def _deadline_of(task: Dict[str, Any], tz_name: Optional[str] = None) -> Optional[int]:
+        """Deadline a task is indexed under, or None if it can't become overdue"""
+        if task.get("completed") or task.get("overdue_notified"):
+            return None
+        deadline = task.get("deadline_ts")
+        if deadline is None and tz_name is not None and task.get("deadline"):
+            # Stored before deadlines were kept as epoch seconds and not loaded since
+            parsed = deadline_to_utc(task["deadline"], tz_name)
+            deadline = None if parsed is None else int(parsed)
+        return deadline
+
+    def _track(self, user_id_str: str, task_id: str, deadline: Optional[int]):
+        """Point the index at a task's current deadline; caller holds the lock"""
+        key = (user_id_str, task_id)
+        if deadline is None:
+            self._deadlines.pop(key, None)
+        elif self._deadlines.get(key) != deadline:
+            self._deadlines[key] = deadline
+            heapq.heappush(self._heap, (deadline, user_id_str, task_id))
+
+    def build(self):
+        """Index the tasks of every stored user in one pass; run once at startup
+
+        Tasks already indexed by a change event during the scan keep their entry, and the
+        heap is rebuilt from every indexed deadline, including those.
+        """
+        def visit(user_id_str: str, user_data: Dict[str, Any]):
+            tz_name = user_data["profile"]["timezone"]
+            with self._lock:
+                for task in user_data["tasks"]:
+                    deadline = self._deadline_of(task, tz_name)
+                    if deadline is not None:
+                        self._deadlines.setdefault((user_id_str, task["id"]), deadline)
+
+        count = self.storage.scan_users(visit)
+        with self._lock:
+            self._heap = [(deadline, user_id_str, task_id)
+                          for (user_id_str, task_id), deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        logger.info(f"Overdue index holds {len(self._heap)} tasks of {count} users")
+
+    def on_change(self, event: ChangeEvent):
+        """Storage event subscriber: keep the entries of changed tasks current"""
+        if event.entity == "user" and event.after is not None:
+            with self._lock:
+                for task in event.after.get("tasks", []):
+                    self._track(event.user_id, task["id"], self._deadline_of(task))
+            return
+
+        if event.entity != "task":
+            return
+
+        deadline = None if event.after is None else self._deadline_of(event.after)
+        with self._lock:
+            self._track(event.user_id, event.entity_id, deadline)
+
+    def pop_overdue(self, now: Optional[float] = None) -> List[Tuple[str, str]]:
+        """Remove and return (user id, task id) of every indexed task due by `now`"""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, user_id_str, task_id = heapq.heappop(self._heap)
+                key = (user_id_str, task_id)
+                if self._deadlines.get(key) != deadline:
+                    continue
+                del self._deadlines[key]
+                due.append(key)
+        return due
+
+    def sweep(self, now: Optional[float] = None) -> List[Tuple[str, Task]]:
+        """Return (user id, task) pairs of the newly overdue tasks still to be announced; blocking
+
+        Tasks are only marked as announced by mark_notified once their notice was delivered,
+        so a notice that couldn't be sent is tried again the next time the index is built.
+        """
+        notices = []
+        for user_id_str, task_id in self.pop_overdue(now):
+            for task in self.storage.get_user_tasks(user_id_str, completed=False):
+                if task.id == task_id and not task.overdue_notified:
+                    notices.append((user_id_str, task))
+        return notices
+
+    def mark_notified(self, user_id_str: str, task_id: str):
+        """Record that a task's overdue notice was delivered; blocking"""
+        try:
+            self.storage.update_task(user_id_str, task_id, {"overdue_notified": True})
+        except Exception as e:
+            logger.error(f"Error marking task {task_id} of user {user_id_str} as announced: {e}")
+
+    @staticmethod
+    def format_notice(task: Task) -> str:
+        return BENGALI_TEXT['task_overdue'].format(name=task.name, deadline=task.deadline)
+
+    def _send(self, user_id_str: str, task: Task):
+        future = self.sender.submit(int(user_id_str), self.format_notice(task))
+        future.add_done_callback(functools.partial(self._sent, user_id_str, task.id))
+
+    def _sent(self, user_id_str: str, task_id: str, future: asyncio.Future):
+        """Sender callback: mark the task as announced if its notice was delivered"""
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.error(f"Error sending overdue notice to user {user_id_str}: {future.exception()}")
+            return
+        # Marking writes to storage, so it stays off the event loop
+        asyncio.get_running_loop().run_in_executor(None, self.mark_notified, user_id_str, task_id)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.build)
+        while True:
+            try:
+                for user_id_str, task in await loop.run_in_executor(None, self.sweep):
+                    self._send(user_id_str, task)
+            except Exception as e:
+                logger.error(f"Error sweeping overdue tasks: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self, sender):
+        """Start sweeping every `interval` seconds, sending notices through `sender`"""
+        self.sender = sender
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
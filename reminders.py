@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Reminder dispatch for routines and tasks
+Upcoming reminders are kept in a min-heap ordered by fire time; the loop sleeps until the earliest one
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, List, Any, Optional, Tuple
+from constants import BENGALI_TEXT
+from events import ChangeEvent
+from timeutils import next_occurrence, deadline_to_utc
+
+logger = logging.getLogger(__name__)
+
+ROUTINE = "routine"
+TASK = "task"
+
+# Heap entry: (fire time as epoch seconds, tie-breaker, user id, (epoch, generation), kind,
+# routine or task record, interval in minutes, tz name)
+Entry = Tuple[float, int, str, Tuple[int, int], str, Dict[str, Any], int, str]
+
+
+class ReminderEngine:
+    """Send reminders at their due time without scanning every user
+
+    Each reminder is one heap entry, so scheduling and firing cost O(log n). The engine
+    follows the storage change events: a changed routine or task only bumps its own
+    generation and pushes its new entries, and its old entries are dropped when they reach
+    the top of the heap instead of being searched for. A routine reminder pushes its next
+    occurrence when it fires, so the heap holds one live entry per routine and interval.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.sender = None
+        self._heap: List[Entry] = []
+        self._sequence = itertools.count()
+        # An entry is live while its stamp matches its user's epoch and its item's generation
+        self._epochs: Dict[str, int] = {}
+        self._generations: Dict[Tuple[str, str], int] = {}
+        self._timezones: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        storage.events.subscribe(self.on_change)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule_user(self, user_id, now: Optional[float] = None):
+        """(Re)build all reminders of one user; blocking, reads from storage"""
+        user_data = self.storage.get_user_data(user_id)
+        now = time.time() if now is None else now
+        with self._lock:
+            for entry in self._record_entries(str(user_id), user_data, now):
+                heapq.heappush(self._heap, entry)
+        self._wake()
+
+    def unschedule_user(self, user_id):
+        """Drop every pending reminder of a user"""
+        with self._lock:
+            user_id_str = str(user_id)
+            self._epochs[user_id_str] = self._epochs.get(user_id_str, 0) + 1
+
+    def schedule_all(self, now: Optional[float] = None):
+        """Build the reminders of every stored user in one pass; run once at startup
+
+        Users share a few timezones and popular times, so fire times are computed once per
+        distinct schedule and the heap is built with a single heapify. Each user's entries
+        are stamped while storage publishes none of their events, so a change made during
+        the scan either is in the record read or bumps the generation after it.
+        """
+        now = time.time() if now is None else now
+        memo: Dict[tuple, Optional[float]] = {}
+        entries = []
+
+        def visit(user_id_str: str, user_data: Dict[str, Any]):
+            with self._lock:
+                try:
+                    entries.extend(self._record_entries(user_id_str, user_data, now, memo))
+                except Exception as e:
+                    logger.error(f"Error scheduling reminders for user {user_id_str}: {e}")
+
+        count = self.storage.scan_users(visit)
+        with self._lock:
+            self._heap.extend(entries)
+            heapq.heapify(self._heap)
+
+        self._wake()
+        logger.info(f"Reminder engine scheduled {len(entries)} reminders for {count} users")
+
+    def _record_entries(self, user_id_str: str, user_data: Dict[str, Any], now: float,
+                        memo: Optional[dict] = None) -> List[Entry]:
+        """Start a new epoch for a user and return their entries; caller holds the lock"""
+        tz_name = user_data["profile"]["timezone"]
+        self._epochs[user_id_str] = self._epochs.get(user_id_str, 0) + 1
+        self._timezones[user_id_str] = tz_name
+
+        entries = []
+        for routine in user_data["routines"]:
+            entries.extend(self._item_entries(user_id_str, ROUTINE, routine, tz_name, now, memo))
+        for task in user_data["tasks"]:
+            entries.extend(self._item_entries(user_id_str, TASK, task, tz_name, now, memo))
+        return entries
+
+    def on_change(self, event: ChangeEvent):
+        """Storage event subscriber: reschedule just the routine or task that changed"""
+        if event.entity == "profile":
+            before = event.before or {}
+            if before.get("timezone") != event.after.get("timezone"):
+                self.schedule_user(event.user_id)
+            return
+
+        if event.entity not in (ROUTINE, TASK):
+            return
+
+        tz_name = self._timezones.get(event.user_id)
+        if tz_name is None:
+            tz_name = self.storage.get_user_profile(event.user_id).timezone
+
+        with self._lock:
+            self._timezones[event.user_id] = tz_name
+            key = (event.user_id, event.entity_id)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if event.after is not None:
+                for entry in self._item_entries(event.user_id, event.entity, event.after, tz_name, time.time()):
+                    heapq.heappush(self._heap, entry)
+
+        self._wake()
+
+    def _item_entries(self, user_id_str: str, kind: str, item: Dict[str, Any], tz_name: str, now: float,
+                      memo: Optional[dict] = None) -> List[Entry]:
+        """Upcoming reminders of one routine or task; caller holds the lock"""
+        stamp = (self._epochs.get(user_id_str, 0), self._generations.get((user_id_str, item["id"]), 0))
+        intervals = item.get("reminder_intervals") or []
+        entries = []
+
+        if kind == ROUTINE:
+            if not item.get("active", True):
+                return entries
+            for interval in intervals:
+                fire_at = self._routine_fire_time(item, interval, tz_name, now, memo)
+                if fire_at is not None:
+                    entries.append((fire_at, next(self._sequence), user_id_str, stamp, ROUTINE, item,
+                                    interval, tz_name))
+            return entries
+
+        if item.get("completed") or not item.get("deadline"):
+            return entries
+        # Records not yet backfilled with the epoch-second deadline are parsed instead
+        deadline = item.get("deadline_ts")
+        if deadline is None:
+            deadline = deadline_to_utc(item["deadline"], tz_name)
+        if deadline is None:
+            return entries
+        for interval in intervals:
+            fire_at = deadline - interval * 60
+            if fire_at > now:
+                entries.append((fire_at, next(self._sequence), user_id_str, stamp, TASK, item, interval, tz_name))
+        return entries
+
+    def _is_live(self, user_id_str: str, stamp: Tuple[int, int], item: Dict[str, Any]) -> bool:
+        return stamp == (self._epochs.get(user_id_str, 0), self._generations.get((user_id_str, item["id"]), 0))
+
+    @staticmethod
+    def _routine_fire_time(routine: Dict[str, Any], interval: int, tz_name: str, now: float,
+                           memo: Optional[dict] = None) -> Optional[float]:
+        """When the reminder `interval` minutes before the routine's next occurrence fires"""
+        days = tuple(routine.get("days") or ())
+        key = (routine.get("time"), routine.get("type", "daily"), days, tz_name, interval)
+        if memo is not None and key in memo:
+            return memo[key]
+
+        # The occurrence must be more than `interval` minutes away for its reminder to be ahead of us
+        occurrence = next_occurrence(key[0], key[1], days, tz_name, now + interval * 60)
+        fire_at = None if occurrence is None else occurrence - interval * 60
+        if memo is not None:
+            memo[key] = fire_at
+        return fire_at
+
+    def pop_due(self, now: Optional[float] = None) -> List[Entry]:
+        """Remove and return the live entries due at `now`, queueing the next routine occurrences"""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                fire_at, _, user_id_str, stamp, kind, item, interval, tz_name = entry
+                if not self._is_live(user_id_str, stamp, item):
+                    continue
+                due.append(entry)
+
+                if kind == ROUTINE:
+                    following = self._routine_fire_time(item, interval, tz_name, fire_at + 1)
+                    if following is not None:
+                        heapq.heappush(self._heap, (following, next(self._sequence), user_id_str, stamp, ROUTINE,
+                                                    item, interval, tz_name))
+        return due
+
+    def next_fire_time(self) -> Optional[float]:
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    @staticmethod
+    def format_reminder(kind: str, item: Dict[str, Any], interval: int) -> str:
+        if kind == ROUTINE:
+            return BENGALI_TEXT['routine_reminder'].format(name=item["name"], time=item["time"], minutes=interval)
+        return BENGALI_TEXT['task_reminder'].format(name=item["name"], deadline=item["deadline"], minutes=interval)
+
+    def _send(self, entry: Entry):
+        """Hand a reminder to the outbound sender; delivery and retries happen there"""
+        _, _, user_id_str, _, kind, item, interval, _ = entry
+        future = self.sender.submit(int(user_id_str), self.format_reminder(kind, item, interval))
+        future.add_done_callback(lambda f: f.cancelled() or f.exception() is None or logger.error(
+            f"Error sending reminder to user {user_id_str}: {f.exception()}"))
+
+    def _wake(self):
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        # Built in the background so a large database doesn't hold up startup
+        await self._loop.run_in_executor(None, self.schedule_all)
+        while True:
+            self._wakeup.clear()
+            fire_at = self.next_fire_time()
+            timeout = None if fire_at is None else max(0.0, fire_at - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            for entry in self.pop_due():
+                self._send(entry)
+
+    async def start(self, sender):
+        """Start scheduling every user and dispatching through `sender` on the running event loop"""
+        self.sender = sender
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Table-driven dispatch of inline keyboard callbacks
+Exact callback data is looked up in a dict and prefixed data in a character trie, so routing cost doesn't grow with the number of routes
+"""
+
+import inspect
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Callable, Tuple
+from constants import CALLBACK_CODES, CALLBACK_PAYLOAD_CAPACITY
+from models import model
+
+logger = logging.getLogger(__name__)
+
+# Key of the route stored in a trie node, next to the single-character child keys
+_ROUTE = ""
+
+
+# First character of a compact callback token: "!<action code><epoch><base-62 payload index>"
+TOKEN_MARK = "!"
+BASE62 = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# Base-62 digits of the random per-process epoch every token carries
+EPOCH_DIGITS = 3
+
+
+def base62(number: int) -> str:
+    digits = []
+    while True:
+        number, digit = divmod(number, 62)
+        digits.append(BASE62[digit])
+        if number == 0:
+            return "".join(reversed(digits))
+
+
+class CallbackCodec:
+    """Short opaque callback tokens for buttons that carry a routine or task id
+
+    The id is kept in a bounded LRU table on the server and the button only sends an
+    action code and the id's index in that table, so callback data stays a few bytes no
+    matter how long ids get. The same id always gets the same index while it is in the
+    table; a token whose entry was evicted no longer decodes. Indexes start over in every
+    process, so tokens also carry a random epoch chosen at startup, and one issued by an
+    earlier process doesn't decode either instead of naming whatever id took its index.
+    """
+
+    def __init__(self, codes: Dict[str, str] = CALLBACK_CODES, capacity: int = CALLBACK_PAYLOAD_CAPACITY,
+                 epoch: Optional[str] = None):
+        self.codes = codes
+        self.prefixes = {code: prefix for prefix, code in codes.items()}
+        self.capacity = capacity
+        if epoch is None:
+            epoch = "".join(secrets.choice(BASE62) for _ in range(EPOCH_DIGITS))
+        self.epoch = epoch
+        self._payloads: "OrderedDict[str, str]" = OrderedDict()
+        self._indexes: Dict[str, str] = {}
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def encode(self, prefix: str, payload: str) -> str:
+        """Callback data for `prefix` + `payload`; compact if the prefix has an action code"""
+        code = self.codes.get(prefix)
+        if code is None:
+            return prefix + payload
+
+        index = self._indexes.get(payload)
+        if index is None:
+            index = base62(self._next)
+            self._next += 1
+            self._indexes[payload] = index
+            self._payloads[index] = payload
+            if len(self._payloads) > self.capacity:
+                _, evicted = self._payloads.popitem(last=False)
+                del self._indexes[evicted]
+        else:
+            self._payloads.move_to_end(index)
+        return f"{TOKEN_MARK}{code}{self.epoch}{index}"
+
+    def decode(self, data: str) -> Optional[str]:
+        """The full callback data a token stands for, the data itself if it isn't a token,
+        or None for a token that is no longer in the table or was issued by another process"""
+        if not data.startswith(TOKEN_MARK):
+            return data
+        index_start = 2 + len(self.epoch)
+        if data[2:index_start] != self.epoch:
+            return None
+        prefix = self.prefixes.get(data[1:2])
+        payload = self._payloads.get(data[index_start:])
+        if prefix is None or payload is None:
+            return None
+        self._payloads.move_to_end(data[index_start:])
+        return prefix + payload
+
+
+@model
+class RouteStats:
+    """Dispatch counters of one route"""
+    calls: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+
+class Route:
+    """A registered handler and how to call it"""
+
+    def __init__(self, name: str, handler: Callable, arg: Optional[str] = None,
+                 convert: Optional[Callable[[str], Any]] = None):
+        self.name = name
+        self.handler = handler
+        self.arg = arg
+        self.convert = convert
+        self.stats = RouteStats()
+        # Worked out once here rather than per call: which of the dispatch values the handler takes
+        self.params = tuple(inspect.signature(handler).parameters)
+
+
+class CallbackRouter:
+    """Dispatch callback data to the handler registered for it
+
+    Exact routes match the whole callback data; prefix routes match its beginning and pass
+    the rest to the handler as the argument named `arg`. When several prefixes match, the
+    longest one wins, so the order routes are registered in never matters.
+    """
+
+    def __init__(self, codec: Optional[CallbackCodec] = None):
+        self.codec = codec
+        self._exact: Dict[str, Route] = {}
+        self._trie: Dict[str, Any] = {}
+        self.routes: List[Route] = []
+        self.unmatched = 0
+        self.expired = 0
+
+    def exact(self, data: str, handler: Callable):
+        """Route callback data equal to `data`"""
+        if data in self._exact:
+            raise ValueError(f"Duplicate callback route {data!r}")
+        route = self._exact[data] = Route(data, handler)
+        self.routes.append(route)
+
+    def prefix(self, prefix: str, handler: Callable, arg: str, convert: Optional[Callable[[str], Any]] = None):
+        """Route callback data starting with `prefix`; the remainder, optionally converted, becomes `arg`"""
+        node = self._trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        if _ROUTE in node:
+            raise ValueError(f"Duplicate callback prefix {prefix!r}")
+        route = node[_ROUTE] = Route(prefix + "*", handler, arg, convert)
+        self.routes.append(route)
+
+    def resolve(self, data: str) -> Optional[Tuple[Route, Optional[str]]]:
+        """(route, remainder after its prefix) for callback data, or None if nothing matches"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, None
+
+        # Callback data is at most 64 bytes, which bounds the walk whatever the number of routes
+        best = None
+        node = self._trie
+        for index, char in enumerate(data):
+            node = node.get(char)
+            if node is None:
+                break
+            if _ROUTE in node:
+                best = (node[_ROUTE], index + 1)
+        if best is None:
+            return None
+        return best[0], data[best[1]:]
+
+    async def dispatch(self, data: str, **values) -> bool:
+        """Call the handler for `data` with the `values` it accepts; False if no route matched"""
+        if self.codec is not None:
+            decoded = self.codec.decode(data)
+            if decoded is None:
+                self.expired += 1
+                return False
+            data = decoded
+
+        resolved = self.resolve(data)
+        if resolved is None:
+            self.unmatched += 1
+            logger.warning(f"No handler for callback data {data!r}")
+            return False
+
+        route, remainder = resolved
+        if route.arg is not None:
+            values[route.arg] = route.convert(remainder) if route.convert else remainder
+        kwargs = {name: values[name] for name in route.params if name in values}
+
+        stats = route.stats
+        started = time.perf_counter()
+        try:
+            await route.handler(**kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.calls += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+        return True
+
+    def summary(self, limit: int = 10) -> str:
+        """The busiest routes with their call counts and latencies, for logging"""
+        busiest = sorted((r for r in self.routes if r.stats.calls), key=lambda r: r.stats.calls, reverse=True)
+        lines = [f"{r.name}: {r.stats.calls} calls, {r.stats.errors} errors, "
+                 f"mean {r.stats.mean_seconds * 1000:.1f} ms, max {r.stats.max_seconds * 1000:.1f} ms"
+                 for r in busiest[:limit]]
+        lines.append(f"unmatched: {self.unmatched}, expired tokens: {self.expired}")
+        return "; ".join(lines)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Rate-limited outbound message queue
+Token buckets keep sends within Telegram's global and per-chat limits; flood waits are retried
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+from telegram.error import RetryAfter, NetworkError, Forbidden, BadRequest
+from constants import SENDER_WORKERS, SENDER_GLOBAL_RATE, SENDER_PER_CHAT_RATE, SENDER_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Idle per-chat buckets are dropped once this many are tracked
+MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Classic token bucket that hands out reservations instead of blocking"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated: Optional[float] = None
+
+    def reserve(self, now: float) -> float:
+        """Take one token and return the time at which it may be used (now or later)"""
+        if self.updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return now
+        # A negative balance is a queue of reservations; each waits for its token to refill
+        return now - self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        """Whether the bucket has refilled completely, i.e. it can be recreated without effect"""
+        return self.updated is None or self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class MessageSender:
+    """Deliver messages as fast as Telegram allows, without triggering flood limits
+
+    Each message gets a per-chat reservation when it is queued and waits in a heap ordered
+    by the time that reservation becomes usable, so a busy chat never holds up the others.
+    A dispatcher hands due messages to the workers, which take a global token before
+    calling the bot. A RetryAfter pauses every
+    worker for the requested time and puts the message back; other network errors are
+    retried with exponential backoff.
+    """
+
+    def __init__(self, bot, workers: int = SENDER_WORKERS, global_rate: float = SENDER_GLOBAL_RATE,
+                 per_chat_rate: float = SENDER_PER_CHAT_RATE, max_retries: int = SENDER_MAX_RETRIES,
+                 backoff_seconds: float = 1.0):
+        self.bot = bot
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        self._global = TokenBucket(global_rate)
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._changed: Optional[asyncio.Event] = None
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._unfinished = 0
+        self._idle: Optional[asyncio.Event] = None
+
+        # Counters for logging and tests
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                now = self._now()
+                self._chats = {c: b for c, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate)
+        return bucket
+
+    def submit(self, chat_id, text: str, **kwargs) -> asyncio.Future:
+        """Queue a message; the returned future resolves to the sent Message or the final error"""
+        future = asyncio.get_running_loop().create_future()
+        ready_at = self._chat_bucket(chat_id).reserve(self._now())
+        item = {"chat_id": chat_id, "text": text, "kwargs": kwargs, "future": future, "attempt": 0}
+        self._unfinished += 1
+        self._idle.clear()
+        self._push(ready_at, item)
+        return future
+
+    async def send(self, chat_id, text: str, **kwargs):
+        """Queue a message and wait until it has been delivered"""
+        return await self.submit(chat_id, text, **kwargs)
+
+    def _push(self, ready_at: float, item: Dict[str, Any]):
+        heapq.heappush(self._heap, (ready_at, next(self._sequence), item))
+        self._changed.set()
+
+    async def _dispatch(self):
+        """Move messages from the heap to the workers as their per-chat reservations come due"""
+        while True:
+            self._changed.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(self._heap[0][0], self._paused_until) - self._now()
+                if timeout <= 0:
+                    # A bounded queue keeps messages in the heap while every worker is busy
+                    await self._ready.put(heapq.heappop(self._heap)[2])
+                    continue
+            try:
+                # Woken early if something sooner is queued
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            item = await self._ready.get()
+            now = self._now()
+            delay = max(self._global.reserve(now), self._paused_until) - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._deliver(item)
+
+    async def _deliver(self, item: Dict[str, Any]):
+        future = item["future"]
+        try:
+            message = await self.bot.send_message(chat_id=item["chat_id"], text=item["text"], **item["kwargs"])
+        except RetryAfter as e:
+            # Flood control applies to the whole bot, so every worker waits
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            self._paused_until = max(self._paused_until, self._now() + retry_after)
+            logger.warning(f"Flood limit hit, pausing sends for {retry_after}s")
+            self._retry(item, self._paused_until, e)
+        except (Forbidden, BadRequest) as e:
+            # The user blocked the bot or the chat is gone; retrying can't help
+            self._finish(future, error=e)
+        except NetworkError as e:
+            self._retry(item, self._now() + self.backoff_seconds * (2 ** item["attempt"]), e)
+        except Exception as e:
+            self._finish(future, error=e)
+        else:
+            self._finish(future, result=message)
+
+    def _retry(self, item: Dict[str, Any], ready_at: float, error: Exception):
+        item["attempt"] += 1
+        if item["attempt"] > self.max_retries:
+            self._finish(item["future"], error=error)
+            return
+        self.retried += 1
+        self._push(ready_at, item)
+
+    def _finish(self, future: asyncio.Future, result: Any = None, error: Optional[Exception] = None):
+        if error is not None:
+            self.failed += 1
+            logger.error(f"Giving up on message: {error}")
+            if not future.done():
+                future.set_exception(error)
+        else:
+            self.sent += 1
+            if not future.done():
+                future.set_result(result)
+
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._idle.set()
+
+    async def join(self):
+        """Wait until every queued message has been sent or has failed"""
+        await self._idle.wait()
+
+    async def start(self):
+        """Start the workers on the running event loop"""
+        self._changed = asyncio.Event()
+        self._ready = asyncio.Queue(self.workers)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [asyncio.create_task(self._dispatch())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the dispatcher and workers; messages still queued are dropped"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
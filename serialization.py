@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk encodings for the bot database
+Pretty JSON, minified JSON, or a compact binary encoding (msgpack, falling back to marshal)
+
+Usage:
+    python serialization.py bot_data.json --format binary [--backups]
+"""
+
+import argparse
+import json
+import marshal
+import os
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from fileutils import atomic_write
+from constants import DATA_FILE, DATA_FORMAT, BACKUP_DIR
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; marshal is always available
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("json-pretty", "json", "binary")
+
+# Binary files start with a magic header followed by one byte naming the codec
+MAGIC = b"NBOT\x01"
+CODEC_MSGPACK = b"M"
+CODEC_MARSHAL = b"R"
+
+
+class DecodeError(ValueError):
+    """Raised when stored bytes can't be decoded in any supported format"""
+
+
+def dumps(data: Any, fmt: str = DATA_FORMAT) -> bytes:
+    """Encode a document in the given on-disk format"""
+    if fmt == "json-pretty":
+        return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    if fmt == "json":
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if fmt == "binary":
+        if msgpack is not None:
+            return MAGIC + CODEC_MSGPACK + msgpack.packb(data, use_bin_type=True)
+        # marshal's format is tied to the Python version; files are still readable by the converter
+        return MAGIC + CODEC_MARSHAL + marshal.dumps(data)
+    raise ValueError(f"Unknown data format: {fmt}")
+
+
+def dumps_indexed(data: Dict[str, Any], fmt: str = DATA_FORMAT) -> Tuple[bytes, Optional[Dict[str, Tuple[int, int]]]]:
+    """Encode a database document like dumps, plus the (offset, length) of each user record
+
+    The output is byte-for-byte what dumps produces; the offsets let one user be decoded
+    without parsing the whole file. Binary formats can't be sliced, so they get None.
+    """
+    if fmt not in ("json-pretty", "json") or not isinstance(data.get("users"), dict):
+        return dumps(data, fmt), None
+
+    pretty = fmt == "json-pretty"
+    colon = ": " if pretty else ":"
+    chunks: List[bytes] = []
+    offsets: Dict[str, Tuple[int, int]] = {}
+    position = 0
+
+    def newline(depth: int) -> str:
+        return "\n" + "  " * depth if pretty else ""
+
+    def encode(value: Any, depth: int) -> str:
+        if pretty:
+            # JSON strings never contain a raw newline, so this only re-indents the structure
+            return json.dumps(value, ensure_ascii=False, indent=2).replace("\n", newline(depth))
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+    def emit(text: str) -> int:
+        nonlocal position
+        chunk = text.encode('utf-8')
+        chunks.append(chunk)
+        position += len(chunk)
+        return position
+
+    emit("{")
+    for i, (key, value) in enumerate(data.items()):
+        emit(("," if i else "") + newline(1) + json.dumps(key, ensure_ascii=False) + colon)
+        if key != "users":
+            emit(encode(value, 1))
+        elif not value:
+            emit("{}")
+        else:
+            emit("{")
+            for j, (user_id, user_data) in enumerate(value.items()):
+                start = emit(("," if j else "") + newline(2) + json.dumps(user_id, ensure_ascii=False) + colon)
+                offsets[user_id] = (start, emit(encode(user_data, 2)) - start)
+            emit(newline(1) + "}")
+    emit(newline(0) + "}")
+    return b"".join(chunks), offsets
+
+
+def loads(raw: bytes) -> Any:
+    """Decode a document, detecting the format from its content rather than the file name"""
+    try:
+        if raw.startswith(MAGIC):
+            codec = raw[len(MAGIC):len(MAGIC) + 1]
+            payload = raw[len(MAGIC) + 1:]
+            if codec == CODEC_MSGPACK:
+                if msgpack is None:
+                    raise DecodeError("File is msgpack-encoded but msgpack is not installed")
+                return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+            if codec == CODEC_MARSHAL:
+                return marshal.loads(payload)
+            raise DecodeError(f"Unknown binary codec: {codec!r}")
+        return json.loads(raw.decode('utf-8'))
+    except DecodeError:
+        raise
+    except (ValueError, EOFError, TypeError) as e:
+        raise DecodeError(str(e)) from e
+
+
+def load_file(path: str) -> Any:
+    """Read and decode a file in any supported format"""
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def save_file(path: str, data: Any, fmt: str = DATA_FORMAT):
+    """Encode and atomically write a file"""
+    atomic_write(path, dumps(data, fmt))
+
+
+def convert_file(path: str, fmt: str) -> int:
+    """Re-encode a file in place, return the new size in bytes"""
+    data = load_file(path)
+    encoded = dumps(data, fmt)
+    atomic_write(path, encoded)
+    return len(encoded)
+
+
+def convert_backups(fmt: str, backup_dir: str = BACKUP_DIR) -> List[str]:
+    """Re-encode the plain (non-gzip) backups in the backup directory"""
+    converted = []
+    for name in sorted(os.listdir(backup_dir)):
+        if name.endswith('.json') and name != "index.json":
+            convert_file(os.path.join(backup_dir, name), fmt)
+            converted.append(name)
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert bot data files between on-disk formats")
+    parser.add_argument("path", nargs="?", default=DATA_FILE, help="data file to convert")
+    parser.add_argument("--format", choices=FORMATS, default=DATA_FORMAT, help="target format")
+    parser.add_argument("--backups", action="store_true", help="also convert plain backups")
+    args = parser.parse_args()
+
+    before = os.path.getsize(args.path)
+    after = convert_file(args.path, args.format)
+    print(f"✅ {args.path}: {before} → {after} bytes ({args.format})")
+
+    if args.backups:
+        for name in convert_backups(args.format):
+            print(f"✅ {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,671 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite storage engine implementing the StorageManager API
+Users, routines and tasks live in indexed tables of a WAL-mode database
+"""
+
+import contextlib
+import json
+import sqlite3
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional, Tuple, Iterable, Callable
+from constants import SQLITE_FILE, BACKUP_DIR, PAGE_SIZE
+from storage import StorageManager, synchronized
+from events import EventBus, ChangeEvent
+from models import UserProfile, Routine, Task, UserStats, Page
+from timeutils import local_day
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    timezone TEXT NOT NULL,
+    reminder_interval INTEGER NOT NULL,
+    created TEXT NOT NULL,
+    total_routines INTEGER NOT NULL DEFAULT 0,
+    total_tasks INTEGER NOT NULL DEFAULT 0,
+    completed_tasks INTEGER NOT NULL DEFAULT 0,
+    last_activity TEXT,
+    extra TEXT
+);
+
+CREATE TABLE IF NOT EXISTS routines (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL REFERENCES users(user_id),
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    time TEXT NOT NULL,
+    days TEXT NOT NULL,
+    type TEXT NOT NULL,
+    reminder_intervals TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    created TEXT NOT NULL,
+    last_completed TEXT,
+    extra TEXT,
+    UNIQUE (user_id, id)
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL REFERENCES users(user_id),
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    deadline TEXT,
+    reminder_intervals TEXT NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    created TEXT NOT NULL,
+    completed_at TEXT,
+    deadline_ts INTEGER,
+    created_ts INTEGER,
+    completed_ts INTEGER,
+    extra TEXT,
+    UNIQUE (user_id, id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_tasks_user_completed ON tasks (user_id, completed);
+CREATE INDEX IF NOT EXISTS idx_routines_user_active ON routines (user_id, active);
+CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks (deadline);
+"""
+
+# Columns added after the tables were first created; older databases get them on open
+MIGRATIONS = (
+    ("tasks", "deadline_ts", "INTEGER"),
+    ("tasks", "created_ts", "INTEGER"),
+    ("tasks", "completed_ts", "INTEGER"),
+)
+
+# Indexes on migrated columns, created once the columns exist
+MIGRATED_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_tasks_deadline_ts ON tasks (completed, deadline_ts);
+"""
+
+# Record keys stored in dedicated columns; anything else goes to the JSON "extra" column
+PROFILE_COLUMNS = ("name", "timezone", "reminder_interval", "created")
+ROUTINE_COLUMNS = ("id", "name", "time", "days", "type", "reminder_intervals", "active", "created", "last_completed")
+TASK_COLUMNS = ("id", "name", "deadline", "reminder_intervals", "completed", "created", "completed_at",
+                "deadline_ts", "created_ts", "completed_ts")
+JSON_COLUMNS = ("days", "reminder_intervals")
+BOOL_COLUMNS = ("active", "completed")
+# Left out of the record while NULL, matching the models' sparse fields
+SPARSE_COLUMNS = Task.SPARSE
+
+
+def _to_row(record: Dict[str, Any], columns: tuple) -> Dict[str, Any]:
+    """Convert a record dict into column values plus the JSON-encoded leftovers"""
+    row = {}
+    for column in columns:
+        value = record.get(column)
+        if column in JSON_COLUMNS:
+            value = json.dumps(value if value is not None else [], ensure_ascii=False)
+        elif column in BOOL_COLUMNS:
+            value = int(bool(value))
+        row[column] = value
+
+    extra = {k: v for k, v in record.items() if k not in columns}
+    row["extra"] = json.dumps(extra, ensure_ascii=False) if extra else None
+    return row
+
+
+def _from_row(row: sqlite3.Row, columns: tuple) -> Dict[str, Any]:
+    """Convert a table row back into a record dict in the bot_data.json schema"""
+    record = {}
+    for column in columns:
+        value = row[column]
+        if value is None and column in SPARSE_COLUMNS:
+            continue
+        if column in JSON_COLUMNS:
+            value = json.loads(value)
+        elif column in BOOL_COLUMNS:
+            value = bool(value)
+        record[column] = value
+
+    if row["extra"]:
+        record.update(json.loads(row["extra"]))
+    return record
+
+
+class SQLiteStorageManager(StorageManager):
+    """StorageManager backed by the stdlib sqlite3 module"""
+
+    def __init__(self, db_file: str = SQLITE_FILE):
+        self.data_file = db_file
+        self.backup_dir = BACKUP_DIR
+        self.backend = None
+        self.change_count = 0
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.events = EventBus()
+        self._versions: Dict[str, int] = {}
+        self.events.subscribe(self._count_change)
+        # PRAGMA data_version when the versions were last checked; other connections'
+        # commits change it
+        self._external_version: Optional[int] = None
+        self._ensure_directories()
+
+        # Events of the open transaction, published once it commits
+        self._pending_events: Optional[List[ChangeEvent]] = None
+
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add columns missing from a database created by an older version, then backfill them"""
+        for table, column, column_type in MIGRATIONS:
+            columns = [row["name"] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                logger.info(f"Added column {table}.{column}")
+        self.conn.executescript(MIGRATED_INDEXES)
+
+        with self._transaction():
+            count = self._normalize_tasks(
+                "(created_ts IS NULL AND created IS NOT NULL) OR (deadline_ts IS NULL AND deadline IS NOT NULL) "
+                "OR (completed_ts IS NULL AND completed_at IS NOT NULL)", ())
+        if count:
+            logger.info(f"Backfilled epoch timestamps of {count} tasks")
+
+    def _normalize_tasks(self, condition: str, parameters: tuple) -> int:
+        """Recompute the epoch-second columns of the tasks matching `condition`, return how many changed"""
+        rows = self.conn.execute(
+            "SELECT *, (SELECT timezone FROM users WHERE users.user_id = tasks.user_id) AS user_timezone "
+            f"FROM tasks WHERE {condition}", parameters).fetchall()
+        count = 0
+        for row in rows:
+            before = _from_row(row, TASK_COLUMNS)
+            task = Task.from_dict(before)
+            if not task.normalize(row["user_timezone"]):
+                continue
+            self.conn.execute(
+                "UPDATE tasks SET deadline_ts = ?, created_ts = ?, completed_ts = ? WHERE position = ?",
+                (task.deadline_ts, task.created_ts, task.completed_ts, row["position"])
+            )
+            self._emit(row["user_id"], "task", task.id, before, task.to_dict())
+            count += 1
+        return count
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Run the enclosed statements in one transaction, rolling back on error"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        self._pending_events = []
+        try:
+            yield self.conn
+        except Exception as e:
+            self.conn.execute("ROLLBACK")
+            self._pending_events = None
+            logger.error(f"SQLite transaction rolled back: {e}")
+            raise
+        self.conn.execute("COMMIT")
+        self.change_count += 1
+
+        events, self._pending_events = self._pending_events, None
+        self.events.publish(events)
+
+    def _emit(self, user_id_str: str, entity: str, entity_id: Optional[str],
+              before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]):
+        """Queue a change event for the open transaction, or publish it right away outside one"""
+        event = ChangeEvent.between(user_id_str, entity, entity_id, before, after)
+        if self._pending_events is not None:
+            self._pending_events.append(event)
+        else:
+            self.events.publish([event])
+
+    def _ensure_user(self, user_id_str: str):
+        """Insert the default record for a user that doesn't exist yet"""
+        if self.conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id_str,)).fetchone():
+            return
+
+        record = self._new_user_record()
+        profile = _to_row(record["profile"], PROFILE_COLUMNS)
+        stats = record["stats"]
+        self.conn.execute(
+            "INSERT INTO users (user_id, name, timezone, reminder_interval, created, total_routines, "
+            "total_tasks, completed_tasks, last_activity, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id_str, profile["name"], profile["timezone"], profile["reminder_interval"], profile["created"],
+             stats["total_routines"], stats["total_tasks"], stats["completed_tasks"], stats["last_activity"],
+             profile["extra"])
+        )
+        self._emit(user_id_str, "user", None, None, record)
+
+    def _touch(self, user_id_str: str):
+        """Update the user's last activity timestamp"""
+        self.conn.execute(
+            "UPDATE users SET last_activity = ? WHERE user_id = ?",
+            (datetime.now(timezone.utc).isoformat(), user_id_str)
+        )
+
+    def _get_profile_and_stats(self, user_id_str: str) -> sqlite3.Row:
+        self._ensure_user(user_id_str)
+        return self.conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id_str,)).fetchone()
+
+    def _user_record(self, user_id_str: str) -> Dict[str, Any]:
+        """Assemble a full user record in the bot_data.json schema"""
+        row = self._get_profile_and_stats(user_id_str)
+        profile = _from_row(row, PROFILE_COLUMNS)
+        stats = {
+            "total_routines": row["total_routines"],
+            "total_tasks": row["total_tasks"],
+            "completed_tasks": row["completed_tasks"],
+            "last_activity": row["last_activity"]
+        }
+        routines = [_from_row(r, ROUTINE_COLUMNS) for r in self.conn.execute(
+            "SELECT * FROM routines WHERE user_id = ? ORDER BY position", (user_id_str,))]
+        tasks = [_from_row(t, TASK_COLUMNS) for t in self.conn.execute(
+            "SELECT * FROM tasks WHERE user_id = ? ORDER BY position", (user_id_str,))]
+        return {"profile": profile, "routines": routines, "tasks": tasks, "stats": stats}
+
+    @synchronized
+    def get_user_data(self, user_id: int) -> Dict[str, Any]:
+        """Get user data, create if doesn't exist"""
+        return self._user_record(str(user_id))
+
+    @synchronized
+    def data_version(self, user_id: int) -> int:
+        """Version of a user's data; increases with every change to it
+        
+        A commit by another connection publishes no event, so it raises every user's version.
+        """
+        external = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if external != self._external_version:
+            self._external_version = external
+            self._versions.clear()
+        return self._current_version(str(user_id))
+    
+    @synchronized
+    def user_ids(self) -> List[str]:
+        """Ids of all stored users"""
+        return [row["user_id"] for row in self.conn.execute("SELECT user_id FROM users ORDER BY rowid")]
+
+    @synchronized
+    def _visit_user(self, user_id_str: str, visit: Callable[[str, Dict[str, Any]], None]) -> bool:
+        visit(user_id_str, self._user_record(user_id_str))
+        return True
+
+    @synchronized
+    def get_user_profile(self, user_id: int) -> UserProfile:
+        """Get the user's profile"""
+        return UserProfile.from_dict(_from_row(self._get_profile_and_stats(str(user_id)), PROFILE_COLUMNS))
+
+    @synchronized
+    def update_user_profile(self, user_id: int, profile_data: Dict[str, Any]):
+        """Update user profile information"""
+        user_id_str = str(user_id)
+        with self._transaction():
+            before = _from_row(self._get_profile_and_stats(user_id_str), PROFILE_COLUMNS)
+            profile = dict(before, **profile_data)
+            row = _to_row(profile, PROFILE_COLUMNS)
+            self.conn.execute(
+                "UPDATE users SET name = ?, timezone = ?, reminder_interval = ?, created = ?, extra = ? "
+                "WHERE user_id = ?",
+                (row["name"], row["timezone"], row["reminder_interval"], row["created"], row["extra"], user_id_str)
+            )
+            self._emit(user_id_str, "profile", None, before, profile)
+
+            # Deadlines are wall-clock times in the user's timezone, so their instants move with it
+            if row["timezone"] != before["timezone"]:
+                self._normalize_tasks("user_id = ? AND deadline IS NOT NULL", (user_id_str,))
+
+    @synchronized
+    def add_routine(self, user_id: int, routine_data: Dict[str, Any]) -> str:
+        """Add a new routine for user"""
+        user_id_str = str(user_id)
+        with self._transaction():
+            self._ensure_user(user_id_str)
+            count = self.conn.execute(
+                "SELECT COUNT(*) FROM routines WHERE user_id = ?", (user_id_str,)).fetchone()[0]
+            routine = self._build_routine(count + 1, routine_data)
+            self._insert_routine(user_id_str, routine)
+            self._emit(user_id_str, "routine", routine["id"], None, routine)
+            self.conn.execute(
+                "UPDATE users SET total_routines = total_routines + 1 WHERE user_id = ?", (user_id_str,))
+            self._touch(user_id_str)
+
+        return routine["id"]
+
+    def _insert_routine(self, user_id_str: str, routine: Dict[str, Any]):
+        row = _to_row(routine, ROUTINE_COLUMNS)
+        self.conn.execute(
+            "INSERT INTO routines (user_id, id, name, time, days, type, reminder_intervals, active, created, "
+            "last_completed, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id_str, row["id"], row["name"], row["time"], row["days"], row["type"],
+             row["reminder_intervals"], row["active"], row["created"], row["last_completed"], row["extra"])
+        )
+
+    @synchronized
+    def get_user_routines(self, user_id: int, active_only: bool = True) -> List[Routine]:
+        """Get user routines"""
+        user_id_str = str(user_id)
+        if active_only:
+            rows = self.conn.execute(
+                "SELECT * FROM routines WHERE user_id = ? AND active = 1 ORDER BY position", (user_id_str,))
+        else:
+            rows = self.conn.execute(
+                "SELECT * FROM routines WHERE user_id = ? ORDER BY position", (user_id_str,))
+        return [Routine.from_dict(_from_row(r, ROUTINE_COLUMNS)) for r in rows]
+
+    @synchronized
+    def get_routine_page(self, user_id: int, offset: int = 0, limit: int = PAGE_SIZE,
+                         active_only: bool = True) -> Page:
+        """One page of get_user_routines; only the rows of the page are read"""
+        condition = "user_id = ? AND active = 1" if active_only else "user_id = ?"
+        return self._page("routines", condition, (str(user_id),), "position", offset, limit,
+                          lambda r: Routine.from_dict(_from_row(r, ROUTINE_COLUMNS)))
+
+    def _page(self, table: str, condition: str, params: tuple, order: str, offset: int, limit: int,
+              convert: Callable[[sqlite3.Row], Any]) -> Page:
+        total = self.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition}", params).fetchone()[0]
+        offset = Page.start(offset, limit, total)
+        rows = self.conn.execute(
+            f"SELECT * FROM {table} WHERE {condition} ORDER BY {order} LIMIT ? OFFSET ?", params + (limit, offset))
+        return Page([convert(r) for r in rows], offset, limit, total)
+
+    @synchronized
+    def update_routine(self, user_id: int, routine_id: str, update_data: Dict[str, Any]):
+        """Update a routine"""
+        user_id_str = str(user_id)
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT * FROM routines WHERE user_id = ? AND id = ?", (user_id_str, routine_id)).fetchone()
+            if row is None:
+                return
+
+            before = _from_row(row, ROUTINE_COLUMNS)
+            routine = dict(before, **update_data)
+            values = _to_row(routine, ROUTINE_COLUMNS)
+            self.conn.execute(
+                "UPDATE routines SET id = ?, name = ?, time = ?, days = ?, type = ?, reminder_intervals = ?, "
+                "active = ?, created = ?, last_completed = ?, extra = ? WHERE position = ?",
+                (values["id"], values["name"], values["time"], values["days"], values["type"],
+                 values["reminder_intervals"], values["active"], values["created"], values["last_completed"],
+                 values["extra"], row["position"])
+            )
+            self._emit(user_id_str, "routine", routine_id, before, routine)
+
+    @synchronized
+    def complete_routine(self, user_id: int, routine_id: str, now: Optional[datetime] = None) -> Optional[Routine]:
+        """Mark a routine done for today in the user's timezone
+
+        Returns the updated routine, or None if it doesn't exist or was already done today.
+        """
+        user_id_str = str(user_id)
+        now = datetime.now(timezone.utc) if now is None else now
+        with self._transaction():
+            tz_name = self._get_profile_and_stats(user_id_str)["timezone"]
+            row = self.conn.execute(
+                "SELECT * FROM routines WHERE user_id = ? AND id = ?", (user_id_str, routine_id)).fetchone()
+            if row is None:
+                return None
+
+            before = _from_row(row, ROUTINE_COLUMNS)
+            routine = Routine.from_dict(before)
+            if not routine.complete(local_day(tz_name, now.timestamp()), now):
+                return None
+
+            # The streak counters and history aren't columns, so they live in "extra"
+            after = routine.to_dict()
+            values = _to_row(after, ROUTINE_COLUMNS)
+            self.conn.execute(
+                "UPDATE routines SET last_completed = ?, extra = ? WHERE position = ?",
+                (values["last_completed"], values["extra"], row["position"])
+            )
+            self._touch(user_id_str)
+            self._emit(user_id_str, "routine", routine_id, before, after)
+        return routine
+
+    @synchronized
+    def delete_routine(self, user_id: int, routine_id: str):
+        """Delete a routine"""
+        user_id_str = str(user_id)
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT * FROM routines WHERE user_id = ? AND id = ?", (user_id_str, routine_id)).fetchone()
+            if row is None:
+                return
+
+            self.conn.execute("DELETE FROM routines WHERE user_id = ? AND id = ?", (user_id_str, routine_id))
+            self._emit(user_id_str, "routine", routine_id, _from_row(row, ROUTINE_COLUMNS), None)
+
+    @synchronized
+    def add_task(self, user_id: int, task_data: Dict[str, Any]) -> str:
+        """Add a new task for user"""
+        user_id_str = str(user_id)
+        with self._transaction():
+            self._ensure_user(user_id_str)
+            count = self.conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE user_id = ?", (user_id_str,)).fetchone()[0]
+            tz_name = self._get_profile_and_stats(user_id_str)["timezone"]
+            task = self._build_task(count + 1, task_data, tz_name)
+            self._insert_task(user_id_str, task)
+            self._emit(user_id_str, "task", task["id"], None, task)
+            self.conn.execute(
+                "UPDATE users SET total_tasks = total_tasks + 1 WHERE user_id = ?", (user_id_str,))
+            self._touch(user_id_str)
+
+        return task["id"]
+
+    def _insert_task(self, user_id_str: str, task: Dict[str, Any]):
+        row = _to_row(task, TASK_COLUMNS)
+        self.conn.execute(
+            "INSERT INTO tasks (user_id, id, name, deadline, reminder_intervals, completed, created, "
+            "completed_at, deadline_ts, created_ts, completed_ts, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id_str, row["id"], row["name"], row["deadline"], row["reminder_intervals"],
+             row["completed"], row["created"], row["completed_at"], row["deadline_ts"], row["created_ts"],
+             row["completed_ts"], row["extra"])
+        )
+
+    @synchronized
+    def get_user_tasks(self, user_id: int, completed: Optional[bool] = None, by_deadline: bool = False) -> List[Task]:
+        """Get user tasks, optionally filtered by completion status and sorted by deadline"""
+        user_id_str = str(user_id)
+        order = "deadline_ts IS NULL, deadline_ts, position" if by_deadline else "position"
+        if completed is None:
+            rows = self.conn.execute(
+                f"SELECT * FROM tasks WHERE user_id = ? ORDER BY {order}", (user_id_str,))
+        else:
+            rows = self.conn.execute(
+                f"SELECT * FROM tasks WHERE user_id = ? AND completed = ? ORDER BY {order}",
+                (user_id_str, int(completed)))
+        return [Task.from_dict(_from_row(t, TASK_COLUMNS)) for t in rows]
+
+    @synchronized
+    def get_task_page(self, user_id: int, offset: int = 0, limit: int = PAGE_SIZE,
+                      completed: Optional[bool] = None, by_deadline: bool = False) -> Page:
+        """One page of get_user_tasks; only the rows of the page are read"""
+        order = "deadline_ts IS NULL, deadline_ts, position" if by_deadline else "position"
+        if completed is None:
+            condition, params = "user_id = ?", (str(user_id),)
+        else:
+            condition, params = "user_id = ? AND completed = ?", (str(user_id), int(completed))
+        return self._page("tasks", condition, params, order, offset, limit,
+                          lambda t: Task.from_dict(_from_row(t, TASK_COLUMNS)))
+
+    @synchronized
+    def get_overdue_tasks(self, user_id: int, now: Optional[float] = None) -> List[Task]:
+        """Incomplete tasks whose deadline has passed, earliest first"""
+        now = time.time() if now is None else now
+        rows = self.conn.execute(
+            "SELECT * FROM tasks WHERE user_id = ? AND completed = 0 AND deadline_ts <= ? "
+            "ORDER BY deadline_ts, position", (str(user_id), int(now)))
+        return [Task.from_dict(_from_row(t, TASK_COLUMNS)) for t in rows]
+
+    @synchronized
+    def complete_task(self, user_id: int, task_id: str):
+        """Mark a task as completed"""
+        user_id_str = str(user_id)
+        with self._transaction():
+            self._ensure_user(user_id_str)
+            row = self.conn.execute(
+                "SELECT * FROM tasks WHERE user_id = ? AND id = ? AND completed = 0", (user_id_str, task_id)).fetchone()
+            if row is not None:
+                before = _from_row(row, TASK_COLUMNS)
+                now = datetime.now(timezone.utc)
+                task = dict(before, completed=True, completed_at=now.isoformat(), completed_ts=int(now.timestamp()))
+                self.conn.execute(
+                    "UPDATE tasks SET completed = 1, completed_at = ?, completed_ts = ? WHERE position = ?",
+                    (task["completed_at"], task["completed_ts"], row["position"])
+                )
+                self.conn.execute(
+                    "UPDATE users SET completed_tasks = completed_tasks + 1 WHERE user_id = ?", (user_id_str,))
+                self._emit(user_id_str, "task", task_id, before, task)
+            self._touch(user_id_str)
+
+    @synchronized
+    def update_task(self, user_id: int, task_id: str, update_data: Dict[str, Any]) -> Optional[Task]:
+        """Update a task; returns the updated task, or None if it doesn't exist"""
+        user_id_str = str(user_id)
+        with self._transaction():
+            tz_name = self._get_profile_and_stats(user_id_str)["timezone"]
+            row = self.conn.execute(
+                "SELECT * FROM tasks WHERE user_id = ? AND id = ?", (user_id_str, task_id)).fetchone()
+            if row is None:
+                return None
+
+            before = _from_row(row, TASK_COLUMNS)
+            task = Task.from_dict(before)
+            if "deadline" in update_data and update_data["deadline"] != task.deadline:
+                # A new deadline can pass again, so it gets its own overdue notice
+                update_data = dict(update_data, overdue_notified=False)
+            task.update(update_data)
+            task.normalize(tz_name)
+
+            after = task.to_dict()
+            values = _to_row(after, TASK_COLUMNS)
+            self.conn.execute(
+                "UPDATE tasks SET id = ?, name = ?, deadline = ?, reminder_intervals = ?, completed = ?, "
+                "created = ?, completed_at = ?, deadline_ts = ?, created_ts = ?, completed_ts = ?, extra = ? "
+                "WHERE position = ?",
+                (values["id"], values["name"], values["deadline"], values["reminder_intervals"],
+                 values["completed"], values["created"], values["completed_at"], values["deadline_ts"],
+                 values["created_ts"], values["completed_ts"], values["extra"], row["position"])
+            )
+            self._emit(user_id_str, "task", task_id, before, after)
+        return task
+
+    @synchronized
+    def delete_task(self, user_id: int, task_id: str):
+        """Delete a task"""
+        user_id_str = str(user_id)
+        with self._transaction():
+            row = self.conn.execute(
+                "SELECT * FROM tasks WHERE user_id = ? AND id = ?", (user_id_str, task_id)).fetchone()
+            if row is None:
+                return
+
+            self.conn.execute("DELETE FROM tasks WHERE user_id = ? AND id = ?", (user_id_str, task_id))
+            self._emit(user_id_str, "task", task_id, _from_row(row, TASK_COLUMNS), None)
+            self.conn.execute(
+                "UPDATE users SET total_tasks = total_tasks - 1, completed_tasks = completed_tasks - ? "
+                "WHERE user_id = ?",
+                (row["completed"], user_id_str)
+            )
+
+    @synchronized
+    def bulk_add(self, items: Iterable[Tuple[Any, str, Dict[str, Any]]]) -> int:
+        """Add many routines and tasks in one transaction, return the number added"""
+        # user id -> [routine count, task count] at the start plus what this batch added
+        counts: Dict[str, List[int]] = {}
+        added: Dict[str, List[int]] = {}
+        timezones: Dict[str, str] = {}
+        with self._transaction():
+            for user_id, kind, item_data in items:
+                user_id_str = str(user_id)
+                if user_id_str not in counts:
+                    self._ensure_user(user_id_str)
+                    counts[user_id_str] = [
+                        self.conn.execute("SELECT COUNT(*) FROM routines WHERE user_id = ?",
+                                          (user_id_str,)).fetchone()[0],
+                        self.conn.execute("SELECT COUNT(*) FROM tasks WHERE user_id = ?",
+                                          (user_id_str,)).fetchone()[0]
+                    ]
+                    added[user_id_str] = [0, 0]
+                    timezones[user_id_str] = self._get_profile_and_stats(user_id_str)["timezone"]
+
+                if kind == "routine":
+                    counts[user_id_str][0] += 1
+                    added[user_id_str][0] += 1
+                    routine = self._build_routine(counts[user_id_str][0], item_data)
+                    self._insert_routine(user_id_str, routine)
+                    self._emit(user_id_str, "routine", routine["id"], None, routine)
+                else:
+                    counts[user_id_str][1] += 1
+                    added[user_id_str][1] += 1
+                    task = self._build_task(counts[user_id_str][1], item_data, timezones[user_id_str])
+                    self._insert_task(user_id_str, task)
+                    self._emit(user_id_str, "task", task["id"], None, task)
+
+            for user_id_str, (routines, tasks) in added.items():
+                self.conn.execute(
+                    "UPDATE users SET total_routines = total_routines + ?, total_tasks = total_tasks + ? "
+                    "WHERE user_id = ?", (routines, tasks, user_id_str))
+                self._touch(user_id_str)
+
+        return sum(routines + tasks for routines, tasks in added.values())
+
+    @synchronized
+    def get_user_stats(self, user_id: int) -> UserStats:
+        """Get user statistics"""
+        user_id_str = str(user_id)
+        row = self._get_profile_and_stats(user_id_str)
+        pending_tasks = self.conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE user_id = ? AND completed = 0", (user_id_str,)).fetchone()[0]
+        routines = [Routine.from_dict(_from_row(r, ROUTINE_COLUMNS)) for r in self.conn.execute(
+            "SELECT * FROM routines WHERE user_id = ? AND active = 1 ORDER BY position", (user_id_str,))]
+
+        stats = UserStats.from_dict({
+            "total_routines": row["total_routines"],
+            "total_tasks": row["total_tasks"],
+            "completed_tasks": row["completed_tasks"],
+            "last_activity": row["last_activity"]
+        })
+        return self._compute_stats(stats, pending_tasks, routines, row["timezone"])
+
+    @synchronized
+    def export_data(self) -> Dict[str, Any]:
+        """Return the whole database as a single bot_data.json document"""
+        user_ids = [row["user_id"] for row in self.conn.execute("SELECT user_id FROM users ORDER BY rowid")]
+        return {
+            "users": {user_id: self._user_record(user_id) for user_id in user_ids},
+            "metadata": {"version": "1.0", "engine": "sqlite"}
+        }
+
+    @synchronized
+    def import_data(self, data: Dict[str, Any]) -> int:
+        """Load a bot_data.json document into the database, return the number of users imported"""
+        with self._transaction():
+            for user_id_str, user_data in data.get("users", {}).items():
+                profile = _to_row(user_data["profile"], PROFILE_COLUMNS)
+                stats = user_data["stats"]
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO users (user_id, name, timezone, reminder_interval, created, "
+                    "total_routines, total_tasks, completed_tasks, last_activity, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (user_id_str, profile["name"], profile["timezone"], profile["reminder_interval"],
+                     profile["created"], stats["total_routines"], stats["total_tasks"],
+                     stats["completed_tasks"], stats.get("last_activity"), profile["extra"])
+                )
+                self.conn.execute("DELETE FROM routines WHERE user_id = ?", (user_id_str,))
+                self.conn.execute("DELETE FROM tasks WHERE user_id = ?", (user_id_str,))
+                for routine in user_data.get("routines", []):
+                    self._insert_routine(user_id_str, routine)
+                for task in user_data.get("tasks", []):
+                    model = Task.from_dict(task)
+                    model.normalize(profile["timezone"])
+                    self._insert_task(user_id_str, model.to_dict())
+                self._bump_version(user_id_str)
+
+        return len(data.get("users", {}))
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
@@ -2,292 +2,620 @@
 """
 Data storage management with JSON database and auto-backup
 Windows-compatible UTF-8 encoding
+Persistence is provided by a pluggable backend (see backends.py)
 """
 
 import json
 import os
-import shutil
 import logging
+import functools
+import itertools
+import threading
+import time
+import copy
+from collections import OrderedDict, deque
 from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional
-from constants import DATA_FILE, BACKUP_DIR, DEFAULT_TIMEZONE
+from typing import Dict, List, Any, Optional, Tuple, Iterable, Callable
+from constants import (
+    DATA_FILE, BACKUP_DIR, DEFAULT_TIMEZONE, STORAGE_BACKEND, STORAGE_JOURNAL, GROUP_COMMIT_WINDOW_MS,
+    PAGE_SIZE, PAGE_VIEW_CACHE_SIZE, MODEL_CACHE_SIZE
+)
+from backends import StorageBackend, JsonFileBackend, Change, create_backend
+from events import EventBus, ChangeEvent, events_from_changes
+from models import UserRecord, UserProfile, Routine, Task, UserStats, Page
+from timeutils import local_day
 
 logger = logging.getLogger(__name__)
 
+
+def synchronized(method):
+    """Run a StorageManager method while holding the storage lock
+    
+    Saves queued by the method are waited on after the lock is released, so callers
+    return only once their writes are durable while others can join the same batch.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        local = self._local
+        with self._lock:
+            local.depth = getattr(local, 'depth', 0) + 1
+            try:
+                result = method(self, *args, **kwargs)
+            finally:
+                local.depth -= 1
+        
+        if local.depth == 0:
+            self._wait_durable()
+        return result
+    return wrapper
+
+
+# Data versions come from one process-wide sequence, so two storage managers (e.g. in tests
+# sharing a UIManager) never hand out the same version
+_version_sequence = itertools.count(1)
+
+
 class StorageManager:
-    def __init__(self, data_file: str = DATA_FILE):
+    def __init__(self, data_file: str = DATA_FILE, backend: Optional[StorageBackend] = None):
         self.data_file = data_file
         self.backup_dir = BACKUP_DIR
         self._ensure_directories()
-        self._init_data_structure()
+        
+        # Persistence is delegated to a backend; the single JSON document is the default
+        self.backend = backend if backend is not None else JsonFileBackend(data_file)
+        self._lock = self.backend.lock
+        self._local = threading.local()
+        
+        # Materialized models of the most recently used users, keyed to the stored record they
+        # were built from; bounded, since the backend keeps every record resident as well
+        self._models: "OrderedDict[str, Tuple[Dict[str, Any], UserRecord]]" = OrderedDict()
+        # Filtered and ordered item lists for paging, keyed to the record they were built from
+        self._views: "OrderedDict[tuple, Tuple[Dict[str, Any], List[Any]]]" = OrderedDict()
+        
+        # Every mutation is published here as typed change events
+        self.events = EventBus()
+        # Events of saves in the order they were made, each with the pending save they wait
+        # on; they are published only once that save is durable
+        self._unpublished: "deque[Tuple[Any, List[ChangeEvent]]]" = deque()
+        
+        # Per-user data versions, raised by every change event, so renderings of a user's
+        # data can be reused until it changes
+        self._versions: Dict[str, int] = {}
+        self.events.subscribe(self._count_change)
+        
+        # Number of mutations since startup, used to schedule backups
+        self.change_count = 0
+    
+    def _count_change(self, event: ChangeEvent):
+        self._bump_version(event.user_id)
+    
+    def _bump_version(self, user_id_str: str):
+        self._versions[user_id_str] = next(_version_sequence)
+    
+    @synchronized
+    def data_version(self, user_id: int) -> int:
+        """Version of a user's data; increases with every change to it
+        
+        The stored record is looked up first, so an edit made outside this process, which
+        publishes no event, raises the version once the backend has reloaded the record.
+        """
+        self._get_user(user_id)
+        return self._current_version(str(user_id))
+    
+    def _current_version(self, user_id_str: str) -> int:
+        version = self._versions.get(user_id_str)
+        if version is None:
+            # A save whose events aren't published yet may already be visible
+            version = self._versions.setdefault(user_id_str, next(_version_sequence))
+        return version
     
     def _ensure_directories(self):
         """Create necessary directories if they don't exist"""
         if not os.path.exists(self.backup_dir):
             os.makedirs(self.backup_dir)
     
-    def _init_data_structure(self):
-        """Initialize data structure if file doesn't exist"""
-        if not os.path.exists(self.data_file):
-            default_data = {
-                "users": {},
-                "metadata": {
-                    "version": "1.0",
-                    "created": datetime.now(timezone.utc).isoformat(),
-                    "last_backup": None
-                }
+    def _new_user_record(self) -> Dict[str, Any]:
+        """Create new user data structure"""
+        return {
+            "profile": {
+                "name": "",
+                "timezone": DEFAULT_TIMEZONE,
+                "reminder_interval": 15,
+                "created": datetime.now(timezone.utc).isoformat()
+            },
+            "routines": [],
+            "tasks": [],
+            "stats": {
+                "total_routines": 0,
+                "total_tasks": 0,
+                "completed_tasks": 0,
+                "last_activity": datetime.now(timezone.utc).isoformat()
             }
-            self._save_data(default_data)
+        }
     
-    def _load_data(self) -> Dict[str, Any]:
-        """Load data from JSON file with UTF-8 encoding"""
-        try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            logger.error(f"Error loading data: {e}")
-            return {
-                "users": {},
-                "metadata": {
-                    "version": "1.0",
-                    "created": datetime.now(timezone.utc).isoformat(),
-                    "last_backup": None
-                }
-            }
+    def _build_routine(self, sequence: int, routine_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a routine record; sequence is its 1-based position in the user's list"""
+        return {
+            "id": f"routine_{sequence}_{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            "name": routine_data["name"],
+            "time": routine_data["time"],
+            "days": routine_data.get("days", []),
+            "type": routine_data.get("type", "daily"),
+            "reminder_intervals": routine_data.get("reminder_intervals", [15]),
+            "active": True,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "last_completed": None
+        }
     
-    def _save_data(self, data: Dict[str, Any]):
-        """Save data to JSON file with UTF-8 encoding"""
-        try:
-            # Create backup before saving
-            if os.path.exists(self.data_file):
-                backup_name = f"bot_data_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-                backup_path = os.path.join(self.backup_dir, backup_name)
-                shutil.copy2(self.data_file, backup_path)
-                
-                # Update last backup time
-                data["metadata"]["last_backup"] = datetime.now(timezone.utc).isoformat()
-                
-                # Keep only last 10 backups
-                self._cleanup_old_backups()
-            
-            # Save main data file
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-                
-        except Exception as e:
-            logger.error(f"Error saving data: {e}")
-            raise
+    def _build_task(self, sequence: int, task_data: Dict[str, Any], tz_name: str = DEFAULT_TIMEZONE) -> Dict[str, Any]:
+        """Build a task record; sequence is its 1-based position in the user's list"""
+        task = Task.from_dict({
+            "id": f"task_{sequence}_{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            "name": task_data["name"],
+            "deadline": task_data.get("deadline"),
+            "reminder_intervals": task_data.get("reminder_intervals", [15]),
+            "completed": False,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "completed_at": None
+        })
+        task.normalize(tz_name)
+        return task.to_dict()
     
-    def _cleanup_old_backups(self, keep_count: int = 10):
-        """Keep only the most recent backup files"""
+    @staticmethod
+    def _compute_stats(stats: UserStats, pending_tasks: int, routines: Iterable[Routine] = (),
+                       tz_name: str = DEFAULT_TIMEZONE) -> UserStats:
+        """Add derived fields (pending tasks, completion rate, routine streaks) to a copy of the stored stats"""
+        return stats.with_derived(pending_tasks, routines, tz_name)
+    
+    def _save_user(self, user_id_str: str, user_data: Dict[str, Any], changes: List[Change],
+                   previous: Optional[Dict[str, Any]] = None):
+        """Hand a mutated user record and its change records to the backend, then publish them
+        
+        `previous` is the record before the mutation, used for the events' before values.
+        """
+        pending = self.backend.save_user(user_id_str, user_data, changes)
+        self.change_count += 1
+        self._defer(pending, events_from_changes(user_id_str, previous, changes))
+    
+    def _save_batch(self, saves: List[Tuple[str, Dict[str, Any], List[Change], Optional[Dict[str, Any]]]]):
+        """Save several (user id, record, changes, previous record) at once, in a single backend write"""
+        pending = self.backend.save_batch([(user_id_str, user_data, changes)
+                                           for user_id_str, user_data, changes, _ in saves])
+        self.change_count += len(saves)
+        events = []
+        for user_id_str, _, changes, previous in saves:
+            events.extend(events_from_changes(user_id_str, previous, changes))
+        self._defer(pending, events)
+    
+    def _defer(self, pending, events: List[ChangeEvent]):
+        """Publish a save's events once it is durable
+        
+        A save that isn't durable yet is remembered to be waited on by _wait_durable, which
+        publishes its events afterwards.
+        """
+        self._unpublished.append((pending, events))
+        if pending is None:
+            self._publish_durable()
+        else:
+            if not hasattr(self._local, 'pending'):
+                self._local.pending = []
+            self._local.pending.append(pending)
+    
+    def _publish_durable(self):
+        """Publish, in order, the events of saves that have become durable"""
+        while self._unpublished:
+            pending, events = self._unpublished[0]
+            if pending is not None and not pending.done():
+                # Later saves may be durable already, but their events must not overtake these
+                break
+            self._unpublished.popleft()
+            if pending is not None and pending.exception() is not None:
+                logger.error(f"Dropping {len(events)} change events of a failed save: {pending.exception()}")
+                continue
+            self.events.publish(events)
+    
+    def _save_model(self, user_id_str: str, user: UserRecord, changes: List[Change]):
+        """Serialize a mutated model and save it; the model stays cached for the new record"""
+        # Models are serialized into fresh dicts, so the record they were built from is
+        # still the unmodified previous version
+        cached = self._models.get(user_id_str)
+        previous = cached[0] if cached is not None else self.backend.load_user(user_id_str)
+        user_data = user.to_dict()
+        self._cache_model(user_id_str, user_data, user)
+        self._save_user(user_id_str, user_data, changes, previous)
+    
+    def _cache_model(self, user_id_str: str, user_data: Dict[str, Any], user: UserRecord):
+        self._models[user_id_str] = (user_data, user)
+        self._models.move_to_end(user_id_str)
+        if len(self._models) > MODEL_CACHE_SIZE:
+            self._models.popitem(last=False)
+    
+    def _wait_durable(self):
+        """Block until every save queued by this thread has been written"""
+        pending = getattr(self._local, 'pending', None)
+        if not pending:
+            return
+        
+        self._local.pending = []
         try:
-            backup_files = [f for f in os.listdir(self.backup_dir) if f.startswith('bot_data_backup_')]
-            backup_files.sort(reverse=True)
-            
-            # Remove old backups
-            for backup_file in backup_files[keep_count:]:
-                os.remove(os.path.join(self.backup_dir, backup_file))
-        except Exception as e:
-            logger.error(f"Error cleaning up backups: {e}")
+            for future in pending:
+                future.result()
+        finally:
+            with self._lock:
+                self._publish_durable()
+    
+    def _get_user(self, user_id: int) -> UserRecord:
+        """Return the cached model of a user, materializing it when the stored record changed"""
+        return self._model_of(str(user_id), self.get_user_data(user_id))
+    
+    def _list_view(self, user_id: int, view: tuple, build: Callable[[UserRecord], List[Any]]) -> List[Any]:
+        """A user's items as listed by one view, rebuilt only after the user's record changed"""
+        user_id_str = str(user_id)
+        user = self._get_user(user_id)
+        record = self._models[user_id_str][0]
+        key = (user_id_str,) + view
+        cached = self._views.get(key)
+        if cached is not None and cached[0] is record:
+            self._views.move_to_end(key)
+            return cached[1]
+        
+        items = build(user)
+        self._views[key] = (record, items)
+        self._views.move_to_end(key)
+        if len(self._views) > PAGE_VIEW_CACHE_SIZE:
+            self._views.popitem(last=False)
+        return items
     
+    def _model_of(self, user_id_str: str, user_data: Dict[str, Any]) -> UserRecord:
+        """Return the cached model of a stored record, or build it if the cache is stale"""
+        # The backend hands out the same record object until it is replaced, so identity
+        # tells whether the cached model is still current (e.g. after an external edit)
+        cached = self._models.get(user_id_str)
+        if cached is not None and cached[0] is user_data:
+            self._models.move_to_end(user_id_str)
+            return cached[1]
+        # Either replaced without a change event or not cached (e.g. evicted) to compare
+        # against, so renderings of earlier records can't be trusted to be current
+        self._bump_version(user_id_str)
+        
+        user = UserRecord.from_dict(user_data)
+        self._cache_model(user_id_str, user_data, user)
+        
+        # Records written before tasks carried epoch-second fields are backfilled in memory
+        # only; the filled-in fields are stored with the user's next write, so reading never
+        # writes
+        for task in user.tasks:
+            task.normalize(user.profile.timezone)
+        return user
+    
+    @synchronized
     def get_user_data(self, user_id: int) -> Dict[str, Any]:
         """Get user data, create if doesn't exist"""
-        data = self._load_data()
         user_id_str = str(user_id)
+        user_data = self.backend.load_user(user_id_str)
         
-        if user_id_str not in data["users"]:
-            # Create new user data structure
-            data["users"][user_id_str] = {
-                "profile": {
-                    "name": "",
-                    "timezone": DEFAULT_TIMEZONE,
-                    "reminder_interval": 15,
-                    "created": datetime.now(timezone.utc).isoformat()
-                },
-                "routines": [],
-                "tasks": [],
-                "stats": {
-                    "total_routines": 0,
-                    "total_tasks": 0,
-                    "completed_tasks": 0,
-                    "last_activity": datetime.now(timezone.utc).isoformat()
-                }
-            }
-            self._save_data(data)
+        if user_data is None:
+            user_data = self._new_user_record()
+            self._save_user(user_id_str, user_data, [("user", None, user_data)])
+        
+        return user_data
+    
+    @synchronized
+    def user_ids(self) -> List[str]:
+        """Ids of all stored users"""
+        return self.backend.user_ids()
+    
+    def scan_users(self, visit: Callable[[str, Dict[str, Any]], None]) -> int:
+        """Call visit(user id, stored record) for every user, return the number visited
         
-        return data["users"][user_id_str]
+        Users are read one at a time, so a scan at startup goes through the lazy index instead
+        of loading the whole database, and each is visited while holding the storage lock, so
+        every change event of the user is published either before or after its visit. Callers
+        must not change the records.
+        """
+        count = 0
+        for user_id_str in self.user_ids():
+            count += self._visit_user(user_id_str, visit)
+        return count
     
+    @synchronized
+    def _visit_user(self, user_id_str: str, visit: Callable[[str, Dict[str, Any]], None]) -> bool:
+        user_data = self.backend.load_user(user_id_str)
+        if user_data is None:
+            return False
+        visit(user_id_str, user_data)
+        return True
+    
+    @synchronized
+    def get_user_profile(self, user_id: int) -> UserProfile:
+        """Get the user's profile"""
+        return self._get_user(user_id).profile
+    
+    @synchronized
     def update_user_profile(self, user_id: int, profile_data: Dict[str, Any]):
         """Update user profile information"""
-        data = self._load_data()
-        user_id_str = str(user_id)
-        user_data = self.get_user_data(user_id)
+        user = self._get_user(user_id)
+        
+        user.profile.update(profile_data)
+        changes = [("profile", None, user.profile.to_dict())]
         
-        user_data["profile"].update(profile_data)
-        data["users"][user_id_str] = user_data
-        self._save_data(data)
+        # Deadlines are wall-clock times in the user's timezone, so their instants move with it
+        for task in user.tasks:
+            if task.normalize(user.profile.timezone):
+                changes.append(("tasks", task.id, task.to_dict()))
+        self._save_model(str(user_id), user, changes)
     
+    @synchronized
     def add_routine(self, user_id: int, routine_data: Dict[str, Any]) -> str:
         """Add a new routine for user"""
-        data = self._load_data()
-        user_id_str = str(user_id)
-        user_data = self.get_user_data(user_id)
-        
-        # Generate routine ID
-        routine_id = f"routine_{len(user_data['routines']) + 1}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        user = self._get_user(user_id)
         
-        routine = {
-            "id": routine_id,
-            "name": routine_data["name"],
-            "time": routine_data["time"],
-            "days": routine_data.get("days", []),
-            "type": routine_data.get("type", "daily"),
-            "reminder_intervals": routine_data.get("reminder_intervals", [15]),
-            "active": True,
-            "created": datetime.now(timezone.utc).isoformat(),
-            "last_completed": None
-        }
+        routine = Routine.from_dict(self._build_routine(len(user.routines) + 1, routine_data))
         
-        user_data["routines"].append(routine)
-        user_data["stats"]["total_routines"] += 1
-        user_data["stats"]["last_activity"] = datetime.now(timezone.utc).isoformat()
+        user.routines.append(routine)
+        user.stats.total_routines += 1
+        user.stats.last_activity = datetime.now(timezone.utc)
         
-        data["users"][user_id_str] = user_data
-        self._save_data(data)
+        self._save_model(str(user_id), user, [
+            ("routines", routine.id, routine.to_dict()),
+            ("stats", None, user.stats.to_dict())
+        ])
         
-        return routine_id
+        return routine.id
     
-    def get_user_routines(self, user_id: int, active_only: bool = True) -> List[Dict[str, Any]]:
+    @synchronized
+    def get_user_routines(self, user_id: int, active_only: bool = True) -> List[Routine]:
         """Get user routines"""
-        user_data = self.get_user_data(user_id)
-        routines = user_data["routines"]
-        
+        return self._select_routines(self._get_user(user_id).routines, active_only)
+    
+    @staticmethod
+    def _select_routines(routines: List[Routine], active_only: bool) -> List[Routine]:
         if active_only:
-            routines = [r for r in routines if r.get("active", True)]
-        
-        return routines
+            return [r for r in routines if r.active]
+        return list(routines)
     
+    @synchronized
+    def get_routine_page(self, user_id: int, offset: int = 0, limit: int = PAGE_SIZE,
+                         active_only: bool = True) -> Page:
+        """One page of get_user_routines; the next pages of an unchanged list cost O(limit)"""
+        routines = self._list_view(user_id, ("routines", active_only),
+                                   lambda user: self._select_routines(user.routines, active_only))
+        return Page.of(routines, offset, limit)
+    
+    @synchronized
     def update_routine(self, user_id: int, routine_id: str, update_data: Dict[str, Any]):
         """Update a routine"""
-        data = self._load_data()
-        user_id_str = str(user_id)
-        user_data = self.get_user_data(user_id)
+        user = self._get_user(user_id)
         
-        for i, routine in enumerate(user_data["routines"]):
-            if routine["id"] == routine_id:
-                routine.update(update_data)
-                break
-        
-        data["users"][user_id_str] = user_data
-        self._save_data(data)
+        routine = user.find_routine(routine_id)
+        if routine is not None:
+            routine.update(update_data)
+            self._save_model(str(user_id), user, [("routines", routine_id, routine.to_dict())])
     
+    @synchronized
     def delete_routine(self, user_id: int, routine_id: str):
         """Delete a routine"""
-        data = self._load_data()
-        user_id_str = str(user_id)
-        user_data = self.get_user_data(user_id)
+        user = self._get_user(user_id)
         
-        user_data["routines"] = [r for r in user_data["routines"] if r["id"] != routine_id]
+        user.routines = [r for r in user.routines if r.id != routine_id]
         
-        data["users"][user_id_str] = user_data
-        self._save_data(data)
+        self._save_model(str(user_id), user, [("routines", routine_id, None)])
     
+    @synchronized
+    def complete_routine(self, user_id: int, routine_id: str, now: Optional[datetime] = None) -> Optional[Routine]:
+        """Mark a routine done for today in the user's timezone
+        
+        Returns the updated routine, or None if it doesn't exist or was already done today.
+        """
+        user = self._get_user(user_id)
+        now = datetime.now(timezone.utc) if now is None else now
+        
+        routine = user.find_routine(routine_id)
+        if routine is None or not routine.complete(local_day(user.profile.timezone, now.timestamp()), now):
+            return None
+        
+        user.stats.last_activity = now
+        self._save_model(str(user_id), user, [
+            ("routines", routine_id, routine.to_dict()),
+            ("stats", None, user.stats.to_dict())
+        ])
+        return routine
+    
+    @synchronized
     def add_task(self, user_id: int, task_data: Dict[str, Any]) -> str:
         """Add a new task for user"""
-        data = self._load_data()
-        user_id_str = str(user_id)
-        user_data = self.get_user_data(user_id)
+        user = self._get_user(user_id)
         
-        # Generate task ID
-        task_id = f"task_{len(user_data['tasks']) + 1}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        task = {
-            "id": task_id,
-            "name": task_data["name"],
-            "deadline": task_data.get("deadline"),
-            "reminder_intervals": task_data.get("reminder_intervals", [15]),
-            "completed": False,
-            "created": datetime.now(timezone.utc).isoformat(),
-            "completed_at": None
-        }
+        task = Task.from_dict(self._build_task(len(user.tasks) + 1, task_data, user.profile.timezone))
         
-        user_data["tasks"].append(task)
-        user_data["stats"]["total_tasks"] += 1
-        user_data["stats"]["last_activity"] = datetime.now(timezone.utc).isoformat()
+        user.tasks.append(task)
+        user.stats.total_tasks += 1
+        user.stats.last_activity = datetime.now(timezone.utc)
         
-        data["users"][user_id_str] = user_data
-        self._save_data(data)
+        self._save_model(str(user_id), user, [
+            ("tasks", task.id, task.to_dict()),
+            ("stats", None, user.stats.to_dict())
+        ])
         
-        return task_id
+        return task.id
     
-    def get_user_tasks(self, user_id: int, completed: Optional[bool] = None) -> List[Dict[str, Any]]:
-        """Get user tasks, optionally filtered by completion status"""
-        user_data = self.get_user_data(user_id)
-        tasks = user_data["tasks"]
-        
+    @synchronized
+    def get_user_tasks(self, user_id: int, completed: Optional[bool] = None, by_deadline: bool = False) -> List[Task]:
+        """Get user tasks, optionally filtered by completion status and sorted by deadline"""
+        return self._select_tasks(self._get_user(user_id).tasks, completed, by_deadline)
+    
+    @staticmethod
+    def _select_tasks(tasks: List[Task], completed: Optional[bool], by_deadline: bool) -> List[Task]:
         if completed is not None:
-            tasks = [t for t in tasks if t.get("completed", False) == completed]
+            tasks = [t for t in tasks if t.completed == completed]
+        else:
+            tasks = list(tasks)
         
+        if by_deadline:
+            tasks.sort(key=Task.deadline_order)
         return tasks
     
+    @synchronized
+    def get_task_page(self, user_id: int, offset: int = 0, limit: int = PAGE_SIZE,
+                      completed: Optional[bool] = None, by_deadline: bool = False) -> Page:
+        """One page of get_user_tasks; the next pages of an unchanged list cost O(limit)"""
+        tasks = self._list_view(user_id, ("tasks", completed, by_deadline),
+                                lambda user: self._select_tasks(user.tasks, completed, by_deadline))
+        return Page.of(tasks, offset, limit)
+    
+    @synchronized
+    def get_overdue_tasks(self, user_id: int, now: Optional[float] = None) -> List[Task]:
+        """Incomplete tasks whose deadline has passed, earliest first"""
+        now = time.time() if now is None else now
+        overdue = [t for t in self._get_user(user_id).tasks if t.is_overdue(now)]
+        overdue.sort(key=Task.deadline_order)
+        return overdue
+    
+    @synchronized
     def complete_task(self, user_id: int, task_id: str):
         """Mark a task as completed"""
-        data = self._load_data()
-        user_id_str = str(user_id)
-        user_data = self.get_user_data(user_id)
+        user = self._get_user(user_id)
         
-        for task in user_data["tasks"]:
-            if task["id"] == task_id and not task.get("completed", False):
-                task["completed"] = True
-                task["completed_at"] = datetime.now(timezone.utc).isoformat()
-                user_data["stats"]["completed_tasks"] += 1
-                break
+        changes = []
+        task = user.find_task(task_id)
+        if task is not None and not task.completed:
+            task.completed = True
+            task.completed_at = datetime.now(timezone.utc)
+            task.completed_ts = int(task.completed_at.timestamp())
+            user.stats.completed_tasks += 1
+            changes.append(("tasks", task_id, task.to_dict()))
+        
+        user.stats.last_activity = datetime.now(timezone.utc)
+        changes.append(("stats", None, user.stats.to_dict()))
+        self._save_model(str(user_id), user, changes)
+    
+    @synchronized
+    def update_task(self, user_id: int, task_id: str, update_data: Dict[str, Any]) -> Optional[Task]:
+        """Update a task; returns the updated task, or None if it doesn't exist"""
+        user = self._get_user(user_id)
+        
+        task = user.find_task(task_id)
+        if task is None:
+            return None
+        
+        if "deadline" in update_data and update_data["deadline"] != task.deadline:
+            # A new deadline can pass again, so it gets its own overdue notice
+            update_data = dict(update_data, overdue_notified=False)
+        task.update(update_data)
+        task.normalize(user.profile.timezone)
         
-        user_data["stats"]["last_activity"] = datetime.now(timezone.utc).isoformat()
-        data["users"][user_id_str] = user_data
-        self._save_data(data)
+        self._save_model(str(user_id), user, [("tasks", task_id, task.to_dict())])
+        return task
     
+    @synchronized
     def delete_task(self, user_id: int, task_id: str):
         """Delete a task"""
-        data = self._load_data()
-        user_id_str = str(user_id)
-        user_data = self.get_user_data(user_id)
+        user = self._get_user(user_id)
         
         # Check if task was completed before deleting for stats
-        task_to_delete = next((t for t in user_data["tasks"] if t["id"] == task_id), None)
-        if task_to_delete and task_to_delete.get("completed", False):
-            user_data["stats"]["completed_tasks"] -= 1
+        task_to_delete = user.find_task(task_id)
+        if task_to_delete and task_to_delete.completed:
+            user.stats.completed_tasks -= 1
         
-        user_data["tasks"] = [t for t in user_data["tasks"] if t["id"] != task_id]
-        user_data["stats"]["total_tasks"] -= 1
+        user.tasks = [t for t in user.tasks if t.id != task_id]
+        user.stats.total_tasks -= 1
         
-        data["users"][user_id_str] = user_data
-        self._save_data(data)
+        self._save_model(str(user_id), user, [
+            ("tasks", task_id, None),
+            ("stats", None, user.stats.to_dict())
+        ])
     
-    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
-        """Get user statistics"""
-        user_data = self.get_user_data(user_id)
-        stats = user_data["stats"].copy()
+    @synchronized
+    def bulk_add(self, items: Iterable[Tuple[Any, str, Dict[str, Any]]]) -> int:
+        """Add many routines and tasks with a single backend write, return the number added
         
-        # Calculate additional stats
-        pending_tasks = len([t for t in user_data["tasks"] if not t.get("completed", False)])
-        stats["pending_tasks"] = pending_tasks
+        `items` are (user id, "routine" or "task", data) with the same data add_routine and
+        add_task take; users that don't exist yet are created in the same write.
+        """
+        users: Dict[str, Tuple[UserRecord, List[Change], Optional[Dict[str, Any]]]] = {}
+        count = 0
+        try:
+            for user_id, kind, item_data in items:
+                user_id_str = str(user_id)
+                if user_id_str not in users:
+                    previous = self.backend.load_user(user_id_str)
+                    changes = []
+                    if previous is None:
+                        # Created together with its items rather than in a write of its own
+                        record = self._new_user_record()
+                        changes.append(("user", None, record))
+                        user = UserRecord.from_dict(record)
+                    else:
+                        user = self._model_of(user_id_str, previous)
+                    users[user_id_str] = (user, changes, previous)
+                
+                user, changes, _ = users[user_id_str]
+                if kind == "routine":
+                    routine = Routine.from_dict(self._build_routine(len(user.routines) + 1, item_data))
+                    user.routines.append(routine)
+                    user.stats.total_routines += 1
+                    changes.append(("routines", routine.id, routine.to_dict()))
+                else:
+                    task = Task.from_dict(self._build_task(len(user.tasks) + 1, item_data, user.profile.timezone))
+                    user.tasks.append(task)
+                    user.stats.total_tasks += 1
+                    changes.append(("tasks", task.id, task.to_dict()))
+                count += 1
+        except Exception:
+            # Cached models may hold half of the batch; rebuild them from the stored records
+            for user_id_str in users:
+                self._models.pop(user_id_str, None)
+            raise
         
-        if stats["total_tasks"] > 0:
-            stats["completion_rate"] = round((stats["completed_tasks"] / stats["total_tasks"]) * 100, 1)
-        else:
-            stats["completion_rate"] = 0.0
+        saves = []
+        now = datetime.now(timezone.utc)
+        for user_id_str, (user, changes, previous) in users.items():
+            user.stats.last_activity = now
+            changes.append(("stats", None, user.stats.to_dict()))
+            user_data = user.to_dict()
+            self._cache_model(user_id_str, user_data, user)
+            saves.append((user_id_str, user_data, changes, previous))
         
-        return stats
+        if saves:
+            self._save_batch(saves)
+        return count
     
+    @synchronized
+    def get_user_stats(self, user_id: int) -> UserStats:
+        """Get user statistics"""
+        user = self._get_user(user_id)
+        
+        # Calculate additional stats
+        pending_tasks = sum(1 for t in user.tasks if not t.completed)
+        routines = [r for r in user.routines if r.active]
+        return self._compute_stats(user.stats, pending_tasks, routines, user.profile.timezone)
+    
+    @synchronized
+    def export_data(self) -> Dict[str, Any]:
+        """Return a detached copy of the whole database as a single bot_data.json document"""
+        return copy.deepcopy(self.backend.export_data())
+    
+    @synchronized
     def manual_backup(self) -> str:
         """Create manual backup and return backup file path"""
-        data = self._load_data()
+        data = self.export_data()
         backup_name = f"manual_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         backup_path = os.path.join(self.backup_dir, backup_name)
         
         with open(backup_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
         
-        return backup_path
\ No newline at end of file
+        return backup_path
+    
+    def close(self):
+        """Release resources held by the storage backend"""
+        self.backend.close()
+
+
+def create_storage_manager(backend_name: str = STORAGE_BACKEND) -> StorageManager:
+    """Create a StorageManager using the configured backend"""
+    if backend_name == "sqlite":
+        from sqlite_storage import SQLiteStorageManager
+        return SQLiteStorageManager()
+    return StorageManager(backend=create_backend(
+        backend_name, journal=STORAGE_JOURNAL, group_commit_ms=GROUP_COMMIT_WINDOW_MS))
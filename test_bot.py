@@ -6,10 +6,36 @@ This script tests core features without requiring a Telegram bot token
 """
 
 from storage import StorageManager
+from sqlite_storage import SQLiteStorageManager
 from ui import UIManager
 from handlers import BotHandlers
+from models import UserRecord, Routine, UserStats
+from reminders import ReminderEngine
+from overdue import OverdueSweeper
+from router import CallbackRouter, CallbackCodec, TOKEN_MARK, EPOCH_DIGITS
+from sender import MessageSender, TokenBucket
+import serialization
+from fileutils import atomic_write
+from backup import BackupService, recover_latest
+from backends import JsonFileBackend, JournaledBackend, GroupCommitBackend
+from cluster import Cluster, partition_for, split_database, split_partitions
+from import_export import import_rows, export_rows, read_rows, write_rows
+from timeutils import next_occurrence
+from constants import BENGALI_TEXT, EMOJIS, MODEL_CACHE_SIZE
+from datetime import datetime, date, timezone
+import pytz
+import asyncio
+from telegram import Update, User, Chat, Message, CallbackQuery
+from telegram.error import RetryAfter
+import functools
+import threading
+import time
 import json
+import gzip
+import sqlite3
 import os
+import tempfile
+import io
 
 def test_bot_functionality():
     """Test all major bot functionalities"""
@@ -164,9 +190,1322 @@ def test_bot_functionality():
     
     return True
 
+def test_sqlite_storage():
+    """Run the storage behaviours above against the SQLite engine"""
+    print("🗄️ Bengali Telegram Bot - SQLite Storage Test")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = SQLiteStorageManager(os.path.join(tmp_dir, 'bot_data.db'))
+        user_id = 12345
+        
+        user_data = storage.get_user_data(user_id)
+        assert user_data['profile']['reminder_interval'] == 15
+        
+        storage.add_routine(user_id, {'name': 'সকালের নাস্তা', 'time': '08:00', 'type': 'daily', 'reminder_intervals': [15, 30]})
+        storage.add_routine(user_id, {'name': 'সাপ্তাহিক বাজার', 'time': '10:00', 'type': 'weekly', 'days': ['saturday', 'tuesday']})
+        storage.add_task(user_id, {'name': 'ডাক্তারের সাথে অ্যাপয়েন্টমেন্ট', 'deadline': '2024-12-30 15:30'})
+        task_id = storage.add_task(user_id, {'name': 'বই পড়া'})
+        storage.complete_task(user_id, task_id)
+        print("   ✅ Routines and tasks created")
+        
+        routines = storage.get_user_routines(user_id)
+        assert [r['name'] for r in routines] == ['সকালের নাস্তা', 'সাপ্তাহিক বাজার']
+        assert routines[1]['days'] == ['saturday', 'tuesday']
+        assert len(storage.get_user_tasks(user_id)) == 2
+        assert len(storage.get_user_tasks(user_id, completed=False)) == 1
+        assert storage.get_user_tasks(user_id, completed=True)[0]['completed_at'] is not None
+        
+        stats = storage.get_user_stats(user_id)
+        assert (stats['total_routines'], stats['total_tasks'], stats['completed_tasks']) == (2, 2, 1)
+        assert stats['pending_tasks'] == 1 and stats['completion_rate'] == 50.0
+        print(f"   ✅ Stats: {stats['completion_rate']}% complete")
+        
+        storage.update_user_profile(user_id, {'name': 'সাগর মন্ডল', 'timezone': 'Asia/Dhaka'})
+        assert storage.get_user_data(user_id)['profile']['timezone'] == 'Asia/Dhaka'
+        
+        storage.update_routine(user_id, routines[0]['id'], {'active': False})
+        assert len(storage.get_user_routines(user_id)) == 1
+        assert len(storage.get_user_routines(user_id, active_only=False)) == 2
+        
+        storage.delete_task(user_id, task_id)
+        stats = storage.get_user_stats(user_id)
+        assert (stats['total_tasks'], stats['completed_tasks']) == (1, 0)
+        
+        exported = storage.export_data()
+        assert exported['users'][str(user_id)]['profile']['name'] == 'সাগর মন্ডল'
+        storage.close()
+        print("   ✅ Profile, routine update and task deletion verified")
+    
+    print("🎉 SQLite storage test completed successfully!")
+    return True
+
+def test_models_round_trip():
+    """Models convert back to exactly the stored records"""
+    print("🧩 Bengali Telegram Bot - Model Round-Trip Test")
+    print("=" * 50)
+    
+    with open('bot_data.json', 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    for user_id, user_data in data['users'].items():
+        user = UserRecord.from_dict(user_data)
+        assert user.to_dict() == user_data, user_id
+        for task in user.tasks:
+            assert task['name'] == task.name and task.get('missing', 'x') == 'x'
+    
+    # Unknown keys are kept, timestamps come back in their original form
+    record = {
+        'profile': {'name': 'সাগর', 'timezone': 'Asia/Dhaka', 'reminder_interval': 10,
+                    'created': '2024-01-01T08:00:00+00:00', 'language': 'bn'},
+        'routines': [{'id': 'routine_1', 'name': 'নাস্তা', 'time': '08:00', 'days': [], 'type': 'daily',
+                      'reminder_intervals': [15], 'active': True, 'created': 'yesterday', 'last_completed': None}],
+        'tasks': [],
+        'stats': {'total_routines': 1, 'total_tasks': 0, 'completed_tasks': 0,
+                  'last_activity': '2024-01-01T08:00:00.123456+00:00'},
+        'version': 2
+    }
+    user = UserRecord.from_dict(record)
+    assert user.profile.created.year == 2024 and user.profile.extra == {'language': 'bn'}
+    assert user.to_dict() == record
+    print(f"   ✅ {len(data['users'])} stored users round-trip unchanged")
+    
+    print("🎉 Model round-trip test completed successfully!")
+    return True
+
+def test_model_cache_bound():
+    """Only the most recently used users keep a materialized model"""
+    print("🧠 Bengali Telegram Bot - Model Cache Test")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = StorageManager(os.path.join(tmp_dir, 'bot_data.json'))
+        user_ids = range(1, MODEL_CACHE_SIZE + 6)
+        storage.bulk_add((user_id, 'task', {'name': f'কাজ {user_id}'}) for user_id in user_ids)
+        for user_id in user_ids:
+            storage.get_user_profile(user_id)
+        assert len(storage._models) == MODEL_CACHE_SIZE
+        assert '1' not in storage._models
+        
+        # An evicted user is rebuilt from the stored record and can still be written
+        assert [t['name'] for t in storage.get_user_tasks(1)] == ['কাজ 1']
+        storage.add_task(1, {'name': 'নতুন কাজ'})
+        assert len(storage.get_user_tasks(1)) == 2
+        assert len(storage._models) == MODEL_CACHE_SIZE
+        print(f"   ✅ {len(user_ids)} users touched, {len(storage._models)} models kept")
+    
+    print("🎉 Model cache test completed successfully!")
+    return True
+
+def test_change_events():
+    """Both storage engines publish the same change events"""
+    print("📣 Bengali Telegram Bot - Change Event Test")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for storage in (StorageManager(os.path.join(tmp_dir, 'bot_data.json')),
+                        SQLiteStorageManager(os.path.join(tmp_dir, 'bot_data.db'))):
+            events = []
+            storage.events.subscribe(events.append)
+            user_id = 12345
+            
+            storage.get_user_data(user_id)
+            routine_id = storage.add_routine(user_id, {'name': 'সকালের নাস্তা', 'time': '08:00'})
+            storage.update_routine(user_id, routine_id, {'time': '08:30'})
+            task_id = storage.add_task(user_id, {'name': 'বই পড়া'})
+            storage.complete_task(user_id, task_id)
+            storage.delete_task(user_id, task_id)
+            storage.delete_routine(user_id, 'missing')
+            storage.update_user_profile(user_id, {'timezone': 'Asia/Dhaka'})
+            
+            assert [(e.entity, e.action) for e in events] == [
+                ('user', 'created'), ('routine', 'created'), ('routine', 'updated'), ('task', 'created'),
+                ('task', 'updated'), ('task', 'deleted'), ('profile', 'updated')
+            ]
+            assert all(e.user_id == str(user_id) for e in events)
+            assert events[2].entity_id == routine_id and events[2].changed_fields() == ['time']
+            assert events[2].before['time'] == '08:00' and events[2].after['time'] == '08:30'
+            assert sorted(events[4].changed_fields()) == ['completed', 'completed_at', 'completed_ts']
+            assert events[5].before['completed'] is True and events[5].after is None
+            assert events[6].changed_fields() == ['timezone']
+            storage.close()
+            print(f"   ✅ {type(storage).__name__}: {len(events)} events")
+        
+        # With group commit, a save's events are published only once its batch is written
+        backend = GroupCommitBackend(JsonFileBackend(os.path.join(tmp_dir, 'grouped.json')), window_ms=60000)
+        storage = StorageManager(os.path.join(tmp_dir, 'grouped.json'), backend=backend)
+        events = []
+        storage.events.subscribe(events.append)
+        writer = threading.Thread(target=storage.add_task, args=(12345, {'name': 'বই পড়া'}))
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive() and events == []
+        backend.flush()
+        writer.join()
+        assert [(e.entity, e.action) for e in events] == [('user', 'created'), ('task', 'created')]
+        backend.close()
+        print(f"   ✅ GroupCommitBackend: {len(events)} events after the batch was written")
+    
+    print("🎉 Change event test completed successfully!")
+    return True
+
+def _user_record(name='', tasks=()):
+    """A stored user record for backend tests"""
+    return {
+        'profile': {'name': name, 'timezone': 'Asia/Dhaka', 'reminder_interval': 15,
+                    'created': '2024-01-01T00:00:00+00:00'},
+        'routines': [],
+        'tasks': [dict(task) for task in tasks],
+        'stats': {'total_routines': 0, 'total_tasks': len(tasks), 'completed_tasks': 0,
+                  'last_activity': '2024-01-01T00:00:00+00:00'}
+    }
+
+def test_journal_replay():
+    """Saves go to the journal, which survives a crash and is folded into the data file"""
+    print("📓 Bengali Telegram Bot - Journal Test")
+    print("=" * 50)
+    
+    task = {'id': 'task_1', 'name': 'বই পড়া', 'deadline': None, 'reminder_intervals': [15],
+            'completed': False, 'created': '2024-01-01T00:00:00+00:00', 'completed_at': None}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_file = os.path.join(tmp_dir, 'bot_data.json')
+        journal_file = os.path.join(tmp_dir, 'bot_data.journal')
+        
+        def open_journal():
+            return JournaledBackend(JsonFileBackend(data_file), journal_file,
+                                    compact_entries=1000, compact_interval=3600)
+        
+        journal = open_journal()
+        created = _user_record('সাগর')
+        journal.save_user('1', created, [('user', None, created)])
+        with_task = _user_record('সাগর', [task])
+        journal.save_user('1', with_task, [('tasks', 'task_1', task), ('stats', None, with_task['stats'])])
+        assert journal.load_user('1') == with_task
+        # Nothing reached the data file yet, every save is one journal line
+        assert JsonFileBackend(data_file).load_user('1') is None
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            assert len(f.readlines()) == 2
+        
+        # Crash mid-append: the journal ends in a torn line and is never closed
+        with open(journal_file, 'a', encoding='utf-8') as f:
+            f.write('{"u":"1","c":[["tasks","task_1",{"id":')
+        recovered = open_journal()
+        assert recovered.load_user('1') == with_task
+        renamed = _user_record('রাহুল', [task])
+        recovered.save_user('1', renamed, [('profile', None, renamed['profile'])])
+        assert open_journal().load_user('1') == renamed  # written after the torn line, still replayed
+        print("   ✅ Journal replayed after a crash, torn last line ignored")
+        
+        # Compaction folds the journal into the data file and truncates it
+        recovered.compact()
+        assert JsonFileBackend(data_file).load_user('1') == renamed
+        assert os.path.getsize(journal_file) == 0
+        
+        # close() folds what was journaled since
+        second = _user_record('নদী')
+        recovered.save_user('2', second, [('user', None, second)])
+        assert os.path.getsize(journal_file) > 0
+        recovered.close()
+        assert JsonFileBackend(data_file).load_user('2') == second
+        assert os.path.getsize(journal_file) == 0
+        print("   ✅ Journal compacted into the data file and flushed on close")
+    
+    print("🎉 Journal test completed successfully!")
+    return True
+
+class _FakeBackupStorage:
+    """Just the storage surface BackupService reads"""
+    
+    def __init__(self):
+        self.change_count = 0
+        self.users = {}
+    
+    def set_user(self, user_id, name):
+        self.users[user_id] = _user_record(name)
+        self.change_count += 1
+    
+    def export_data(self):
+        return {'users': json.loads(json.dumps(self.users)), 'metadata': {'version': '1.0'}}
+
+class _CountingBackend(JsonFileBackend):
+    """JsonFileBackend that records the size of every batch written to it"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+    
+    def save_batch(self, batch):
+        self.batches.append(len(batch))
+        super().save_batch(batch)
+
+def test_group_commit():
+    """Concurrent saves share one write and are durable once their callers return"""
+    print("📦 Bengali Telegram Bot - Group Commit Test")
+    print("=" * 50)
+    
+    writers = 8
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_file = os.path.join(tmp_dir, 'bot_data.json')
+        inner = _CountingBackend(data_file)
+        backend = GroupCommitBackend(inner, window_ms=5000, max_batch=writers)
+        
+        # The first save is visible straight away, but not written until the batch is
+        first = backend.save_user('0', _user_record('প্রথম'))
+        assert backend.load_user('0')['profile']['name'] == 'প্রথম'
+        assert inner.batches == [] and '0' not in inner.user_ids()
+        
+        start = threading.Barrier(writers - 1)
+        durable = {}
+        errors = []
+        def save(user_id):
+            try:
+                start.wait()
+                record = _user_record(f'ব্যবহারকারী {user_id}')
+                backend.save_user(user_id, record).result(timeout=10)
+                # Once the caller is back, a fresh reader finds the record on disk
+                durable[user_id] = JsonFileBackend(data_file).load_user(user_id) == record
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=save, args=(str(i),)) for i in range(1, writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        
+        assert errors == []
+        assert first.done()
+        # A full batch doesn't wait out the window
+        assert inner.batches == [writers] and elapsed < 5
+        assert len(durable) == writers - 1 and all(durable.values())
+        print(f"   ✅ {writers} concurrent saves merged into {len(inner.batches)} write")
+        
+        # close() writes what is still queued
+        backend.save_user('9', _user_record('শেষ'))
+        backend.close()
+        assert inner.batches == [writers, 1]
+        assert JsonFileBackend(data_file).load_user('9')['profile']['name'] == 'শেষ'
+        print("   ✅ Queued save flushed on close")
+    
+    print("🎉 Group commit test completed successfully!")
+    return True
+
+def test_backup_service():
+    """Full snapshots, gzip deltas, retention, restore and the legacy fallback"""
+    print("🗄️ Bengali Telegram Bot - Backup Service Test")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        backup_dir = os.path.join(tmp_dir, 'backups')
+        storage = _FakeBackupStorage()
+        service = BackupService(storage, backup_dir, change_threshold=2, full_every=3, keep_full=2)
+        assert service.is_due()
+        
+        storage.set_user('1', 'সাগর')
+        storage.set_user('2', 'রাহুল')
+        first = service.backup()
+        assert first.startswith('full_') and not service.is_due()
+        
+        # Only the changed user goes into the delta, removed users are listed
+        storage.set_user('1', 'নদী')
+        del storage.users['2']
+        storage.set_user('3', 'আকাশ')
+        assert service.is_due()
+        delta = service.backup()
+        assert delta.startswith('delta_') and delta.endswith('.json.gz')
+        with gzip.open(os.path.join(backup_dir, delta), 'rt', encoding='utf-8') as f:
+            stored = json.load(f)
+        assert stored['base'] == first
+        assert sorted(stored['users']) == ['1', '3'] and stored['deleted'] == ['2']
+        print("   ✅ Full snapshot first, then a gzip delta of the changed users")
+        
+        # restore() rebuilds the newest state from the snapshot plus its delta
+        assert service.restore() == storage.export_data()
+        assert sorted(service.restore(first)['users']) == ['1', '2']
+        print("   ✅ Restore rebuilds state from full plus delta")
+        
+        # Every third backup is a full one; keep_full=2 then drops the first snapshot and its delta
+        second_delta = service.backup()
+        assert second_delta.startswith('delta_')
+        second = service.backup()
+        assert second.startswith('full_')
+        third = service.backup(full=True)
+        names = [b['name'] for b in service.list_backups()]
+        assert names == [second, third]
+        for gone in (first, delta, second_delta):
+            assert not os.path.exists(os.path.join(backup_dir, gone))
+        assert service.restore() == storage.export_data()
+        print("   ✅ Retention removes an expired snapshot together with its deltas")
+        
+        # Without an index, recovery falls back to the newest legacy JSON backup
+        legacy_dir = os.path.join(tmp_dir, 'legacy')
+        os.makedirs(legacy_dir)
+        assert recover_latest(legacy_dir) is None
+        for name, user in (('manual_backup_20240101_120000.json', 'পুরনো'),
+                           ('bot_data_backup_20240102_120000.json', 'নতুন'),
+                           ('manual_backup_20240103_120000.json', None)):
+            with open(os.path.join(legacy_dir, name), 'w', encoding='utf-8') as f:
+                f.write('{"users": {' if user is None else
+                        json.dumps({'users': {'1': _user_record(user)}, 'metadata': {}}, ensure_ascii=False))
+        recovered = recover_latest(legacy_dir)
+        assert recovered['users']['1']['profile']['name'] == 'নতুন'
+        assert recover_latest(backup_dir) == storage.export_data()
+        print("   ✅ Recovery falls back to legacy manual backups, skipping unreadable ones")
+    
+    print("🎉 Backup service test completed successfully!")
+    return True
+
+def test_corrupt_data_recovery():
+    """A corrupt data file is set aside and the newest backup restored, or an empty database"""
+    print("🩹 Bengali Telegram Bot - Corrupt Data Recovery Test")
+    print("=" * 50)
+    
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Recovery reads the default backups directory, relative to the working directory
+        os.chdir(tmp_dir)
+        try:
+            JsonFileBackend('bot_data.json').save_user('1', _user_record('সাগর'))
+            with open('bot_data.json', 'rb') as f:
+                intact = f.read()
+            
+            # A failed write leaves the old file in place and no temporary file behind
+            try:
+                atomic_write('bot_data.json', None)
+                assert False, "atomic_write accepted a non-bytes payload"
+            except TypeError:
+                pass
+            with open('bot_data.json', 'rb') as f:
+                assert f.read() == intact
+            assert sorted(os.listdir('.')) == ['bot_data.json', 'bot_data.json.idx']
+            print("   ✅ Failed atomic write keeps the previous file")
+            
+            os.makedirs('backups')
+            for name, user in (('manual_backup_20240101_120000.json', 'পুরনো'),
+                               ('manual_backup_20240102_120000.json', 'নতুন')):
+                with open(os.path.join('backups', name), 'w', encoding='utf-8') as f:
+                    json.dump({'users': {'1': _user_record(user)}, 'metadata': {}}, f, ensure_ascii=False)
+            
+            # Simulate a data file truncated by an older, non-atomic writer
+            with open('bot_data.json', 'wb') as f:
+                f.write(intact[:len(intact) // 2])
+            backend = JsonFileBackend('bot_data.json')
+            assert backend.load_user('1')['profile']['name'] == 'নতুন'
+            corrupt = [name for name in os.listdir('.') if name.startswith('bot_data.json.corrupt-')]
+            assert len(corrupt) == 1
+            with open(corrupt[0], 'rb') as f:
+                assert f.read() == intact[:len(intact) // 2]
+            assert JsonFileBackend('bot_data.json').load_user('1')['profile']['name'] == 'নতুন'
+            print("   ✅ Corrupt file moved aside and the newest backup restored")
+            
+            # With no backup to fall back on, startup continues with an empty database
+            for name in os.listdir('backups'):
+                os.remove(os.path.join('backups', name))
+            with open('bot_data.json', 'w', encoding='utf-8') as f:
+                f.write('{"users": {"1": ')
+            storage = StorageManager('bot_data.json')
+            assert storage.user_ids() == []
+            assert storage.export_data()['users'] == {}
+            storage.close()
+            print("   ✅ No backup available: started with empty data")
+        finally:
+            os.chdir(cwd)
+    
+    print("🎉 Corrupt data recovery test completed successfully!")
+    return True
+
+def test_serialization_formats():
+    """Every on-disk format round-trips, and index offsets slice out each user's record"""
+    print("💾 Bengali Telegram Bot - Serialization Test")
+    print("=" * 50)
+    
+    data = {
+        'users': {
+            '1': _user_record('সাগর'),
+            '2': _user_record('রাহুল "রনি"\\ ✅'),
+            '3': _user_record()
+        },
+        'metadata': {'version': '1.0', 'created': '2024-01-01T00:00:00+00:00', 'last_backup': None}
+    }
+    
+    for fmt in ('json-pretty', 'json'):
+        encoded = serialization.dumps(data, fmt)
+        assert serialization.loads(encoded) == data
+        indexed, offsets = serialization.dumps_indexed(data, fmt)
+        assert indexed == encoded
+        assert sorted(offsets) == sorted(data['users'])
+        for user_id, (offset, length) in offsets.items():
+            assert json.loads(indexed[offset:offset + length].decode('utf-8')) == data['users'][user_id]
+    assert serialization.dumps_indexed({'users': {}, 'metadata': {}}, 'json')[0] == b'{"users":{},"metadata":{}}'
+    print("   ✅ JSON formats round-trip and offsets slice back to each user")
+    
+    # msgpack when it is installed, and the marshal fallback either way
+    codecs = [serialization.CODEC_MARSHAL]
+    if serialization.msgpack is not None:
+        codecs.append(serialization.CODEC_MSGPACK)
+    installed = serialization.msgpack
+    try:
+        for codec in codecs:
+            serialization.msgpack = installed if codec == serialization.CODEC_MSGPACK else None
+            encoded = serialization.dumps(data, 'binary')
+            assert encoded.startswith(serialization.MAGIC + codec)
+            assert serialization.loads(encoded) == data
+            assert serialization.dumps_indexed(data, 'binary') == (encoded, None)
+        # A msgpack file can't be read without msgpack, and says so
+        serialization.msgpack = None
+        try:
+            serialization.loads(serialization.MAGIC + serialization.CODEC_MSGPACK + b'\x80')
+            assert False, "msgpack payload decoded without msgpack"
+        except serialization.DecodeError:
+            pass
+    finally:
+        serialization.msgpack = installed
+    print(f"   ✅ Binary round-trips with {len(codecs)} codec(s)")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'bot_data.json')
+        serialization.save_file(path, data, 'json-pretty')
+        for fmt in ('binary', 'json', 'json-pretty'):
+            size = serialization.convert_file(path, fmt)
+            assert os.path.getsize(path) == size
+            assert serialization.load_file(path) == data
+        with open(path, 'rb') as f:
+            assert f.read() == serialization.dumps(data, 'json-pretty')
+    print("   ✅ convert_file round-trips between formats")
+    
+    print("🎉 Serialization test completed successfully!")
+    return True
+
+def test_reminder_engine():
+    """Reminders come off the heap in time order, and rescheduling drops the old ones"""
+    print("⏰ Bengali Telegram Bot - Reminder Engine Test")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = StorageManager(os.path.join(tmp_dir, 'bot_data.json'))
+        user_id = 12345
+        storage.update_user_profile(user_id, {'timezone': 'Asia/Dhaka'})
+        storage.add_routine(user_id, {'name': 'সকালের নাস্তা', 'time': '08:00', 'type': 'daily', 'reminder_intervals': [15, 30]})
+        storage.add_routine(user_id, {'name': 'সাপ্তাহিক বাজার', 'time': '10:00', 'type': 'weekly', 'days': ['saturday'], 'reminder_intervals': [60]})
+        storage.add_task(user_id, {'name': 'ডাক্তারের সাথে অ্যাপয়েন্টমেন্ট', 'deadline': '2030-01-01 15:30', 'reminder_intervals': [15]})
+        
+        engine = ReminderEngine(storage)
+        now = datetime(2029, 12, 31, 1, 0, tzinfo=pytz.utc)  # Monday 07:00 in Dhaka
+        engine.schedule_user(user_id, now=now.timestamp())
+        assert len(engine) == 4
+        
+        due = engine.pop_due(now.timestamp() + 2 * 3600)
+        assert [(entry[5]['name'], entry[6]) for entry in due] == [('সকালের নাস্তা', 30), ('সকালের নাস্তা', 15)]
+        # Both daily reminders were re-queued for the next morning
+        assert len(engine) == 4
+        print(f"   ✅ Due reminders: {ReminderEngine.format_reminder(*due[0][4:7])}")
+        
+        engine.schedule_user(user_id, now=now.timestamp())
+        assert len(engine.pop_due(now.timestamp() + 2 * 3600)) == 2
+        engine.unschedule_user(user_id)
+        assert engine.pop_due(now.timestamp() + 30 * 86400) == []
+        print("   ✅ Rescheduled and cancelled reminders are skipped")
+        
+        # Changes made while schedule_all is scanning are neither lost nor overwritten
+        engine = ReminderEngine(storage)
+        breakfast = storage.get_user_routines(user_id)[0].id
+        visit_user = storage._visit_user
+        def visit_then_change(user_id_str, visit):
+            visited = visit_user(user_id_str, visit)
+            storage.delete_routine(user_id, breakfast)
+            storage.add_task(user_id, {'name': 'ওষুধ কেনা', 'deadline': '2030-01-01 09:00', 'reminder_intervals': [15]})
+            return visited
+        storage._visit_user = visit_then_change
+        engine.schedule_all(now=now.timestamp())
+        storage._visit_user = visit_user
+        due = engine.pop_due(now.timestamp() + 2 * 86400)
+        assert [entry[5]['name'] for entry in due] == ['ওষুধ কেনা', 'ডাক্তারের সাথে অ্যাপয়েন্টমেন্ট']
+        storage.close()
+        print("   ✅ Changes during the startup scan are kept")
+    
+    # 02:30 doesn't exist in New York on 2026-03-08; it runs at 03:30 EDT instead
+    new_york = pytz.timezone('America/New_York')
+    after = new_york.localize(datetime(2026, 3, 8, 0, 0)).timestamp()
+    occurrence = datetime.fromtimestamp(next_occurrence('02:30', 'daily', [], 'America/New_York', after), new_york)
+    assert (occurrence.hour, occurrence.minute, occurrence.utcoffset().total_seconds()) == (3, 30, -4 * 3600)
+    print("   ✅ DST gap handled")
+    
+    print("🎉 Reminder engine test completed successfully!")
+    return True
+
+def test_message_sender():
+    """Outbound messages respect the per-chat rate and are retried after a flood wait"""
+    print("📤 Bengali Telegram Bot - Message Sender Test")
+    print("=" * 50)
+    
+    bucket = TokenBucket(rate=2)
+    assert [bucket.reserve(10.0) for _ in range(3)] == [10.0, 10.5, 11.0]
+    
+    class FakeBot:
+        def __init__(self):
+            self.sent = []
+            self.flooded = False
+        
+        async def send_message(self, chat_id, text, **kwargs):
+            if not self.flooded:
+                self.flooded = True
+                raise RetryAfter(0)
+            self.sent.append((chat_id, text, asyncio.get_running_loop().time()))
+            return text
+    
+    async def run():
+        bot = FakeBot()
+        sender = MessageSender(bot, workers=4, global_rate=1000, per_chat_rate=20)
+        await sender.start()
+        futures = [sender.submit(1, f"a{i}") for i in range(3)] + [sender.submit(2, "b0")]
+        results = await asyncio.gather(*futures)
+        await sender.join()
+        await sender.stop()
+        return bot, sender, results
+    
+    bot, sender, results = asyncio.run(run())
+    assert results == ["a0", "a1", "a2", "b0"]
+    assert sender.sent == 4 and sender.retried == 1 and sender.failed == 0
+    chat_times = [sent_at for chat_id, _, sent_at in bot.sent if chat_id == 1]
+    gaps = [later - earlier for earlier, later in zip(chat_times, chat_times[1:])]
+    assert len(chat_times) == 3 and all(gap >= 0.045 for gap in gaps)
+    print(f"   ✅ {sender.sent} messages sent, {sender.retried} retried, per-chat gaps {[round(g, 3) for g in gaps]}")
+    
+    print("🎉 Message sender test completed successfully!")
+    return True
+
+def test_bulk_import_export():
+    """Bulk import validates rows and writes once; export streams the same rows back"""
+    print("📥 Bengali Telegram Bot - Bulk Import/Export Test")
+    print("=" * 50)
+    
+    rows = (
+        "user_id,kind,name,time,type,days,deadline,reminder_intervals\n"
+        "1001,routine,সকালের নাস্তা,08:00,daily,,,15;30\n"
+        "1001,routine,সাপ্তাহিক বাজার,10:00,weekly,saturday,,60\n"
+        "1002,task,ডাক্তারের সাথে অ্যাপয়েন্টমেন্ট,,,,2030-01-01 15:30,15\n"
+        "1003,routine,ভুল সময়,25:00,daily,,,\n"
+        "1003,task,ভুল তারিখ,,,,কাল,\n"
+    )
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for storage in (StorageManager(os.path.join(tmp_dir, 'bot_data.json')),
+                        SQLiteStorageManager(os.path.join(tmp_dir, 'bot_data.db'))):
+            events = []
+            storage.events.subscribe(events.append)
+            imported, errors = import_rows(storage, read_rows(io.StringIO(rows), 'csv'))
+            assert imported == 3
+            assert [error.split(':')[0] for error in errors] == ['line 5', 'line 6']
+            assert [r.days for r in storage.get_user_routines(1001)] == [[], ['saturday']]
+            assert storage.get_user_stats(1001).total_routines == 2
+            assert storage.get_user_tasks(1002)[0].deadline == '2030-01-01 15:30'
+            assert sorted(e.entity for e in events if e.action == 'created') == [
+                'routine', 'routine', 'task', 'user', 'user']
+            
+            exported = io.StringIO()
+            assert write_rows(exported, export_rows(storage), 'jsonl') == 3
+            again, errors = import_rows(storage, read_rows(io.StringIO(exported.getvalue()), 'jsonl'))
+            assert again == 3 and errors == []
+            assert len(storage.get_user_routines(1001)) == 4
+            storage.close()
+            print(f"   ✅ {type(storage).__name__}: {imported} imported, {len(errors)} rejected, export re-imported")
+    
+    print("🎉 Bulk import/export test completed successfully!")
+    return True
+
+def test_lazy_startup():
+    """A lazy backend serves users from the offset index before the whole file is parsed"""
+    print("🚀 Bengali Telegram Bot - Lazy Startup Test")
+    print("=" * 50)
+    
+    with open('bot_data.json', 'r', encoding='utf-8') as f:
+        sample = json.load(f)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_file = os.path.join(tmp_dir, 'bot_data.json')
+        JsonFileBackend(data_file).save_users(sample['users'])
+        assert os.path.exists(data_file + '.idx')
+        
+        backend = JsonFileBackend(data_file, lazy=True)
+        user_id = next(iter(sample['users']))
+        # Callers hold the backend lock, as StorageManager does, or the warm-up can install
+        # the document between the index lookup and caching the decoded record
+        with backend.lock:
+            record = backend.load_user(user_id)
+            assert record == sample['users'][user_id]
+            assert backend.load_user('0') is None
+            assert sorted(backend.user_ids()) == sorted(sample['users'])
+        
+        # Records handed out before the warm-up finished stay the resident ones
+        backend._warmer.join()
+        assert backend._data is not None and backend.load_user(user_id) is record
+        print(f"   ✅ {len(sample['users'])} users served through the index, then warmed")
+        
+        # An index that no longer matches the data file is ignored
+        JsonFileBackend(data_file).save_users({'42': sample['users'][user_id]})
+        with open(data_file + '.idx', 'w', encoding='utf-8') as f:
+            f.write('{"signature": [0, 0, 0], "users": {}, "rest": {}}')
+        backend = JsonFileBackend(data_file, lazy=True)
+        assert backend.load_user('42') == sample['users'][user_id]
+        backend._warmer.join()
+        print("   ✅ Stale index falls back to a full load")
+        
+        # The startup scans read through the index too, so a first request made while they
+        # run neither waits for nor triggers a full parse of the document
+        items = []
+        for user_id in range(1, 2001):
+            items.append((user_id, 'routine', {'name': 'সকালের নাস্তা', 'time': '08:00'}))
+            items.append((user_id, 'task', {'name': 'বিল পরিশোধ', 'deadline': '2030-01-01 09:00'}))
+        StorageManager(data_file).bulk_add(items)
+        backend = JsonFileBackend(data_file, lazy=True)
+        storage = StorageManager(data_file, backend=backend)
+        full_loads = []
+        load_data = backend._load_data
+        def counting_load():
+            if backend._data is None:
+                full_loads.append(threading.current_thread().name)
+            return load_data()
+        backend._load_data = counting_load
+        
+        engine, sweeper = ReminderEngine(storage), OverdueSweeper(storage)
+        scans = [threading.Thread(target=engine.schedule_all), threading.Thread(target=sweeper.build)]
+        for scan in scans:
+            scan.start()
+        started = time.perf_counter()
+        assert storage.get_user_profile(1500).timezone
+        first_read = time.perf_counter() - started
+        for scan in scans:
+            scan.join()
+        backend._warmer.join()
+        assert full_loads == [] and first_read < 0.5
+        assert len(engine) >= 4000 and len(sweeper) >= 2000
+        print(f"   ✅ First read took {first_read * 1000:.1f} ms during the startup scans")
+    
+    print("🎉 Lazy startup test completed successfully!")
+    return True
+
+def _collect_updates(results, index, partitions, updates):
+    """Cluster worker for the test: report which user ids reached which partition"""
+    while True:
+        update_data = updates.get()
+        if update_data is None:
+            break
+        update = Update.de_json(update_data, None)
+        results.put((index, update.effective_user.id))
+
+def test_cluster_routing():
+    """Updates from a fake source reach the worker process that owns their user"""
+    print("🧩 Bengali Telegram Bot - Cluster Routing Test")
+    print("=" * 50)
+    
+    user_ids = [12345, 67890, 11111, 22222, 33333]
+    chat = Chat(1, 'private')
+    updates = []
+    for update_id, user_id in enumerate(user_ids * 2):
+        user = User(user_id, 'টেস্ট', False)
+        if update_id % 2:
+            update = Update(update_id, callback_query=CallbackQuery(str(update_id), user, 'chat', data='main_menu'))
+        else:
+            update = Update(update_id, message=Message(update_id, datetime.now(), chat, from_user=user, text='/start'))
+        updates.append(update.to_dict())
+    
+    async def fake_source():
+        for update_data in updates:
+            yield update_data
+    
+    cluster = Cluster(partitions=2)
+    results = cluster.context.Queue()
+    cluster.worker = functools.partial(_collect_updates, results)
+    cluster.start()
+    assert asyncio.run(cluster.router.feed(fake_source())) == len(updates)
+    cluster.stop()
+    
+    received = [results.get(timeout=10) for _ in updates]
+    assert sorted(user_id for _, user_id in received) == sorted(user_ids * 2)
+    assert all(index == partition_for(user_id, 2) for index, user_id in received)
+    print(f"   ✅ {len(received)} updates routed, per partition: {cluster.router.routed}")
+    
+    with open('bot_data.json', 'r', encoding='utf-8') as f:
+        sample = json.load(f)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        counts = split_database(sample, 3, 'json', root=tmp_dir)
+        assert sum(counts) == len(sample['users']) and split_partitions(tmp_dir) == 3
+        for index in range(3):
+            storage = StorageManager(os.path.join(tmp_dir, f'partition-{index}', 'bot_data.json'))
+            assert all(partition_for(int(user_id), 3) == index for user_id in storage.user_ids())
+            storage.close()
+        print(f"   ✅ Database split into partitions: {counts}")
+    
+    print("🎉 Cluster routing test completed successfully!")
+    return True
+
+def test_routine_streaks():
+    """Routine completions keep streaks and adherence up to date incrementally"""
+    print("🔥 Bengali Telegram Bot - Routine Streak Test")
+    print("=" * 50)
+    
+    day = date(2024, 1, 1).toordinal()  # a Monday
+    created = datetime(2024, 1, 1, 6, tzinfo=timezone.utc)
+    
+    # Daily routine: three days in a row, a repeat, a missed day, then a new streak
+    routine = Routine(id='routine_1', name='ব্যায়াম', time='06:00', created=created)
+    assert routine.complete(day) and routine.complete(day + 1) and routine.complete(day + 2)
+    assert not routine.complete(day + 2) and routine.streak == 3
+    assert routine.current_streak(day + 3) == 3 and routine.current_streak(day + 4) == 0
+    assert routine.complete(day + 4) and routine.streak == 1 and routine.best_streak == 3
+    assert routine.history == 0b11101 and routine.completions == 4
+    assert routine.adherence(day + 4, 7) == (4, 5) and routine.adherence(day + 5, 7) == (4, 5)
+    assert routine.adherence(day + 40, 30) == (0, 29)
+    
+    # Weekly routine: only the chosen days count towards the streak
+    weekly = Routine(id='routine_2', name='সাঁতার', time='07:00', type='weekly', days=['monday', 'wednesday'],
+                     created=created)
+    weekly.complete(day)
+    weekly.complete(day + 2)
+    weekly.complete(day + 7)
+    assert weekly.streak == 3 and weekly.current_streak(day + 9) == 3
+    assert weekly.complete(day + 14) and weekly.streak == 1
+    assert weekly.adherence(day + 14, 30) == (4, 5)
+    
+    # Records without completions round-trip without the new fields
+    assert 'streak' not in Routine(id='routine_3').to_dict()
+    assert Routine.from_dict(routine.to_dict()) == routine
+    
+    stats = UserStats().with_derived(0, [routine, weekly], 'UTC', datetime(2024, 1, 15, 12, tzinfo=timezone.utc).timestamp())
+    assert stats.routine_completions == 8 and stats.best_streak == 3 and stats.current_streak == 1
+    assert 'routine_completions' not in stats.to_dict()
+    print(f"   ✅ Streaks and adherence: 7 days {stats.adherence_7}%, 30 days {stats.adherence_30}%")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for storage in (StorageManager(os.path.join(tmp_dir, 'bot_data.json')),
+                        SQLiteStorageManager(os.path.join(tmp_dir, 'bot_data.db'))):
+            events = []
+            storage.events.subscribe(events.append)
+            user_id = 12345
+            storage.update_user_profile(user_id, {'timezone': 'Asia/Dhaka'})
+            routine_id = storage.add_routine(user_id, {'name': 'নামাজ', 'time': '05:00'})
+            
+            # 20:00 UTC is already the next day in Dhaka (UTC+6)
+            first = storage.complete_routine(user_id, routine_id, datetime(2024, 1, 1, 12, tzinfo=timezone.utc))
+            assert first.streak == 1
+            assert storage.complete_routine(user_id, routine_id, datetime(2024, 1, 1, 17, 59, tzinfo=timezone.utc)) is None
+            second = storage.complete_routine(user_id, routine_id, datetime(2024, 1, 1, 20, tzinfo=timezone.utc))
+            assert second.streak == 2 and second.history_day == day + 1
+            assert storage.complete_routine(user_id, 'missing') is None
+            
+            stored = storage.get_user_routines(user_id)[0]
+            assert stored.completions == 2 and stored.history == 0b11 and stored.last_completed.hour == 20
+            assert events[-1].entity == 'routine' and 'streak' in events[-1].changed_fields()
+            assert storage.get_user_stats(user_id).routine_completions == 2
+            storage.close()
+            print(f"   ✅ {type(storage).__name__} records completions in the user's timezone")
+    
+    print("🎉 Routine streak test completed successfully!")
+    return True
+
+def test_task_timestamps():
+    """Task deadlines and timestamps are kept as epoch seconds, backfilled for old records"""
+    print("🕒 Bengali Telegram Bot - Task Timestamp Test")
+    print("=" * 50)
+    
+    legacy = {'users': {'777': {
+        'profile': {'name': '', 'timezone': 'Asia/Dhaka', 'reminder_interval': 15,
+                    'created': '2024-01-01T00:00:00+00:00'},
+        'routines': [],
+        'tasks': [
+            {'id': 'task_1', 'name': 'পরে', 'deadline': '2024-03-02 10:00', 'reminder_intervals': [15],
+             'completed': False, 'created': '2024-01-01T00:00:00+00:00', 'completed_at': None},
+            {'id': 'task_2', 'name': 'আগে', 'deadline': '2024-03-01 10:00', 'reminder_intervals': [15],
+             'completed': False, 'created': '2024-01-01T00:00:00+00:00', 'completed_at': None},
+            {'id': 'task_3', 'name': 'সময়হীন', 'deadline': None, 'reminder_intervals': [15],
+             'completed': False, 'created': '2024-01-01T00:00:00+00:00', 'completed_at': None}
+        ],
+        'stats': {'total_routines': 0, 'total_tasks': 3, 'completed_tasks': 0, 'last_activity': None}
+    }}, 'metadata': {'version': '1.0'}}
+    dhaka_deadline = int(datetime(2024, 3, 1, 4, tzinfo=timezone.utc).timestamp())  # 10:00 at UTC+6
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_file = os.path.join(tmp_dir, 'bot_data.json')
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(legacy, f)
+        
+        sqlite_storage = SQLiteStorageManager(os.path.join(tmp_dir, 'bot_data.db'))
+        sqlite_storage.import_data(legacy)
+        # Forget the epoch columns, as in a database written before they existed
+        sqlite_storage.conn.execute("UPDATE tasks SET deadline_ts = NULL, created_ts = NULL")
+        sqlite_storage.close()
+        
+        # Reading alone fills the fields in memory but doesn't rewrite the file
+        storage = StorageManager(json_file)
+        assert storage.get_user_tasks(777)[1].deadline_ts == dhaka_deadline
+        storage.close()
+        with open(json_file, 'r', encoding='utf-8') as f:
+            assert json.load(f) == legacy
+        
+        for storage in (StorageManager(json_file), SQLiteStorageManager(os.path.join(tmp_dir, 'bot_data.db'))):
+            tasks = storage.get_user_tasks(777, by_deadline=True)
+            assert [t.id for t in tasks] == ['task_2', 'task_1', 'task_3']
+            assert tasks[0].deadline_ts == dhaka_deadline and tasks[0].deadline == '2024-03-01 10:00'
+            assert tasks[0].created_ts == int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+            
+            overdue = storage.get_overdue_tasks(777, now=dhaka_deadline + 60)
+            assert [t.id for t in overdue] == ['task_2']
+            storage.complete_task(777, 'task_2')
+            assert [t.id for t in storage.get_overdue_tasks(777, now=dhaka_deadline + 86400)] == ['task_1']
+            assert storage.get_user_tasks(777, completed=True)[0].completed_ts is not None
+            
+            # The same wall-clock deadline is a different instant in another timezone
+            storage.update_user_profile(777, {'timezone': 'UTC'})
+            assert storage.get_user_tasks(777, by_deadline=True)[0].deadline_ts == dhaka_deadline + 6 * 3600
+            storage.close()
+            print(f"   ✅ {type(storage).__name__} backfilled and sorted tasks by epoch deadline")
+        
+        # The JSON backfill was written back, so the stored records carry the epoch fields
+        with open(json_file, 'r', encoding='utf-8') as f:
+            stored = json.load(f)['users']['777']['tasks']
+        assert all('created_ts' in task for task in stored) and 'deadline_ts' not in stored[2]
+    
+    print("🎉 Task timestamp test completed successfully!")
+    return True
+
+def test_overdue_sweep():
+    """Overdue tasks are found through the deadline index and announced once"""
+    print("⚠️ Bengali Telegram Bot - Overdue Sweep Test")
+    print("=" * 50)
+    
+    class FakeSender:
+        def __init__(self, error=None):
+            self.error = error
+        
+        def submit(self, chat_id, text):
+            future = asyncio.get_running_loop().create_future()
+            if self.error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(self.error)
+            return future
+    
+    async def deliver(sweeper, notices, error=None):
+        # asyncio.run waits for the executor, so the tasks are marked once it returns
+        sweeper.sender = FakeSender(error)
+        for user_id_str, task in notices:
+            sweeper._send(user_id_str, task)
+        await asyncio.sleep(0)
+    
+    now = datetime(2030, 1, 2, tzinfo=timezone.utc).timestamp()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for storage in (StorageManager(os.path.join(tmp_dir, 'bot_data.json')),
+                        SQLiteStorageManager(os.path.join(tmp_dir, 'bot_data.db'))):
+            user_id = 12345
+            storage.update_user_profile(user_id, {'timezone': 'UTC'})
+            indexed = storage.add_task(user_id, {'name': 'বিল পরিশোধ', 'deadline': '2030-01-01 09:00'})
+            
+            sweeper = OverdueSweeper(storage)
+            sweeper.build()
+            # Changes after the build reach the index through the change events
+            storage.add_task(user_id, {'name': 'চিঠি পাঠানো', 'deadline': '2030-01-01 10:00'})
+            completed = storage.add_task(user_id, {'name': 'ফোন করা', 'deadline': '2030-01-01 08:00'})
+            deleted = storage.add_task(user_id, {'name': 'বাজার', 'deadline': '2030-01-01 07:00'})
+            moved = storage.add_task(user_id, {'name': 'রিপোর্ট', 'deadline': '2030-01-01 06:00'})
+            future = storage.add_task(user_id, {'name': 'ভবিষ্যৎ', 'deadline': '2030-06-01 10:00'})
+            storage.add_task(user_id, {'name': 'সময়হীন'})
+            storage.complete_task(user_id, completed)
+            storage.delete_task(user_id, deleted)
+            storage.update_task(user_id, moved, {'deadline': '2030-03-01 06:00'})
+            assert len(sweeper) == 4
+            
+            notices = sweeper.sweep(now)
+            assert [task.name for _, task in notices] == ['বিল পরিশোধ', 'চিঠি পাঠানো']
+            assert sweeper.sweep(now) == [] and len(sweeper) == 2
+            print(f"   ✅ {OverdueSweeper.format_notice(notices[0][1]).splitlines()[0]}")
+            
+            # Tasks are marked as announced only once their notice was delivered
+            assert not any(task.overdue_notified for task in storage.get_user_tasks(user_id))
+            asyncio.run(deliver(sweeper, notices[:1], RuntimeError('blocked')))
+            asyncio.run(deliver(sweeper, notices[1:]))
+            assert [task.overdue_notified for task in storage.get_user_tasks(user_id)[:2]] == [False, True]
+            
+            # A rebuilt index (e.g. after a restart) announces only the undelivered one again
+            rebuilt = OverdueSweeper(storage)
+            rebuilt.build()
+            retried = rebuilt.sweep(now)
+            assert [task.id for _, task in retried] == [indexed] and rebuilt.sweep(now) == []
+            asyncio.run(deliver(rebuilt, retried))
+            assert storage.get_user_tasks(user_id)[0].overdue_notified
+            
+            # Moving the deadline of an announced task makes it eligible once more
+            storage.update_task(user_id, indexed, {'deadline': '2030-01-01 23:00'})
+            assert [task.id for _, task in rebuilt.sweep(now)] == [indexed]
+            
+            # Changes made while build is scanning are neither lost nor overwritten
+            scanned = OverdueSweeper(storage)
+            visit_user = storage._visit_user
+            def visit_then_change(user_id_str, visit):
+                visited = visit_user(user_id_str, visit)
+                storage.update_task(user_id, moved, {'deadline': '2030-01-01 06:00'})
+                storage.update_task(user_id, future, {'deadline': '2030-01-01 11:00'})
+                return visited
+            storage._visit_user = visit_then_change
+            scanned.build()
+            storage._visit_user = visit_user
+            assert [task.name for _, task in scanned.sweep(now)] == ['রিপোর্ট', 'ভবিষ্যৎ', 'বিল পরিশোধ']
+            storage.close()
+            print(f"   ✅ {type(storage).__name__}: each overdue task announced once")
+    
+    print("🎉 Overdue sweep test completed successfully!")
+    return True
+
+class _FakeQuery:
+    """Stand-in for the CallbackQuery of a pressed inline button, recording the edits it gets"""
+    def __init__(self, data):
+        self.data = data
+        self.from_user = User(id=12345, first_name='Test', is_bot=False)
+        self.edits = []
+    
+    async def answer(self):
+        pass
+    
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append((text, kwargs.get('reply_markup')))
+
+async def _press(handlers, data):
+    """Press a button carrying `data`, return the (text, markup) of the last edit or None"""
+    query = _FakeQuery(data)
+    await handlers.button_callback(Update(1, callback_query=query), None)
+    return query.edits[-1] if query.edits else None
+
+def test_callback_router():
+    """Callback data is routed by exact match or longest prefix, with per-route counters"""
+    print("🧭 Bengali Telegram Bot - Callback Router Test")
+    print("=" * 50)
+    
+    calls = []
+    
+    async def record(query, item_id=None):
+        calls.append((query, item_id))
+    
+    router = CallbackRouter()
+    router.exact('delete_task', record)
+    router.prefix('delete_task_', functools.partial(record, 'short'), 'item_id')
+    router.prefix('delete_task_confirm_', functools.partial(record, 'long'), 'item_id')
+    
+    async def dispatch_all():
+        assert await router.dispatch('delete_task', query='exact')
+        assert await router.dispatch('delete_task_7', query='unused')
+        assert await router.dispatch('delete_task_confirm_7')
+        assert not await router.dispatch('unknown_7')
+    asyncio.run(dispatch_all())
+    assert calls == [('exact', None), ('short', '7'), ('long', '7')]
+    assert [r.stats.calls for r in router.routes] == [1, 1, 1] and router.unmatched == 1
+    print(f"   ✅ {router.summary()}")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = StorageManager(os.path.join(tmp_dir, 'bot_data.json'))
+        handlers = BotHandlers(storage)
+        routine_id = storage.add_routine(12345, {'name': 'সকালের নাস্তা', 'time': '08:00'})
+        task_id = storage.add_task(12345, {'name': 'বই পড়া'})
+        
+        press = functools.partial(_press, handlers)
+        
+        async def press_all():
+            assert 'পরিসংখ্যান' in (await press('stats'))[0]
+            assert 'সকালের নাস্তা' in (await press(f'select_routine_{routine_id}'))[0]
+            await press(f'delete_routine_{routine_id}')
+            await press(f'confirm_delete_task_{task_id}')
+            await press('set_timezone_Asia/Dhaka')
+            await press('default_interval_30')
+        asyncio.run(press_all())
+        
+        # confirm_delete_task_ reached the deletion, not the delete_task_ confirmation prompt
+        assert storage.get_user_tasks(12345) == [] and len(storage.get_user_routines(12345)) == 1
+        profile = storage.get_user_profile(12345)
+        assert profile.timezone == 'Asia/Dhaka' and profile.reminder_interval == 30
+        assert handlers.router.unmatched == 0
+        storage.close()
+        handlers.storage.shutdown()
+        print(f"   ✅ {len(handlers.router.routes)} routes registered on BotHandlers")
+    
+    print("🎉 Callback router test completed successfully!")
+    return True
+
+def test_compact_callbacks():
+    """List buttons carry short tokens that the router expands back to the routine or task id"""
+    print("🎫 Bengali Telegram Bot - Compact Callback Test")
+    print("=" * 50)
+    
+    codec = CallbackCodec(capacity=3)
+    long_id = 'task_' + '9' * 60
+    token = codec.encode('select_task_', long_id)
+    assert token.startswith(TOKEN_MARK) and len(token) <= 3 + EPOCH_DIGITS
+    assert codec.encode('select_task_', long_id) == token  # same id, same index
+    assert codec.decode(token) == 'select_task_' + long_id
+    assert codec.encode('day_', 'monday') == 'day_monday' and codec.decode('day_monday') == 'day_monday'
+    
+    # Bounded LRU: the least recently used id is evicted and its token stops decoding
+    others = [codec.encode('complete_task_', f'task_{i}') for i in range(3)]
+    assert len(codec) == 3 and codec.decode(token) is None
+    assert codec.decode(others[-1]) == 'complete_task_task_2'
+    print(f"   ✅ {len('select_task_' + long_id)}-byte callback sent as {token!r}")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = StorageManager(os.path.join(tmp_dir, 'bot_data.json'))
+        handlers = BotHandlers(storage)
+        routine_id = storage.add_routine(12345, {'name': 'সকালের নাস্তা', 'time': '08:00'})
+        
+        press = functools.partial(_press, handlers)
+        
+        async def press_all():
+            text, markup = await press('view_routines')
+            data = markup.inline_keyboard[0][0].callback_data
+            assert data.startswith(TOKEN_MARK) and routine_id not in data
+            text, markup = await press(data)
+            assert 'সকালের নাস্তা' in text
+            assert all(button.callback_data.startswith(TOKEN_MARK) for button in markup.inline_keyboard[0])
+            
+            text, _ = await press(TOKEN_MARK + 'r' + 'zzzz')
+            assert text == BENGALI_TEXT['button_expired']
+        asyncio.run(press_all())
+        
+        assert handlers.router.expired == 1 and handlers.router.unmatched == 0
+        storage.close()
+        handlers.storage.shutdown()
+        print("   ✅ Token buttons dispatched; an unknown token got the expired message")
+        
+        # A token issued before a restart doesn't decode to whichever id now has its index
+        storage = StorageManager(os.path.join(tmp_dir, 'restart.json'))
+        first = storage.add_routine(12345, {'name': 'প্রথম', 'time': '08:00'})
+        second = storage.add_routine(12345, {'name': 'দ্বিতীয়', 'time': '09:00'})
+        before_restart = BotHandlers(storage, UIManager())
+        stale = before_restart.ui.item_callback('confirm_delete_routine_', first)
+        handlers = BotHandlers(storage, UIManager())
+        assert handlers.ui.codec.epoch != before_restart.ui.codec.epoch
+        handlers.ui.item_callback('select_routine_', second)
+        text, _ = asyncio.run(_press(handlers, stale))
+        assert text == BENGALI_TEXT['button_expired'] and handlers.router.expired == 1
+        assert [r.id for r in storage.get_user_routines(12345)] == [first, second]
+        storage.close()
+        before_restart.storage.shutdown()
+        handlers.storage.shutdown()
+        print(f"   ✅ Stale token {stale!r} from the previous process shown as expired")
+        
+        storage = StorageManager(os.path.join(tmp_dir, 'walk.json'))
+        handlers = BotHandlers(storage)
+        routine_id = storage.add_routine(12345, {'name': 'সকালের নাস্তা', 'time': '08:00'})
+        storage.add_task(12345, {'name': 'বই পড়া', 'deadline': '2030-01-01 09:00'})
+        press = functools.partial(_press, handlers)
+        edit_data = handlers.ui.item_callback('edit_routine_', routine_id)
+        
+        async def walk():
+            # Press every button reachable from the main menu, breadth first
+            pending, seen = ['main_menu'], {'main_menu'}
+            while pending:
+                edit = await press(pending.pop(0))
+                markup = edit[1] if edit is not None else None
+                for row in (markup.inline_keyboard if markup is not None else ()):
+                    for button in row:
+                        if button.callback_data not in seen:
+                            seen.add(button.callback_data)
+                            pending.append(button.callback_data)
+            return seen
+        seen = asyncio.run(walk())
+        
+        assert edit_data in seen and all(len(data.encode('utf-8')) <= 64 for data in seen)
+        assert handlers.router.unmatched == 0 and handlers.router.expired == 0
+        storage.close()
+        handlers.storage.shutdown()
+        print(f"   ✅ All {len(seen)} buttons reachable from the main menu have a route")
+    
+    print("🎉 Compact callback test completed successfully!")
+    return True
+
+def test_cached_keyboards():
+    """Static keyboards are shared objects and selection keyboards are memoized per selection"""
+    print("⌨️ Bengali Telegram Bot - Cached Keyboard Test")
+    print("=" * 50)
+    
+    ui = UIManager()
+    assert ui.get_main_menu_keyboard() is UIManager().get_main_menu_keyboard()
+    assert ui.get_back_only_keyboard() is ui.get_back_only_keyboard()
+    
+    # Order and duplicates don't matter, only the set that is selected
+    days = ui.get_days_selection_keyboard(['friday', 'monday'])
+    assert days is ui.get_days_selection_keyboard(['monday', 'friday', 'monday'])
+    assert days is not ui.get_days_selection_keyboard(['monday'])
+    texts = [button.text for row in days.inline_keyboard for button in row]
+    assert texts[0].startswith('✅') and texts[1] == BENGALI_TEXT['tuesday'] and texts[4].startswith('✅')
+    assert ui.get_days_selection_keyboard() is ui.get_days_selection_keyboard([])
+    
+    intervals = ui.get_reminder_intervals_keyboard()
+    assert intervals is ui.get_reminder_intervals_keyboard([15])
+    assert intervals.inline_keyboard[2][0].text.startswith('✅')
+    print("   ✅ Keyboards reused across calls and UIManager instances")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        storage = StorageManager(os.path.join(tmp_dir, 'bot_data.json'))
+        first, second, own = BotHandlers(storage), BotHandlers(storage), BotHandlers(storage, ui)
+        assert first.ui is second.ui and own.ui is ui
+        storage.close()
+        for handlers in (first, second, own):
+            handlers.storage.shutdown()
+    
+    print("🎉 Cached keyboard test completed successfully!")
+    return True
+
+def test_paged_lists():
+    """Lists are served a page at a time from storage, with next/previous page buttons"""
+    print("📄 Bengali Telegram Bot - Paged List Test")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for storage in (StorageManager(os.path.join(tmp_dir, 'bot_data.json')),
+                        SQLiteStorageManager(os.path.join(tmp_dir, 'bot_data.db'))):
+            task_ids = [storage.add_task(12345, {'name': f'কাজ {i}'}) for i in range(25)]
+            storage.complete_task(12345, task_ids[0])
+            
+            page = storage.get_task_page(12345, 10, 10)
+            assert [t.name for t in page.items] == [f'কাজ {i}' for i in range(10, 20)]
+            assert (page.total, page.number, page.pages, page.prev_offset, page.next_offset) == (25, 2, 3, 0, 20)
+            
+            pending = storage.get_task_page(12345, 20, 10, completed=False)
+            assert pending.total == 24 and len(pending.items) == 4 and pending.next_offset is None
+            
+            # A page cursor past the end (e.g. after deletions) lands on the last page
+            storage.delete_task(12345, task_ids[-1])
+            last = storage.get_task_page(12345, 30, 10)
+            assert last.offset == 20 and last.total == 24 and last.items[-1].name == 'কাজ 23'
+            
+            assert storage.get_routine_page(12345).total == 0
+            storage.close()
+            print(f"   ✅ {type(storage).__name__}: page {page.number}/{page.pages} of {page.total} tasks")
+        
+        storage = StorageManager(os.path.join(tmp_dir, 'paged.json'))
+        handlers = BotHandlers(storage)
+        for i in range(12):
+            storage.add_routine(12345, {'name': f'রুটিন {i}', 'time': '08:00'})
+        
+        press = functools.partial(_press, handlers)
+        
+        async def press_all():
+            text, markup = await press('view_routines')
+            assert 'রুটিন 9' in text and 'রুটিন 10' not in text and '1/2' in text
+            nav = markup.inline_keyboard[-2]
+            assert [b.callback_data for b in nav] == ['page_routines_10']
+            
+            text, markup = await press(nav[0].callback_data)
+            assert '11. 🟢 রুটিন 10' in text and len(markup.inline_keyboard) == 4
+            assert [b.callback_data for b in markup.inline_keyboard[-2]] == ['page_routines_0']
+            
+            _, markup = await press('page_delete_routines_10')
+            assert markup.inline_keyboard[0][0].text.startswith(EMOJIS['delete'])
+        asyncio.run(press_all())
+        
+        assert handlers.router.unmatched == 0
+        storage.close()
+        handlers.storage.shutdown()
+        print("   ✅ Next and previous page buttons route back to the list views")
+    
+    print("🎉 Paged list test completed successfully!")
+    return True
+
+def test_rendered_screen_cache():
+    """List and stats screens are rendered once per version of the user's data"""
+    print("🗂️ Bengali Telegram Bot - Rendered Screen Cache Test")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for storage in (StorageManager(os.path.join(tmp_dir, 'bot_data.json')),
+                        SQLiteStorageManager(os.path.join(tmp_dir, 'bot_data.db'))):
+            version = storage.data_version(12345)
+            assert storage.data_version(12345) == version
+            task_id = storage.add_task(12345, {'name': 'বই পড়া'})
+            after_add = storage.data_version(12345)
+            storage.complete_task(12345, task_id)
+            assert version < after_add < storage.data_version(12345)
+            storage.get_user_tasks(12345)
+            assert storage.data_version(12345) == storage.data_version(12345)
+            
+            # An edit made outside this storage manager publishes no event but still counts
+            version = storage.data_version(12345)
+            if isinstance(storage, SQLiteStorageManager):
+                with sqlite3.connect(storage.data_file) as other:
+                    other.execute("UPDATE tasks SET name = 'হাঁটা'")
+                other.close()
+            else:
+                with open(storage.data_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data['users']['12345']['tasks'][0]['name'] = 'হাঁটা'
+                with open(storage.data_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+            assert storage.data_version(12345) > version
+            assert storage.get_user_tasks(12345)[0].name == 'হাঁটা'
+            storage.close()
+        print("   ✅ Data version grows with every mutation, including outside edits, and only then")
+        
+        storage = StorageManager(os.path.join(tmp_dir, 'screens.json'))
+        handlers = BotHandlers(storage, UIManager())
+        storage.add_task(12345, {'name': 'বই পড়া'})
+        
+        press = functools.partial(_press, handlers)
+        
+        async def press_all():
+            first = await press('view_tasks')
+            assert await press('view_tasks') == first
+            assert (handlers.ui.screen_hits, handlers.ui.screen_misses) == (1, 1)
+            
+            await press('stats')
+            stats_text, _ = await press('stats')
+            assert handlers.ui.screen_hits == 2 and ': 1' in stats_text
+            
+            # A change to the user's data makes the next view render again
+            storage.add_task(12345, {'name': 'হাঁটা'})
+            text, _ = await press('view_tasks')
+            assert 'হাঁটা' in text and handlers.ui.screen_misses == 3
+            stats_text, _ = await press('stats')
+            assert ': 2' in stats_text and handlers.ui.screen_misses == 4
+            
+            # So does an edit of the data file by another process
+            with open(storage.data_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            data['users']['12345']['tasks'][0]['name'] = 'বাজার করা'
+            with open(storage.data_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            text, _ = await press('view_tasks')
+            assert 'বাজার করা' in text and handlers.ui.screen_misses == 5
+        asyncio.run(press_all())
+        
+        storage.close()
+        handlers.storage.shutdown()
+        print(f"   ✅ {handlers.ui.screen_hits} cache hits, {handlers.ui.screen_misses} renders")
+    
+    print("🎉 Rendered screen cache test completed successfully!")
+    return True
+
 if __name__ == '__main__':
     try:
         test_bot_functionality()
+        test_sqlite_storage()
+        test_models_round_trip()
+        test_model_cache_bound()
+        test_change_events()
+        test_journal_replay()
+        test_group_commit()
+        test_backup_service()
+        test_corrupt_data_recovery()
+        test_serialization_formats()
+        test_reminder_engine()
+        test_message_sender()
+        test_bulk_import_export()
+        test_lazy_startup()
+        test_cluster_routing()
+        test_routine_streaks()
+        test_task_timestamps()
+        test_overdue_sweep()
+        test_callback_router()
+        test_compact_callbacks()
+        test_cached_keyboards()
+        test_paged_lists()
+        test_rendered_screen_cache()
     except Exception as e:
         print(f"❌ Test failed: {e}")
         import traceback
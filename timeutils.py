@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Time zone aware scheduling helpers
+Routine and task times are wall-clock times in the user's timezone; these turn them into UTC instants
+"""
+
+from datetime import date, datetime, time as dt_time
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+import pytz
+from constants import DEFAULT_TIMEZONE
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+ALL_DAYS = 0b1111111
+
+# Results are keyed on a handful of timezones and times shared by many users,
+# so these caches stay small while turning a schedule build into mostly lookups
+CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=None)
+def get_timezone(tz_name: str):
+    """pytz timezone by name, falling back to the default for unknown names"""
+    try:
+        return pytz.timezone(tz_name)
+    except pytz.UnknownTimeZoneError:
+        return pytz.timezone(DEFAULT_TIMEZONE)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_hhmm(time_str: str) -> Optional[Tuple[int, int]]:
+    """(hours, minutes) of an "HH:MM" string, or None if it isn't a valid time"""
+    try:
+        parts = time_str.split(':')
+        if len(parts) != 2:
+            return None
+
+        hours = int(parts[0])
+        minutes = int(parts[1])
+    except (ValueError, AttributeError):
+        return None
+
+    if 0 <= hours <= 23 and 0 <= minutes <= 59:
+        return hours, minutes
+    return None
+
+
+def validate_time_format(time_str: str) -> bool:
+    """Validate time format (HH:MM)"""
+    return parse_hhmm(time_str) is not None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def weekday_mask(days: Tuple[str, ...]) -> int:
+    """Bitmask of the weekdays named in `days` (bit 0 is Monday)"""
+    mask = 0
+    for day in days:
+        if day in WEEKDAYS:
+            mask |= 1 << WEEKDAYS.index(day)
+    return mask
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def local_to_utc(tz_name: str, day_ordinal: int, hours: int, minutes: int) -> float:
+    """UTC epoch seconds of a wall-clock time on a given local date
+
+    A time skipped by a DST transition moves forward by the length of the gap; a time that
+    occurs twice when clocks go back resolves to its first occurrence.
+    """
+    tz = get_timezone(tz_name)
+    naive = datetime.combine(date.fromordinal(day_ordinal), dt_time(hours, minutes))
+    try:
+        aware = tz.localize(naive, is_dst=None)
+    except pytz.AmbiguousTimeError:
+        aware = tz.localize(naive, is_dst=True)
+    except pytz.NonExistentTimeError:
+        aware = tz.normalize(tz.localize(naive, is_dst=False))
+    return aware.timestamp()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _local_day(tz_name: str, epoch_minute: int) -> int:
+    return datetime.fromtimestamp(epoch_minute * 60, get_timezone(tz_name)).toordinal()
+
+
+def local_day(tz_name: str, timestamp: float) -> int:
+    """Ordinal of the local date at a UTC instant (offsets are whole minutes, so cache per minute)"""
+    return _local_day(tz_name, int(timestamp // 60))
+
+
+def next_occurrence(time_str: str, routine_type: str, days: Iterable[str], tz_name: str,
+                    after: float) -> Optional[float]:
+    """First instant (UTC epoch seconds) strictly after `after` when a routine is due, or None
+
+    Daily routines occur every day; weekly ones on the named `days`.
+    """
+    hhmm = parse_hhmm(time_str)
+    if hhmm is None:
+        return None
+
+    mask = weekday_mask(tuple(days)) if routine_type == 'weekly' else ALL_DAYS
+    if not mask:
+        return None
+
+    start = local_day(tz_name, after)
+    for ordinal in range(start, start + 8):
+        # date.fromordinal(1) is a Monday
+        if mask & (1 << ((ordinal - 1) % 7)):
+            instant = local_to_utc(tz_name, ordinal, hhmm[0], hhmm[1])
+            if instant > after:
+                return instant
+    return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def deadline_to_utc(deadline: str, tz_name: str) -> Optional[float]:
+    """UTC epoch seconds of a "YYYY-MM-DD HH:MM" deadline in the user's timezone, or None"""
+    try:
+        day_part, time_part = deadline.split(' ')
+        day = date.fromisoformat(day_part)
+    except (ValueError, AttributeError):
+        return None
+
+    hhmm = parse_hhmm(time_part)
+    if hhmm is None:
+        return None
+    return local_to_utc(tz_name, day.toordinal(), hhmm[0], hhmm[1])
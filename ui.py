@@ -4,9 +4,105 @@ User Interface components for Bengali Telegram bot
 Keyboards, menus, and message formatting
 """
 
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
-from typing import List, Dict, Any
-from constants import BENGALI_TEXT, CALLBACK_DATA, EMOJIS, REMINDER_INTERVALS
+import functools
+from collections import OrderedDict
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from typing import List, Dict, Any, Optional, FrozenSet, Iterable, Sequence, Tuple, Union
+from constants import (
+    BENGALI_TEXT, CALLBACK_DATA, EMOJIS, REMINDER_INTERVALS, DEFAULT_TIMEZONE, TIMEZONE_OPTIONS, RENDER_CACHE_SIZE
+)
+from models import Routine, Task, UserStats, Page, format_date
+from router import CallbackCodec
+from timeutils import WEEKDAYS
+
+
+def _keyboard(rows: Iterable[Sequence[Tuple[str, str]]]) -> InlineKeyboardMarkup:
+    """Inline keyboard from rows of (button text, callback data)"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(text, callback_data=data) for text, data in row]
+                                 for row in rows])
+
+
+def _as_page(items: Union[Page, List[Any]]) -> Page:
+    """A list view's page; a plain list stands for its first page"""
+    return items if isinstance(items, Page) else Page.of(items)
+
+
+def _checked(text: str, selected: bool) -> str:
+    return f"✅ {text}" if selected else text
+
+
+# Keyboards that never change are built once at import. InlineKeyboardMarkup is immutable,
+# so every message can be sent with the same object.
+MAIN_MENU_KEYBOARD = _keyboard([
+    [(BENGALI_TEXT['btn_routines'], CALLBACK_DATA['routines']), (BENGALI_TEXT['btn_quick_tasks'], CALLBACK_DATA['tasks'])],
+    [(BENGALI_TEXT['btn_reminders'], CALLBACK_DATA['reminders']), (BENGALI_TEXT['btn_settings'], CALLBACK_DATA['settings'])],
+    [(BENGALI_TEXT['btn_stats'], CALLBACK_DATA['stats']), (BENGALI_TEXT['btn_help'], CALLBACK_DATA['help'])]
+])
+
+ROUTINE_MENU_KEYBOARD = _keyboard([
+    [(BENGALI_TEXT['btn_add_routine'], CALLBACK_DATA['add_routine']),
+     (BENGALI_TEXT['btn_view_routines'], CALLBACK_DATA['view_routines'])],
+    [(BENGALI_TEXT['btn_edit_routine'], CALLBACK_DATA['edit_routine']),
+     (BENGALI_TEXT['btn_delete_routine'], CALLBACK_DATA['delete_routine'])],
+    [(BENGALI_TEXT['btn_back'], CALLBACK_DATA['main_menu'])]
+])
+
+TASK_MENU_KEYBOARD = _keyboard([
+    [(BENGALI_TEXT['btn_add_task'], CALLBACK_DATA['add_task']),
+     (BENGALI_TEXT['btn_view_tasks'], CALLBACK_DATA['view_tasks'])],
+    [(BENGALI_TEXT['btn_complete_task'], CALLBACK_DATA['complete_task']),
+     (BENGALI_TEXT['btn_delete_task'], CALLBACK_DATA['delete_task'])],
+    [(BENGALI_TEXT['btn_back'], CALLBACK_DATA['main_menu'])]
+])
+
+SETTINGS_MENU_KEYBOARD = _keyboard([
+    [(BENGALI_TEXT['btn_change_name'], 'change_name')],
+    [(BENGALI_TEXT['btn_change_timezone'], 'change_timezone')],
+    [(BENGALI_TEXT['btn_reminder_settings'], 'reminder_settings')],
+    [(BENGALI_TEXT['btn_back'], CALLBACK_DATA['main_menu'])]
+])
+
+BACK_ONLY_KEYBOARD = _keyboard([[(BENGALI_TEXT['btn_back'], CALLBACK_DATA['main_menu'])]])
+
+CANCEL_KEYBOARD = _keyboard([[(BENGALI_TEXT['btn_cancel'], CALLBACK_DATA['cancel'])]])
+
+_SAVE_CANCEL_ROW = [(BENGALI_TEXT['btn_save'], CALLBACK_DATA['save']), (BENGALI_TEXT['btn_cancel'], CALLBACK_DATA['cancel'])]
+
+SAVE_CANCEL_KEYBOARD = _keyboard([_SAVE_CANCEL_ROW])
+
+ROUTINE_TYPE_KEYBOARD = _keyboard([
+    [(BENGALI_TEXT['daily_routine'], 'type_daily'), (BENGALI_TEXT['weekly_routine'], 'type_weekly')],
+    [(BENGALI_TEXT['btn_cancel'], CALLBACK_DATA['cancel'])]
+])
+
+
+# Selection keyboards are memoized per selection: there are only 2^7 day sets and 2^5
+# interval sets, and the timezone and default interval keyboards have one per option.
+@functools.lru_cache(maxsize=None)
+def _days_keyboard(selected: FrozenSet[str]) -> InlineKeyboardMarkup:
+    buttons = [(_checked(BENGALI_TEXT[day], day in selected), f'day_{day}') for day in WEEKDAYS]
+    return _keyboard([buttons[i:i + 2] for i in range(0, len(buttons), 2)] + [_SAVE_CANCEL_ROW])
+
+
+@functools.lru_cache(maxsize=None)
+def _intervals_keyboard(selected: FrozenSet[int]) -> InlineKeyboardMarkup:
+    rows = [[(_checked(BENGALI_TEXT[f'reminder_{interval}min'], interval in selected), f'interval_{interval}')]
+            for interval in REMINDER_INTERVALS]
+    return _keyboard(rows + [_SAVE_CANCEL_ROW])
+
+
+@functools.lru_cache(maxsize=len(TIMEZONE_OPTIONS) + 1)
+def _timezone_keyboard(current: str) -> InlineKeyboardMarkup:
+    rows = [[(_checked(tz_name, tz_name == current), f'set_timezone_{tz_name}')] for tz_name in TIMEZONE_OPTIONS]
+    return _keyboard(rows + [[(BENGALI_TEXT['btn_back'], CALLBACK_DATA['settings'])]])
+
+
+@functools.lru_cache(maxsize=len(REMINDER_INTERVALS) + 1)
+def _default_interval_keyboard(current: int) -> InlineKeyboardMarkup:
+    rows = [[(_checked(BENGALI_TEXT[f'reminder_{interval}min'], interval == current), f'default_interval_{interval}')]
+            for interval in REMINDER_INTERVALS]
+    return _keyboard(rows + [[(BENGALI_TEXT['btn_back'], CALLBACK_DATA['settings'])]])
+
 
 class UIManager:
     """Manages all UI components including keyboards and message formatting"""
@@ -15,216 +111,153 @@ class UIManager:
         self.text = BENGALI_TEXT
         self.callbacks = CALLBACK_DATA
         self.emojis = EMOJIS
+        self.codec = CallbackCodec()
+        # Last rendering of each (user, screen, page) with the data version it was made from
+        self._screens: "OrderedDict[tuple, Tuple[int, str, InlineKeyboardMarkup]]" = OrderedDict()
+        self.screen_hits = 0
+        self.screen_misses = 0
+    
+    def cached_screen(self, user_id: int, screen: str, page: Any,
+                      version: int) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+        """Text and keyboard rendered for this version of the user's data, if still cached"""
+        key = (user_id, screen, page)
+        cached = self._screens.get(key)
+        # Its buttons' tokens may have left the payload table since; decoding also keeps them in it
+        if (cached is None or cached[0] != version or
+                any(self.codec.decode(button.callback_data) is None
+                    for row in cached[2].inline_keyboard for button in row)):
+            self.screen_misses += 1
+            return None
+        
+        self._screens.move_to_end(key)
+        self.screen_hits += 1
+        return cached[1], cached[2]
+    
+    def cache_screen(self, user_id: int, screen: str, page: Any, version: int,
+                     text: str, keyboard: InlineKeyboardMarkup):
+        """Remember a rendering, replacing the user's older one of the same screen and page"""
+        key = (user_id, screen, page)
+        self._screens[key] = (version, text, keyboard)
+        self._screens.move_to_end(key)
+        if len(self._screens) > RENDER_CACHE_SIZE:
+            self._screens.popitem(last=False)
+    
+    def item_callback(self, prefix: str, item_id: str) -> str:
+        """Callback data of a button acting on one routine or task, as a compact token"""
+        return self.codec.encode(prefix, item_id)
     
     def get_main_menu_keyboard(self) -> InlineKeyboardMarkup:
         """Main menu keyboard with all primary options"""
-        keyboard = [
-            [
-                InlineKeyboardButton(self.text['btn_routines'], callback_data=self.callbacks['routines']),
-                InlineKeyboardButton(self.text['btn_quick_tasks'], callback_data=self.callbacks['tasks'])
-            ],
-            [
-                InlineKeyboardButton(self.text['btn_reminders'], callback_data=self.callbacks['reminders']),
-                InlineKeyboardButton(self.text['btn_settings'], callback_data=self.callbacks['settings'])
-            ],
-            [
-                InlineKeyboardButton(self.text['btn_stats'], callback_data=self.callbacks['stats']),
-                InlineKeyboardButton(self.text['btn_help'], callback_data=self.callbacks['help'])
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+        return MAIN_MENU_KEYBOARD
     
     def get_routine_menu_keyboard(self) -> InlineKeyboardMarkup:
         """Routine management menu"""
-        keyboard = [
-            [
-                InlineKeyboardButton(self.text['btn_add_routine'], callback_data=self.callbacks['add_routine']),
-                InlineKeyboardButton(self.text['btn_view_routines'], callback_data=self.callbacks['view_routines'])
-            ],
-            [
-                InlineKeyboardButton(self.text['btn_edit_routine'], callback_data=self.callbacks['edit_routine']),
-                InlineKeyboardButton(self.text['btn_delete_routine'], callback_data=self.callbacks['delete_routine'])
-            ],
-            [
-                InlineKeyboardButton(self.text['btn_back'], callback_data=self.callbacks['main_menu'])
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+        return ROUTINE_MENU_KEYBOARD
     
     def get_task_menu_keyboard(self) -> InlineKeyboardMarkup:
         """Task management menu"""
-        keyboard = [
-            [
-                InlineKeyboardButton(self.text['btn_add_task'], callback_data=self.callbacks['add_task']),
-                InlineKeyboardButton(self.text['btn_view_tasks'], callback_data=self.callbacks['view_tasks'])
-            ],
-            [
-                InlineKeyboardButton(self.text['btn_complete_task'], callback_data=self.callbacks['complete_task']),
-                InlineKeyboardButton(self.text['btn_delete_task'], callback_data=self.callbacks['delete_task'])
-            ],
-            [
-                InlineKeyboardButton(self.text['btn_back'], callback_data=self.callbacks['main_menu'])
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+        return TASK_MENU_KEYBOARD
     
     def get_settings_menu_keyboard(self) -> InlineKeyboardMarkup:
         """Settings menu"""
-        keyboard = [
-            [
-                InlineKeyboardButton(self.text['btn_change_name'], callback_data='change_name')
-            ],
-            [
-                InlineKeyboardButton(self.text['btn_change_timezone'], callback_data='change_timezone')
-            ],
-            [
-                InlineKeyboardButton(self.text['btn_reminder_settings'], callback_data='reminder_settings')
-            ],
-            [
-                InlineKeyboardButton(self.text['btn_back'], callback_data=self.callbacks['main_menu'])
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+        return SETTINGS_MENU_KEYBOARD
     
     def get_back_only_keyboard(self) -> InlineKeyboardMarkup:
         """Simple back button keyboard"""
-        keyboard = [
-            [InlineKeyboardButton(self.text['btn_back'], callback_data=self.callbacks['main_menu'])]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+        return BACK_ONLY_KEYBOARD
     
     def get_cancel_keyboard(self) -> InlineKeyboardMarkup:
         """Cancel operation keyboard"""
-        keyboard = [
-            [InlineKeyboardButton(self.text['btn_cancel'], callback_data=self.callbacks['cancel'])]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+        return CANCEL_KEYBOARD
     
     def get_save_cancel_keyboard(self) -> InlineKeyboardMarkup:
         """Save and cancel keyboard"""
-        keyboard = [
-            [
-                InlineKeyboardButton(self.text['btn_save'], callback_data=self.callbacks['save']),
-                InlineKeyboardButton(self.text['btn_cancel'], callback_data=self.callbacks['cancel'])
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+        return SAVE_CANCEL_KEYBOARD
     
     def get_days_selection_keyboard(self, selected_days: List[str] = None) -> InlineKeyboardMarkup:
         """Days of week selection keyboard"""
-        if selected_days is None:
-            selected_days = []
-        
-        days = [
-            ('monday', self.text['monday']),
-            ('tuesday', self.text['tuesday']),
-            ('wednesday', self.text['wednesday']),
-            ('thursday', self.text['thursday']),
-            ('friday', self.text['friday']),
-            ('saturday', self.text['saturday']),
-            ('sunday', self.text['sunday'])
-        ]
-        
-        keyboard = []
-        for i in range(0, len(days), 2):
-            row = []
-            for j in range(2):
-                if i + j < len(days):
-                    day_key, day_text = days[i + j]
-                    # Add checkmark if selected
-                    display_text = f"✅ {day_text}" if day_key in selected_days else day_text
-                    row.append(InlineKeyboardButton(display_text, callback_data=f'day_{day_key}'))
-            keyboard.append(row)
-        
-        # Add save and cancel buttons
-        keyboard.extend([
-            [
-                InlineKeyboardButton(self.text['btn_save'], callback_data=self.callbacks['save']),
-                InlineKeyboardButton(self.text['btn_cancel'], callback_data=self.callbacks['cancel'])
-            ]
-        ])
-        
-        return InlineKeyboardMarkup(keyboard)
+        return _days_keyboard(frozenset(selected_days or ()).intersection(WEEKDAYS))
     
     def get_routine_type_keyboard(self) -> InlineKeyboardMarkup:
         """Routine type selection keyboard"""
-        keyboard = [
-            [
-                InlineKeyboardButton(self.text['daily_routine'], callback_data='type_daily'),
-                InlineKeyboardButton(self.text['weekly_routine'], callback_data='type_weekly')
-            ],
-            [
-                InlineKeyboardButton(self.text['btn_cancel'], callback_data=self.callbacks['cancel'])
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+        return ROUTINE_TYPE_KEYBOARD
     
     def get_reminder_intervals_keyboard(self, selected_intervals: List[int] = None) -> InlineKeyboardMarkup:
         """Reminder intervals selection keyboard"""
         if selected_intervals is None:
             selected_intervals = [15]  # Default
-        
-        keyboard = []
-        interval_texts = {
-            5: self.text['reminder_5min'],
-            10: self.text['reminder_10min'],
-            15: self.text['reminder_15min'],
-            30: self.text['reminder_30min'],
-            60: self.text['reminder_60min']
-        }
-        
-        for interval in REMINDER_INTERVALS:
-            display_text = f"✅ {interval_texts[interval]}" if interval in selected_intervals else interval_texts[interval]
-            keyboard.append([InlineKeyboardButton(display_text, callback_data=f'interval_{interval}')])
-        
-        keyboard.extend([
-            [
-                InlineKeyboardButton(self.text['btn_save'], callback_data=self.callbacks['save']),
-                InlineKeyboardButton(self.text['btn_cancel'], callback_data=self.callbacks['cancel'])
-            ]
-        ])
-        
-        return InlineKeyboardMarkup(keyboard)
+        return _intervals_keyboard(frozenset(selected_intervals).intersection(REMINDER_INTERVALS))
+    
+    def get_timezone_keyboard(self, current: str) -> InlineKeyboardMarkup:
+        """Timezone selection keyboard, marking the current one"""
+        return _timezone_keyboard(current)
+    
+    def get_default_interval_keyboard(self, current: int) -> InlineKeyboardMarkup:
+        """Default reminder interval keyboard, marking the current one"""
+        return _default_interval_keyboard(current)
+    
+    def get_page_row(self, page: Page, page_callback: Optional[str]) -> List[InlineKeyboardButton]:
+        """Previous/next page buttons of a list view; `page_callback` + offset is their callback data"""
+        row = []
+        if page_callback is None:
+            return row
+        if page.prev_offset is not None:
+            row.append(InlineKeyboardButton(self.text['btn_prev_page'], callback_data=f"{page_callback}{page.prev_offset}"))
+        if page.next_offset is not None:
+            row.append(InlineKeyboardButton(self.text['btn_next_page'], callback_data=f"{page_callback}{page.next_offset}"))
+        return row
     
-    def get_routine_list_keyboard(self, routines: List[Dict[str, Any]]) -> InlineKeyboardMarkup:
-        """Dynamic keyboard for routine selection"""
-        if not routines:
+    def get_routine_list_keyboard(self, routines: Union[Page, List[Routine]], action: str = "select",
+                                  page_callback: Optional[str] = None) -> InlineKeyboardMarkup:
+        """Dynamic keyboard for routine selection, one page at a time"""
+        page = _as_page(routines)
+        if not page.items:
             return self.get_back_only_keyboard()
         
+        emoji = self.emojis['delete'] if action == "delete" else self.emojis['routine']
         keyboard = []
-        for routine in routines[:10]:  # Limit to 10 items
-            routine_name = routine['name'][:30]  # Truncate long names
+        for routine in page.items:
+            routine_name = routine.name[:30]  # Truncate long names
             keyboard.append([InlineKeyboardButton(
-                f"{self.emojis['routine']} {routine_name}",
-                callback_data=f"select_routine_{routine['id']}"
+                f"{emoji} {routine_name}",
+                callback_data=self.item_callback(f"{action}_routine_", routine.id)
             )])
         
+        page_row = self.get_page_row(page, page_callback)
+        if page_row:
+            keyboard.append(page_row)
         keyboard.append([InlineKeyboardButton(self.text['btn_back'], callback_data=self.callbacks['routines'])])
         return InlineKeyboardMarkup(keyboard)
     
-    def get_task_list_keyboard(self, tasks: List[Dict[str, Any]], action: str = "select") -> InlineKeyboardMarkup:
-        """Dynamic keyboard for task selection"""
-        if not tasks:
+    def get_task_list_keyboard(self, tasks: Union[Page, List[Task]], action: str = "select",
+                               page_callback: Optional[str] = None) -> InlineKeyboardMarkup:
+        """Dynamic keyboard for task selection, one page at a time"""
+        page = _as_page(tasks)
+        if not page.items:
             return self.get_back_only_keyboard()
         
         keyboard = []
-        for task in tasks[:10]:  # Limit to 10 items
-            task_name = task['name'][:30]  # Truncate long names
-            status_emoji = self.emojis['done'] if task.get('completed', False) else self.emojis['pending']
+        for task in page.items:
+            task_name = task.name[:30]  # Truncate long names
+            status_emoji = self.emojis['done'] if task.completed else self.emojis['pending']
             keyboard.append([InlineKeyboardButton(
                 f"{status_emoji} {task_name}",
-                callback_data=f"{action}_task_{task['id']}"
+                callback_data=self.item_callback(f"{action}_task_", task.id)
             )])
         
+        page_row = self.get_page_row(page, page_callback)
+        if page_row:
+            keyboard.append(page_row)
         keyboard.append([InlineKeyboardButton(self.text['btn_back'], callback_data=self.callbacks['tasks'])])
         return InlineKeyboardMarkup(keyboard)
     
-    def format_routine_details(self, routine: Dict[str, Any]) -> str:
-        """Format routine details for display"""
-        details = f"{self.emojis['routine']} **{routine['name']}**\n\n"
-        details += f"{self.emojis['time']} সময়: {routine['time']}\n"
+    def format_routine_details(self, routine: Routine, today: Optional[int] = None,
+                               tz_name: str = DEFAULT_TIMEZONE) -> str:
+        """Format routine details for display; streaks are shown when the local date ordinal is given"""
+        details = f"{self.emojis['routine']} **{routine.name}**\n\n"
+        details += f"{self.emojis['time']} সময়: {routine.time}\n"
         
-        if routine.get('type') == 'weekly' and routine.get('days'):
+        if routine.type == 'weekly' and routine.days:
             days_bengali = []
             day_mapping = {
                 'monday': self.text['monday'],
@@ -235,45 +268,57 @@ class UIManager:
                 'saturday': self.text['saturday'],
                 'sunday': self.text['sunday']
             }
-            for day in routine['days']:
+            for day in routine.days:
                 days_bengali.append(day_mapping.get(day, day))
             details += f"{self.emojis['date']} দিনসমূহ: {', '.join(days_bengali)}\n"
         else:
             details += f"{self.emojis['daily']} ধরন: দৈনিক\n"
         
-        if routine.get('reminder_intervals'):
-            intervals = ', '.join([f"{i} মিনিট" for i in routine['reminder_intervals']])
+        if routine.reminder_intervals:
+            intervals = ', '.join([f"{i} মিনিট" for i in routine.reminder_intervals])
             details += f"{self.emojis['reminder']} রিমাইন্ডার: {intervals}\n"
         
+        if today is not None and routine.completions:
+            done, due = routine.adherence(today, 7, tz_name)
+            details += f"\n{self.emojis['done']} {self.text['routine_completions']} {routine.completions}\n"
+            details += f"{self.emojis['streak']} {self.text['current_streak']} {routine.current_streak(today)} দিন "
+            details += f"({self.text['best_streak']} {routine.best_streak})\n"
+            details += f"{self.emojis['stats']} {self.text['adherence_7']} {done}/{due}\n"
+        
         return details
     
-    def format_task_details(self, task: Dict[str, Any]) -> str:
+    def format_task_details(self, task: Task) -> str:
         """Format task details for display"""
-        status_emoji = self.emojis['done'] if task.get('completed', False) else self.emojis['pending']
-        details = f"{status_emoji} **{task['name']}**\n\n"
+        status_emoji = self.emojis['done'] if task.completed else self.emojis['pending']
+        details = f"{status_emoji} **{task.name}**\n\n"
         
-        if task.get('deadline'):
-            details += f"{self.emojis['time']} শেষ সময়: {task['deadline']}\n"
+        if task.deadline:
+            details += f"{self.emojis['time']} শেষ সময়: {task.deadline}\n"
         
-        if task.get('completed_at'):
-            details += f"{self.emojis['success']} সম্পন্ন: {task['completed_at'][:10]}\n"
+        if task.completed_at:
+            details += f"{self.emojis['success']} সম্পন্ন: {format_date(task.completed_at)}\n"
         
-        if task.get('reminder_intervals'):
-            intervals = ', '.join([f"{i} মিনিট" for i in task['reminder_intervals']])
+        if task.reminder_intervals:
+            intervals = ', '.join([f"{i} মিনিট" for i in task.reminder_intervals])
             details += f"{self.emojis['reminder']} রিমাইন্ডার: {intervals}\n"
         
         return details
     
-    def format_stats_message(self, stats: Dict[str, Any]) -> str:
+    def format_stats_message(self, stats: UserStats) -> str:
         """Format statistics message"""
-        message = f"{self.text['stats_title']}\n\n"
-        message += f"{self.emojis['routine']} {self.text['total_routines']}: {stats.get('total_routines', 0)}\n"
-        message += f"{self.emojis['task']} {self.text['total_tasks']}: {stats.get('total_tasks', 0)}\n"
-        message += f"{self.emojis['done']} {self.text['completed_tasks']}: {stats.get('completed_tasks', 0)}\n"
-        message += f"{self.emojis['pending']} {self.text['pending_tasks']}: {stats.get('pending_tasks', 0)}\n"
-        message += f"{self.emojis['stats']} {self.text['completion_rate']}: {stats.get('completion_rate', 0)}%"
-        
-        return message
+        return "\n".join([
+            f"{self.text['stats_title']}\n",
+            f"{self.emojis['routine']} {self.text['total_routines']}: {stats.total_routines}",
+            f"{self.emojis['task']} {self.text['total_tasks']}: {stats.total_tasks}",
+            f"{self.emojis['done']} {self.text['completed_tasks']}: {stats.completed_tasks}",
+            f"{self.emojis['pending']} {self.text['pending_tasks']}: {stats.pending_tasks}",
+            f"{self.emojis['stats']} {self.text['completion_rate']}: {stats.completion_rate}%\n",
+            f"{self.emojis['done']} {self.text['routine_completions']} {stats.routine_completions}",
+            f"{self.emojis['streak']} {self.text['current_streak']} {stats.current_streak} দিন",
+            f"{self.emojis['trophy']} {self.text['best_streak']} {stats.best_streak} দিন",
+            f"{self.emojis['daily']} {self.text['adherence_7']} {stats.adherence_7}%",
+            f"{self.emojis['date']} {self.text['adherence_30']} {stats.adherence_30}%"
+        ])
     
     def format_welcome_message(self, user_name: str = "") -> str:
         """Format welcome message"""
@@ -284,41 +329,48 @@ class UIManager:
         """Format help message"""
         return self.text['help_text']
     
-    def format_routine_list_message(self, routines: List[Dict[str, Any]]) -> str:
-        """Format routines list message"""
-        if not routines:
+    def format_page_footer(self, page: Page) -> str:
+        """Page position line of a list that spans several pages"""
+        if page.pages == 1:
+            return ""
+        return "\n" + self.text['page_indicator'].format(page=page.number, pages=page.pages)
+    
+    def format_routine_list_message(self, routines: Union[Page, List[Routine]]) -> str:
+        """Format one page of the routines list"""
+        page = _as_page(routines)
+        if not page.items:
             return f"{self.text['no_items_found']}"
         
-        message = f"{self.emojis['routine']} আপনার রুটিনসমূহ:\n\n"
-        for i, routine in enumerate(routines[:10], 1):
-            status = "🟢" if routine.get('active', True) else "🔴"
-            message += f"{i}. {status} {routine['name']} - {routine['time']}\n"
+        lines = [f"{self.emojis['routine']} আপনার রুটিনসমূহ:\n"]
+        for i, routine in enumerate(page.items, page.offset + 1):
+            status = "🟢" if routine.active else "🔴"
+            lines.append(f"{i}. {status} {routine.name} - {routine.time}")
         
-        if len(routines) > 10:
-            message += f"\n... এবং আরও {len(routines) - 10}টি রুটিন"
-        
-        return message
+        return "\n".join(lines) + "\n" + self.format_page_footer(page)
     
-    def format_task_list_message(self, tasks: List[Dict[str, Any]], completed: bool = None) -> str:
-        """Format tasks list message"""
-        if not tasks:
+    def format_task_list_message(self, tasks: Union[Page, List[Task]], completed: bool = None) -> str:
+        """Format one page of the tasks list"""
+        page = _as_page(tasks)
+        if not page.items:
             return f"{self.text['no_items_found']}"
         
         if completed is True:
-            message = f"{self.emojis['done']} সম্পন্ন কাজসমূহ:\n\n"
+            lines = [f"{self.emojis['done']} সম্পন্ন কাজসমূহ:\n"]
         elif completed is False:
-            message = f"{self.emojis['pending']} বাকি কাজসমূহ:\n\n"
+            lines = [f"{self.emojis['pending']} বাকি কাজসমূহ:\n"]
         else:
-            message = f"{self.emojis['task']} সকল কাজসমূহ:\n\n"
+            lines = [f"{self.emojis['task']} সকল কাজসমূহ:\n"]
         
-        for i, task in enumerate(tasks[:10], 1):
-            status_emoji = self.emojis['done'] if task.get('completed', False) else self.emojis['pending']
+        for i, task in enumerate(page.items, page.offset + 1):
+            status_emoji = self.emojis['done'] if task.completed else self.emojis['pending']
             deadline_info = ""
-            if task.get('deadline'):
-                deadline_info = f" ({task['deadline'][:10]})"
-            message += f"{i}. {status_emoji} {task['name']}{deadline_info}\n"
-        
-        if len(tasks) > 10:
-            message += f"\n... এবং আরও {len(tasks) - 10}টি কাজ"
+            if task.deadline:
+                deadline_info = f" ({task.deadline[:10]})"
+            lines.append(f"{i}. {status_emoji} {task.name}{deadline_info}")
         
-        return message
\ No newline at end of file
+        return "\n".join(lines) + "\n" + self.format_page_footer(page)
+
+@functools.lru_cache(maxsize=None)
+def shared_ui_manager() -> UIManager:
+    """The UIManager every BotHandlers in the process uses unless given its own"""
+    return UIManager()